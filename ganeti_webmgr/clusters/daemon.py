@@ -0,0 +1,282 @@
+# Copyright (c) 2012 Oregon State University Open Source Lab
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.    See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.
+
+
+"""
+Refresher daemon, keeping the caches of all clusters fresh.
+
+Each cluster is refreshed on its own schedule: its cluster info, pending
+jobs, nodes and virtual machines, the latter two from one bulk request each.
+Nodes and virtual machines missing from the database are not imported.
+While the daemon's heartbeat is recent, pages show expired objects as they
+are instead of refreshing them, see refresher_alive().
+"""
+
+from datetime import datetime
+import logging
+import os
+import random
+import socket
+import threading
+import time
+
+from django.db import connection
+
+from ganeti_webmgr.clusters.models import Cluster, Heartbeat
+from ganeti_webmgr.clusters.refresh import REFRESHER, refresh_thread
+from ganeti_webmgr.jobs.models import Job, FINISHED_STATUSES
+from ganeti_webmgr.utils.client import GanetiApiError
+
+
+class Refresher(object):
+    """
+    Refreshes every cluster every ``interval`` seconds, give or take
+    ``jitter`` seconds so that clusters drift apart instead of all refreshing
+    at once.  At most ``workers`` clusters are refreshed at the same time,
+    each on its own thread.
+
+    Call run() to refresh clusters until stop() is called, or run_once() to
+    start the refreshes which are due.
+    """
+
+    def __init__(self, workers=2, interval=300, jitter=30, intervals=None,
+                 heartbeat=15, logger=logging):
+        """
+        @param intervals - dict of cluster slug or hostname to the interval
+        of that cluster, overriding ``interval``
+        @param heartbeat - seconds between two heartbeats
+        """
+        self.workers = workers
+        self.interval = interval
+        self.jitter = jitter
+        self.intervals = intervals or {}
+        self.heartbeat = heartbeat
+        self.logger = logger
+        self.refreshed = 0
+        self.failures = 0
+
+        # cluster id -> (time of next refresh, slug, hostname)
+        self.schedule = {}
+        self._running = {}
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._beat = None
+
+    def cluster_interval(self, slug, hostname):
+        """
+        Returns the seconds between two refreshes of a cluster.
+        """
+        for key in (slug, hostname):
+            if key in self.intervals:
+                return self.intervals[key]
+        return self.interval
+
+    def next_run(self, slug, hostname, now):
+        """
+        Returns when a cluster refreshed at ``now`` is next refreshed.
+        """
+        interval = self.cluster_interval(slug, hostname)
+        return now + max(interval + random.uniform(-self.jitter,
+                                                   self.jitter), 1)
+
+    def update_schedule(self, now):
+        """
+        Schedules new clusters and forgets deleted ones.  New clusters are
+        spread over the first ``jitter`` seconds.
+        """
+        seen = set()
+        for id, slug, hostname in Cluster.objects \
+                .values_list('id', 'slug', 'hostname'):
+            seen.add(id)
+            if id in self.schedule:
+                at = self.schedule[id][0]
+            else:
+                at = now + random.uniform(0, self.jitter)
+            self.schedule[id] = (at, slug, hostname)
+
+        for id in set(self.schedule) - seen:
+            del self.schedule[id]
+
+    def due(self, now):
+        """
+        Returns the ids of clusters due for a refresh and not being refreshed,
+        most overdue first.
+        """
+        with self._lock:
+            running = set(self._running)
+        due = [(at, id) for id, (at, slug, hostname) in self.schedule.items()
+               if at <= now and id not in running]
+        return [id for at, id in sorted(due)]
+
+    def run_once(self, now=None):
+        """
+        Starts the refreshes which are due, as long as fewer than ``workers``
+        clusters are being refreshed.
+
+        @return list of ids of the clusters whose refresh was started
+        """
+        if now is None:
+            now = time.time()
+        self.beat(now)
+        self.update_schedule(now)
+
+        started = []
+        for id in self.due(now):
+            if self.busy >= self.workers:
+                break
+            at, slug, hostname = self.schedule[id]
+            self.schedule[id] = (self.next_run(slug, hostname, now), slug,
+                                 hostname)
+            self.start(id, hostname)
+            started.append(id)
+        return started
+
+    def start(self, cluster_id, hostname):
+        """
+        Refreshes a cluster on a new thread.
+        """
+        thread = threading.Thread(target=self._work,
+                                  args=(cluster_id, hostname),
+                                  name="refresher-%s" % hostname)
+        thread.daemon = True
+        with self._lock:
+            self._running[cluster_id] = thread
+        thread.start()
+
+    def _work(self, cluster_id, hostname):
+        try:
+            self.refresh(cluster_id, hostname)
+        finally:
+            # Each thread has its own connection; close it.
+            connection.close()
+            with self._lock:
+                del self._running[cluster_id]
+
+    def refresh(self, cluster_id, hostname):
+        """
+        Refreshes one cluster, logging failures.
+
+        @return True if the cluster was refreshed
+        """
+        start = time.time()
+        try:
+            jobs = self.refresh_cluster(cluster_id)
+        except Cluster.DoesNotExist:
+            return False
+        except Exception:
+            self.logger.exception("Could not refresh %s", hostname)
+            with self._lock:
+                self.failures += 1
+            return False
+
+        self.logger.info("Refreshed %s and %d pending jobs in %.2fs",
+                         hostname, jobs, time.time() - start)
+        with self._lock:
+            self.refreshed += 1
+        return True
+
+    def refresh_cluster(self, cluster_id):
+        """
+        Refreshes a cluster's info, pending jobs, and the nodes and virtual
+        machines it already has in the database.
+
+        @return number of pending jobs checked
+        """
+        with refresh_thread():
+            loaded = datetime.now()
+            cluster = Cluster.objects.get(pk=cluster_id)
+            # Loading an expired cluster already refreshed it.
+            if cluster.cached is None or cluster.cached < loaded:
+                cluster.refresh()
+            if cluster.error:
+                raise GanetiApiError(cluster.error)
+
+            jobs = self.refresh_jobs(cluster)
+            # Only objects already in the database are refreshed; new ones are
+            # imported by an administrator, see views/importing.py.
+            cluster.refresh_nodes()
+            cluster.refresh_virtual_machines()
+        return jobs
+
+    def refresh_jobs(self, cluster):
+        """
+        Updates the status of a cluster's unfinished jobs from one RAPI query,
+        and finishes those which completed, see Job.finish().
+
+        @return number of jobs checked
+        """
+        jobs = list(Job.objects.filter(cluster=cluster)
+                    .exclude(status__in=FINISHED_STATUSES)
+                    .values_list('id', 'job_id'))
+        if not jobs:
+            return 0
+
+        infos = Job.fetch_status(cluster.rapi,
+                                 [job_id for pk, job_id in jobs])
+        for pk, job_id in jobs:
+            info = infos.get(job_id)
+            if info is None or info.get('status') in FINISHED_STATUSES:
+                Job.finish(pk, info)
+            elif Job.valid_job(info):
+                Job.objects.filter(pk=pk) \
+                    .exclude(status__in=FINISHED_STATUSES) \
+                    .update(status=info['status'])
+        return len(jobs)
+
+    def beat(self, now):
+        """
+        Records the heartbeat, at most every ``heartbeat`` seconds.
+        """
+        if self._beat is None or now - self._beat >= self.heartbeat:
+            Heartbeat.touch(REFRESHER, socket.gethostname(), os.getpid())
+            self._beat = now
+
+    def run(self, tick=1):
+        """
+        Refreshes clusters until stop() is called, then waits for the
+        refreshes in progress and removes the heartbeat.
+        """
+        try:
+            while not self._stopping.is_set():
+                self.run_once()
+                self._stopping.wait(tick)
+            self.wait()
+        finally:
+            Heartbeat.stop(REFRESHER)
+
+    def stop(self):
+        """
+        Asks run() to return.  This may be called from a signal handler.
+        """
+        self._stopping.set()
+
+    def wait(self, timeout=None):
+        """
+        Waits for the refreshes in progress to finish.
+        """
+        with self._lock:
+            threads = self._running.values()
+        for thread in threads:
+            thread.join(timeout)
+
+    @property
+    def busy(self):
+        """
+        Number of clusters being refreshed.
+        """
+        with self._lock:
+            return len(self._running)
@@ -1,22 +1,94 @@
 import binascii
+from collections import namedtuple
 import re
-import cPickle
 from datetime import datetime, timedelta
 from hashlib import sha1
+import time
 
 from django.conf import settings
-from django.db import models
-from django.db.models import Sum
+from django.db import IntegrityError, models, transaction
+from django.db.models import Q, Sum
+from django.db.models.query import QuerySet
 from django.utils.encoding import force_unicode
 from django.utils.translation import ugettext_lazy as _
 from django.contrib.contenttypes.models import ContentType
 
-from ganeti_webmgr.utils import get_rapi
+from ganeti_webmgr.utils import chunks, get_rapi, rapi_fan_out
+from ganeti_webmgr.utils.infocache import InfoCache
 from ganeti_webmgr.utils.fields import (
     PatchedEncryptedCharField, PreciseDateTimeField, LowerCaseCharField
 )
-from ganeti_webmgr.utils.client import GanetiApiError
+from ganeti_webmgr.utils.client import (CACHE_INFO, CIRCUIT_OPEN,
+                                        GanetiApiError)
 from ganeti_webmgr.utils.models import Quota
+from ganeti_webmgr.utils.serialization import dumps_info, loads_info
+from ganeti_webmgr.clusters.refresh import (REFRESH_QUEUE, refreshing,
+                                            refresher_alive)
+
+
+# Decoded info of the objects loaded by this process, see
+# CachedClusterObject.info.
+INFO_CACHE = InfoCache(settings.INFO_CACHE_SIZE)
+
+# Outcome of CachedClusterObject.sync(): object counts, and seconds taken.
+SyncSummary = namedtuple('SyncSummary',
+                         'added removed updated unchanged elapsed')
+
+
+def update_search_index(model, queryset):
+    """
+    Indexes objects saved without sending post_save, such as by
+    bulk_create(), if their model's search index is updated on every save.
+    The queryset is only evaluated then.
+    """
+    from haystack import site
+    from haystack.exceptions import NotRegistered
+    from haystack.indexes import RealTimeSearchIndex
+
+    try:
+        index = site.get_index(model)
+    except NotRegistered:
+        return
+    if isinstance(index, RealTimeSearchIndex):
+        index.backend.update(index, queryset)
+
+
+def field_names(model, data):
+    """
+    Returns field values keyed by field name.  Foreign keys may be given by
+    the attribute holding their id, e.g. ``primary_node_id``, which
+    QuerySet.update() does not accept.
+    """
+    names = dict((f.attname, f.name) for f in model._meta.fields)
+    return dict((names.get(k, k), v) for k, v in data.iteritems())
+
+
+class CachedClusterObjectQuerySet(QuerySet):
+
+    def light(self, *related):
+        """
+        Returns objects loaded without their cached info, for lists which
+        only show database fields.  They are never refreshed, and their info
+        is only retrieved and decoded when first accessed.
+
+        @param related - names of foreign keys to other cached objects, which
+        are loaded the same way with the same query
+        """
+        fields = ['serialized_info']
+        fields.extend('%s__serialized_info' % name for name in related)
+        qs = self.defer(*fields)
+        if related:
+            qs = qs.select_related(*related)
+        return qs
+
+
+class CachedClusterObjectManager(models.Manager):
+
+    def get_query_set(self):
+        return CachedClusterObjectQuerySet(self.model, using=self._db)
+
+    def light(self, *related):
+        return self.get_query_set().light(*related)
 
 
 class CachedClusterObject(models.Model):
@@ -38,27 +110,124 @@ class CachedClusterObject(models.Model):
     mtime = PreciseDateTimeField(null=True, editable=False)
     cached = PreciseDateTimeField(null=True, editable=False)
     ignore_cache = models.BooleanField(default=False)
+    # Set while a process refreshes this object, see acquire_refresh_lease().
+    refresh_lease = models.DateTimeField(null=True, editable=False)
+
+    # RAPI query resource for this kind of object, and the fields that
+    # parse_persistent_info() needs.  Used by refresh_fields().
+    QUERY_RESOURCE = None
+    QUERY_FIELDS = ()
+
+    # Name of the RAPI client method yielding the complete info of all of a
+    # cluster's objects.  Used by refresh_bulk().
+    BULK_INFO_METHOD = None
+    # False if some persistent fields change without the mtime advancing, so
+    # that bulk refreshes must rewrite every object.  See apply_bulk_info().
+    BULK_MTIME_CHECK = True
+
+    # Fields whose change must be saved with save(), sending its signals,
+    # rather than a targeted UPDATE.  See save().
+    FULL_SAVE_FIELDS = ()
+
+    objects = CachedClusterObjectManager()
 
     last_job_id = None
     __info = None
+    # INFO_CACHE key of the info replaced since the last save.
+    __replaced_key = None
+    __ctime = None
     error = None
-    ctime = None
     deleted = False
 
+    # True for objects loaded with deferred fields, e.g. by light().  They
+    # are never refreshed.
+    lightweight = False
+    __transient_parsed = False
+
+    # Field values when this object was loaded or last saved, by attribute
+    # name.  See dirty_fields().
+    _loaded = None
+
     class Meta:
         abstract = True
 
     def save(self, *args, **kwargs):
         """
         overridden to ensure info is serialized prior to save
+
+        With ``dirty_only``, only the fields changed since this object was
+        loaded are written, with a single UPDATE, and no signals are sent.
+        Refreshes save this way, so that a changed VM doesn't rewrite its
+        notes, for instance.
         """
+        dirty_only = kwargs.pop('dirty_only', False)
         if not self.serialized_info:
-            self.serialized_info = cPickle.dumps(self.__info)
+            self.serialized_info = dumps_info(self.__info)
+
+        dirty = self.dirty_fields() if dirty_only else None
+        if dirty is not None and not set(dirty) & set(self.FULL_SAVE_FIELDS):
+            values = dict((name, getattr(self, name)) for name in dirty)
+            if not values or self.__class__.objects.filter(pk=self.pk) \
+                    .update(**field_names(self.__class__, values)):
+                self.mark_clean()
+                return
+
         super(CachedClusterObject, self).save(*args, **kwargs)
+        self.mark_clean()
+
+    def mark_clean(self):
+        """
+        Records the current field values as saved, see dirty_fields().
+
+        Info changed without a refresh, e.g. a VM's tags, may keep the mtime
+        and cache time it was cached by in INFO_CACHE; that entry is dropped.
+        """
+        if self.__replaced_key is not None:
+            INFO_CACHE.discard(self.__replaced_key)
+            self.__replaced_key = None
+        self._loaded = dict((f.attname, getattr(self, f.attname))
+                            for f in self._meta.fields)
+
+    def mark_saved(self, *names):
+        """
+        Records fields written with a queryset update as saved.
+        """
+        if self._loaded is not None:
+            for name in names:
+                attname = self._meta.get_field(name).attname
+                self._loaded[attname] = getattr(self, attname)
+
+    def dirty_fields(self):
+        """
+        Returns the attribute names of the fields changed since this object
+        was loaded or last saved, or None if that isn't known.
+        """
+        if self._loaded is None or self.pk is None:
+            return None
+        return [f.attname for f in self._meta.fields
+                if getattr(self, f.attname) != self._loaded[f.attname]]
+
+    # True when expired data was loaded and queued for a background refresh.
+    refresh_pending = False
 
     def __init__(self, *args, **kwargs):
         super(CachedClusterObject, self).__init__(*args, **kwargs)
-        self.load_info()
+        if self._deferred:
+            # Loaded by light(), or with other fields deferred, e.g. when
+            # loading a deferred field.  The info is decoded when first
+            # accessed.
+            self.lightweight = True
+        else:
+            if self.pk is not None:
+                self.mark_clean()
+            self.load_info()
+
+    def __eq__(self, other):
+        # Objects loaded by light() are instances of a deferred subclass,
+        # which are the same objects all the same.
+        return isinstance(other, CachedClusterObject) \
+            and self._meta.concrete_model == other._meta.concrete_model \
+            and self._get_pk_val() == other._get_pk_val()
 
     @property
     def info(self):
@@ -70,14 +239,33 @@ class CachedClusterObject(models.Model):
         lazily saved.
 
         Writes to this property do *not* force serialization.
+
+        Decoded info is shared through INFO_CACHE and must not be modified in
+        place; assign a modified copy instead.
         """
 
         if self.__info is None:
-            if self.serialized_info:
-                self.__info = cPickle.loads(str(self.serialized_info))
+            key = self._info_cache_key()
+            if key is not None:
+                self.__info = INFO_CACHE.get(key)
+            if self.__info is None and self.serialized_info:
+                self.__info = loads_info(self.serialized_info)
+                if key is not None:
+                    INFO_CACHE.put(key, self.__info)
         return self.__info
 
+    def _info_cache_key(self):
+        """
+        Returns the key of this object's info in INFO_CACHE, or None if the
+        info hasn't been cached in the database.
+        """
+        if self.pk is None or self.cached is None:
+            return None
+        return (self._meta.concrete_model, self.pk, self.mtime, self.cached)
+
     def _set_info(self, value):
+        if self.__replaced_key is None:
+            self.__replaced_key = self._info_cache_key()
         self.__info = value
         if value is not None:
             self.parse_info()
@@ -85,6 +273,18 @@ class CachedClusterObject(models.Model):
 
     info = info.setter(_set_info)
 
+    def _get_ctime(self):
+        if self.lightweight and not self.__transient_parsed:
+            self.__transient_parsed = True
+            if self.info:
+                self.parse_transient_info()
+        return self.__ctime
+
+    def _set_ctime(self, value):
+        self.__ctime = value
+
+    ctime = property(_get_ctime, _set_ctime)
+
     def load_info(self):
         """
         Load cached info retrieved from the ganeti cluster.  This function
@@ -98,15 +298,97 @@ class CachedClusterObject(models.Model):
         epsilon = timedelta(0, 0, 0, settings.LAZY_CACHE_REFRESH)
 
         if self.id:
-            if (self.ignore_cache
-                    or self.cached is None
-                    or datetime.now() > self.cached + epsilon):
-                self.refresh()
+            expired = self.cached is not None and \
+                datetime.now() > self.cached + epsilon
+            if self.ignore_cache or self.cached is None or expired:
+                if self.serialized_info and self.cluster_unreachable:
+                    # Don't wait on a cluster known to be down, show what we
+                    # have until it answers again.
+                    self.parse_transient_info()
+                    self.error = 'Cluster unreachable, showing cached data'
+                    if self.cached is not None:
+                        self.error += self.cached.strftime(
+                            ' from %Y-%m-%d %H:%M')
+                elif (not self.ignore_cache and self.serialized_info
+                        and not refreshing() and refresher_alive()):
+                    # The refresher daemon is running and will get to it.
+                    self.parse_transient_info()
+                elif (settings.LAZY_CACHE_REFRESH_BACKGROUND
+                        and not self.ignore_cache and self.serialized_info
+                        and not refreshing()):
+                    # Show the expired data and have it refreshed in the
+                    # background.  Objects with running jobs are still
+                    # refreshed right away, see check_job_status().
+                    self.parse_transient_info()
+                    self.refresh_pending = True
+                    REFRESH_QUEUE.enqueue(self.__class__, self.id)
+                elif self.serialized_info:
+                    self.refresh_once()
+                else:
+                    self.refresh()
             elif self.info:
                 self.parse_transient_info()
             else:
                 self.error = 'No Cached Info'
 
+    def refresh_once(self):
+        """
+        Refreshes this object unless another process is refreshing it already,
+        in which case the cached data is shown instead.  Keeps concurrent
+        requests for the same expired object from all calling the cluster.
+        """
+        lease = self.acquire_refresh_lease()
+        if lease is None:
+            self.parse_transient_info()
+            self.refresh_pending = True
+            return
+        try:
+            self.refresh()
+        finally:
+            self.release_refresh_lease(lease)
+
+    def acquire_refresh_lease(self):
+        """
+        Takes the lease on refreshing this object with a conditional UPDATE,
+        so that only one process gets it.  Leases expire after REFRESH_LEASE
+        seconds in case their holder dies.
+
+        @return the lease's expiry, or None if another process holds it
+        """
+        now = datetime.now()
+        # Without microseconds, which not all databases store.
+        lease = (now + timedelta(seconds=settings.REFRESH_LEASE)) \
+            .replace(microsecond=0)
+        taken = self.__class__.objects.filter(pk=self.pk) \
+            .filter(Q(refresh_lease__isnull=True) | Q(refresh_lease__lt=now)) \
+            .update(refresh_lease=lease)
+        if not taken:
+            return None
+        self.refresh_lease = lease
+        self.mark_saved('refresh_lease')
+        return lease
+
+    def release_refresh_lease(self, lease):
+        """
+        Gives up a lease taken with acquire_refresh_lease(), unless it expired
+        and was taken by another process meanwhile.
+        """
+        self.__class__.objects.filter(pk=self.pk, refresh_lease=lease) \
+            .update(refresh_lease=None)
+        self.refresh_lease = None
+        self.mark_saved('refresh_lease')
+
+    @property
+    def cluster_unreachable(self):
+        """
+        True while the RAPI client has given up on the cluster after repeated
+        connection failures.  Once the cool-down has passed the next refresh
+        goes through, as the probe which may close the circuit again.
+        """
+
+        circuit = self.rapi.circuit
+        return circuit is not None and circuit.state == CIRCUIT_OPEN
+
     def parse_info(self):
         """
         Parse all of the attached metadata, and attach it to this object.
@@ -145,9 +427,9 @@ class CachedClusterObject(models.Model):
                 mtime = self.mtime
 
             if self.id and (self.mtime is None or mtime > self.mtime):
-                # there was an update. Set info and save the object
+                # there was an update. Set info and save the changed fields
                 self.info = info_
-                self.save()
+                self.save(dirty_only=True)
             else:
                 # There was no change on the server. Only update the cache
                 # time. This bypasses the info serialization mechanism and
@@ -158,6 +440,7 @@ class CachedClusterObject(models.Model):
                 elif self.id is not None:
                     self.__class__.objects.filter(pk=self.id) \
                         .update(cached=self.cached)
+                self.mark_saved('cached', *job_data)
 
         except GanetiApiError as e:
             # Use regular expressions to match the quoted message
@@ -191,39 +474,44 @@ class CachedClusterObject(models.Model):
 
     def check_job_status(self):
         # preventing circular import
-        from ganeti_webmgr.jobs.models import Job
+        from ganeti_webmgr.jobs.models import Job, FINISHED_STATUSES
 
-        if not self.last_job_id:
+        if not self.last_job_id or settings.JOB_WATCHER:
+            # The job watcher updates this object once the job finishes.
             return {}
 
         ct = ContentType.objects.get_for_model(self)
         qs = Job.objects.filter(content_type=ct, object_id=self.pk)
-        jobs = qs.order_by("job_id")
-
-        updates = {}
-        status = 'unknown'
-        op = None
+        jobs = list(qs.order_by("job_id")
+                    .values_list("id", "job_id", "status", "op"))
 
-        for job in jobs:
-            try:
-                data = self.rapi.GetJobStatus(job.job_id)
-
-                if Job.valid_job(data):
-                    op = Job.parse_op(data)
-                    status = data['status']
-
-            except GanetiApiError:
-                pass
-
-            if status in ('success', 'error'):
-                for k, v in Job.parse_persistent_info(data).items():
-                    setattr(job, k, v)
-
-            if status == 'unknown':
-                job.status = "unknown"
-                job.ignore_cache = False
+        # Finished jobs were completed when they finished; only the last job
+        # may have been finished elsewhere without updating this object.
+        pending = [(pk, job_id) for pk, job_id, status, op in jobs
+                   if status not in FINISHED_STATUSES]
+        try:
+            infos = Job.refresh_status(self.rapi, pending)
+        except GanetiApiError:
+            # The jobs can't be queried; mark them unknown rather than leave
+            # this object waiting for them forever.
+            infos = Job.record_status(pending, {})
 
-            if status in ('success', 'error', 'unknown'):
+        updates = {}
+        status = None
+        for pk, job_id, status, op in jobs:
+            if pk in infos:
+                info = infos[pk]
+                if info is None:
+                    status = 'unknown'
+                else:
+                    status = info['status']
+                    op = Job.parse_op(info)
+            elif status not in FINISHED_STATUSES or pk != self.last_job_id:
+                continue
+
+            if status in FINISHED_STATUSES:
+                # The job may have changed what the cluster reports.
+                self.rapi.InvalidateCache()
                 _updates = self._complete_job(self.cluster_id,
                                               self.hostname, op, status)
                 # XXX if the delete flag is set in updates then delete this
@@ -237,17 +525,60 @@ class CachedClusterObject(models.Model):
                         # Revisit that when we finally nuke all this caching
                         # bullshit.
                         self.delete()
-                        job.delete()
+                        Job.objects.filter(pk=pk).delete()
                     else:
                         updates.update(_updates)
 
         # we only care about the very last job for resetting the cache flags
-        if not jobs or status in ('success', 'error', 'unknown'):
+        if not jobs or status in FINISHED_STATUSES:
             updates['ignore_cache'] = False
             updates['last_job'] = None
 
         return updates
 
+    @classmethod
+    def finish_job(cls, pk, job_id, op, status):
+        """
+        Applies the side effects of a finished job to the object it ran on.
+
+        This works on the database rows directly.  Loading the object would
+        refresh it and poll its jobs all over again.
+
+        @param pk - primary key of the object the job ran on
+        @param job_id - primary key of the finished Job
+        """
+        # preventing circular import
+        from ganeti_webmgr.jobs.models import Job
+
+        qs = cls.objects.filter(pk=pk)
+        if any(f.name == 'cluster' for f in cls._meta.fields):
+            cluster_field = 'cluster'
+        else:
+            cluster_field = 'id'
+        rows = qs.values_list(cluster_field, 'hostname', 'last_job')
+        if not rows:
+            return
+        cluster_id, hostname, last_job_id = rows[0]
+
+        updates = cls._complete_job(cluster_id, hostname, op, status) or {}
+        if 'deleted' in updates:
+            # Clear the cache flags first, so that loading the object to
+            # delete it neither refreshes it nor polls its jobs.  See
+            # check_job_status() for why the job is deleted too.
+            qs.update(ignore_cache=False, last_job=None,
+                      cached=datetime.now())
+            for obj in qs:
+                obj.delete()
+            Job.objects.filter(pk=job_id).delete()
+            return
+
+        # we only care about the very last job for resetting the cache flags
+        if last_job_id == job_id:
+            updates['ignore_cache'] = False
+            updates['last_job'] = None
+        if updates:
+            qs.update(**updates)
+
     @classmethod
     def _complete_job(cls, cluster_id, hostname, op, status):
         """
@@ -293,6 +624,216 @@ class CachedClusterObject(models.Model):
             return {'mtime': None}
         return {'mtime': datetime.fromtimestamp(info['mtime'])}
 
+    @classmethod
+    def parse_bulk_info(cls, cluster, info):
+        """
+        Parse the persistent properties of one of a cluster's objects from
+        info retrieved in bulk, see parse_persistent_info().
+
+        Children may override this to resolve related objects once for the
+        whole cluster rather than once per object.
+        """
+        return cls.parse_persistent_info(info)
+
+    @classmethod
+    def bulk_refresh_queryset(cls, cluster):
+        """
+        Returns the objects of a cluster that bulk refreshes should update.
+
+        Children may override this to leave out objects which must not be
+        refreshed.
+        """
+        return cls.objects.filter(cluster=cluster)
+
+    @classmethod
+    def apply_bulk_info(cls, cluster, infos, partial=False):
+        """
+        Update the cached objects of a cluster from info retrieved in bulk.
+
+        Objects are matched to the entries of ``infos`` by hostname.  Objects
+        whose mtime advanced, or all objects unless BULK_MTIME_CHECK is set,
+        have their persistent fields rewritten; the cache timestamp of all
+        other objects is bumped in a single statement.  All updates happen in
+        one transaction.
+
+        ``infos`` is consumed one entry at a time, so it may be a generator
+        such as GanetiRapiClient.IterInstances() which decodes the entries
+        as they are received.
+
+        This only works for children which have ``cluster`` and ``hostname``
+        fields.
+
+        @param infos - iterable of info dicts, each including its ``name``
+        @param partial - True if the info dicts only contain the fields that
+        parse_persistent_info() needs.  The searchable fields of changed
+        objects are updated, but their cached info and timestamps are left
+        alone so that the next refresh still retrieves the complete info.
+
+        @return tuple of (updated, unchanged) object counts
+        """
+        now = datetime.now()
+        rows = cls.bulk_refresh_queryset(cluster) \
+            .values_list('hostname', 'id', 'mtime')
+        rows = dict((row[0], row[1:]) for row in rows)
+        # values_list() returns the raw column, not a datetime
+        to_datetime = cls._meta.get_field('mtime').to_python
+
+        updated = 0
+        unchanged = []
+        with transaction.commit_on_success():
+            for info in infos:
+                row = rows.pop(info['name'], None)
+                if row is None:
+                    continue
+
+                id, mtime = row
+                mtime = to_datetime(mtime)
+
+                if info['mtime']:
+                    new_mtime = datetime.fromtimestamp(info['mtime'])
+                else:
+                    new_mtime = None
+
+                if cls.BULK_MTIME_CHECK and mtime is not None \
+                        and not new_mtime > mtime:
+                    unchanged.append(id)
+                    continue
+
+                data = cls.parse_bulk_info(cluster, info)
+                if partial:
+                    del data['mtime']
+                else:
+                    data['serialized_info'] = dumps_info(info)
+                    data['cached'] = now
+                cls.objects.filter(pk=id).update(**field_names(cls, data))
+                updated += 1
+
+            for ids in chunks(unchanged, 500):
+                cls.objects.filter(pk__in=ids).update(cached=now)
+
+        return updated, len(unchanged)
+
+    @classmethod
+    def refresh_fields(cls, cluster):
+        """
+        Refresh the searchable fields of all of a cluster's objects with a
+        single RAPI query.
+
+        Only the fields listed in QUERY_FIELDS are requested from the
+        cluster, instead of retrieving the complete info for each object in
+        turn.  See apply_bulk_info() for how the results are stored.
+
+        @return tuple of (updated, unchanged) object counts
+        """
+        infos = cluster.rapi.QueryObjects(cls.QUERY_RESOURCE,
+                                          list(cls.QUERY_FIELDS))
+        return cls.apply_bulk_info(cluster, infos, partial=True)
+
+    @classmethod
+    def refresh_bulk(cls, cluster):
+        """
+        Refresh all of a cluster's objects with a single bulk RAPI request,
+        instead of one request and one save() per object.
+
+        See apply_bulk_info() for how the results are stored.
+
+        @return tuple of (updated, unchanged) object counts
+        """
+        infos = getattr(cluster.rapi, cls.BULK_INFO_METHOD)()
+        return cls.apply_bulk_info(cluster, infos)
+
+    @classmethod
+    def sync(cls, cluster, remove=False):
+        """
+        Reconcile the cached objects of a cluster with a single bulk listing
+        of the cluster's objects:
+            * objects missing from the database are created, with their info
+              already cached
+            * objects whose mtime advanced are updated, see apply_bulk_info()
+            * objects no longer in ganeti are deleted, if ``remove`` is set
+
+        @return SyncSummary
+        """
+        start = time.time()
+        db = set(cls.objects.filter(cluster=cluster)
+                 .values_list('hostname', flat=True))
+        seen = set()
+        missing = []
+
+        def known(infos):
+            # Set aside new objects while the listing is being applied.
+            for info in infos:
+                seen.add(info['name'])
+                if info['name'] in db:
+                    yield info
+                else:
+                    missing.append(info)
+
+        infos = getattr(cluster.rapi, cls.BULK_INFO_METHOD)()
+        updated, unchanged = cls.apply_bulk_info(cluster, known(infos))
+
+        now = datetime.now()
+        added = 0
+        for infos in chunks(missing, 500):
+            added += cls.create_bulk(cluster, infos, now)
+
+        removed = 0
+        if remove:
+            vanished = list(db - seen)
+            with transaction.commit_on_success():
+                for hostnames in chunks(vanished, 500):
+                    cls.objects.filter(cluster=cluster,
+                                       hostname__in=hostnames).delete()
+            removed = len(vanished)
+
+        return SyncSummary(added, removed, updated, unchanged,
+                           time.time() - start)
+
+    @classmethod
+    def create_bulk(cls, cluster, infos, now):
+        """
+        Creates objects of a cluster from info retrieved in bulk, with a
+        single INSERT in its own transaction.
+
+        bulk_create() sends no post_save signals, so the new objects are
+        indexed for search here.  If another process created some of the
+        objects meanwhile, the others are created one at a time instead.
+
+        @return number of objects created
+        """
+        hostnames = [info['name'] for info in infos]
+        try:
+            with transaction.commit_on_success():
+                cls.objects.bulk_create([cls.from_bulk_info(cluster, info, now)
+                                         for info in infos])
+        except IntegrityError:
+            created = 0
+            for info in infos:
+                try:
+                    with transaction.commit_on_success():
+                        cls.from_bulk_info(cluster, info, now) \
+                            .save(force_insert=True)
+                    created += 1
+                except IntegrityError:
+                    pass
+            return created
+
+        update_search_index(cls, cls.objects.filter(cluster=cluster,
+                                                    hostname__in=hostnames))
+        return len(infos)
+
+    @classmethod
+    def from_bulk_info(cls, cluster, info, now):
+        """
+        Returns a new, unsaved object of a cluster with its info cached.
+
+        @param info - complete info of the object, as retrieved in bulk
+        """
+        data = cls.parse_bulk_info(cluster, info)
+        return cls(cluster=cluster, hostname=info['name'],
+                   cluster_hash=cluster.hash,
+                   serialized_info=dumps_info(info), cached=now, **data)
+
 
 class Cluster(CachedClusterObject):
     """
@@ -325,6 +866,9 @@ class Cluster(CachedClusterObject):
     class Meta:
         ordering = ["hostname", "description"]
 
+    # A new hash means new credentials, which the post_save signals pass on.
+    FULL_SAVE_FIELDS = ('hash',)
+
     def __unicode__(self):
         return self.hostname
 
@@ -472,31 +1016,25 @@ class Cluster(CachedClusterObject):
         this ganeti cluster has:
             * VMs no longer in ganeti are deleted
             * VMs missing from the database are added
+            * all VMs are refreshed
+
+        @return SyncSummary
         """
         # preventing circular imports
         from ganeti_webmgr.virtualmachines.models import VirtualMachine
 
-        ganeti = self.instances()
-        db = self.virtual_machines.all().values_list('hostname', flat=True)
-
-        # add VMs missing from the database
-        for hostname in filter(lambda x: unicode(x) not in db, ganeti):
-            vm = VirtualMachine.objects.create(cluster=self, hostname=hostname)
-            vm.refresh()
+        return VirtualMachine.sync(self, remove)
 
-        # deletes VMs that are no longer in ganeti
-        if remove:
-            missing_ganeti = filter(lambda x: str(x) not in ganeti, db)
-            if missing_ganeti:
-                self.virtual_machines \
-                    .filter(hostname__in=missing_ganeti).delete()
+    def refresh_virtual_machines(self):
+        """
+        Refresh the cached info of all VMs from a single bulk RAPI request.
 
-        # Get up to date data on all VMs
-        self.refresh_virtual_machines()
+        @return tuple of (updated, unchanged) VM counts
+        """
+        # preventing circular imports
+        from ganeti_webmgr.virtualmachines.models import VirtualMachine
 
-    def refresh_virtual_machines(self):
-        for vm in self.virtual_machines.all():
-            vm.refresh()
+        return VirtualMachine.refresh_bulk(self)
 
     def sync_nodes(self, remove=False):
         """
@@ -504,30 +1042,28 @@ class Cluster(CachedClusterObject):
         this ganeti cluster has:
             * Nodes no longer in ganeti are deleted
             * Nodes missing from the database are added
+            * all Nodes are refreshed
+
+        @return SyncSummary
         """
         # to prevent circular imports
-        from ganeti_webmgr.nodes.models import Node
+        from ganeti_webmgr.nodes.models import Node, forget_node_resolver
 
-        ganeti = self.rapi.GetNodes()
-        db = self.nodes.all().values_list('hostname', flat=True)
-
-        # add Nodes missing from the database
-        for hostname in filter(lambda x: unicode(x) not in db, ganeti):
-            node = Node.objects.create(cluster=self, hostname=hostname)
-            node.refresh()
+        try:
+            return Node.sync(self, remove)
+        finally:
+            forget_node_resolver(self.id)
 
-        # deletes Nodes that are no longer in ganeti
-        if remove:
-            missing_ganeti = filter(lambda x: str(x) not in ganeti, db)
-            if missing_ganeti:
-                self.nodes.filter(hostname__in=missing_ganeti).delete()
+    def refresh_nodes(self):
+        """
+        Refresh the cached info of all Nodes from a single bulk RAPI request.
 
-        # Get up to date data for all Nodes
-        self.refresh_nodes()
+        @return tuple of (updated, unchanged) Node counts
+        """
+        # to prevent circular imports
+        from ganeti_webmgr.nodes.models import Node
 
-    def refresh_nodes(self):
-        for node in self.nodes.all():
-            node.refresh()
+        return Node.refresh_bulk(self)
 
     @property
     def missing_in_ganeti(self):
@@ -535,9 +1071,18 @@ class Cluster(CachedClusterObject):
         Returns a list of VirtualMachines that are missing from the Ganeti
         cluster but present in the database.
         """
-        ganeti = self.instances()
+        return self.get_missing_in_ganeti()
+
+    def get_missing_in_ganeti(self, ganeti=None):
+        """
+        Same as missing_in_ganeti, optionally comparing against a list of
+        instance names that was already retrieved from the cluster.
+        """
+        if ganeti is None:
+            ganeti = self.instances()
         qs = self.virtual_machines.exclude(template__isnull=False)
         db = qs.values_list('hostname', flat=True)
+        ganeti = set(ganeti)
         return [x for x in db if str(x) not in ganeti]
 
     @property
@@ -546,8 +1091,16 @@ class Cluster(CachedClusterObject):
         Returns list of VirtualMachines that are missing from the database, but
         present in ganeti
         """
-        ganeti = self.instances()
-        db = self.virtual_machines.all().values_list('hostname', flat=True)
+        return self.get_missing_in_db()
+
+    def get_missing_in_db(self, ganeti=None):
+        """
+        Same as missing_in_db, optionally comparing against a list of instance
+        names that was already retrieved from the cluster.
+        """
+        if ganeti is None:
+            ganeti = self.instances()
+        db = set(self.virtual_machines.values_list('hostname', flat=True))
         return [x for x in ganeti if unicode(x) not in db]
 
     @property
@@ -560,7 +1113,7 @@ class Cluster(CachedClusterObject):
             ganeti = self.rapi.GetNodes()
         except GanetiApiError:
             ganeti = []
-        db = self.nodes.all().values_list('hostname', flat=True)
+        db = set(self.nodes.values_list('hostname', flat=True))
         return [x for x in ganeti if unicode(x) not in db]
 
     @property
@@ -574,7 +1127,8 @@ class Cluster(CachedClusterObject):
         except GanetiApiError:
             ganeti = []
         db = self.nodes.all().values_list('hostname', flat=True)
-        return filter(lambda x: str(x) not in ganeti, db)
+        ganeti = set(ganeti)
+        return [x for x in db if str(x) not in ganeti]
 
     @property
     def available_ram(self):
@@ -630,6 +1184,9 @@ class Cluster(CachedClusterObject):
         }
 
     def _refresh(self):
+        if self.ignore_cache:
+            # a job is changing the cluster, don't settle for cached info
+            self.rapi.InvalidateCache(CACHE_INFO)
         return self.rapi.GetInfo()
 
     def instances(self, bulk=False):
@@ -641,6 +1198,31 @@ class Cluster(CachedClusterObject):
         except GanetiApiError:
             return []
 
+    @classmethod
+    def instances_for(cls, clusters, bulk=False):
+        """
+        Gets all VMs of several clusters at once.
+
+        The RAPI calls are issued concurrently, so this takes about as long as
+        the slowest cluster instead of the sum of all of them.
+
+        @return dict of cluster id -> list of instances.  Like instances(),
+        clusters that could not be reached map to an empty list.
+        """
+        calls = dict((cluster.id, (cluster.rapi, 'GetInstances', (),
+                                   {'bulk': bulk}))
+                     for cluster in clusters)
+
+        instances = {}
+        for id, result, error in rapi_fan_out(calls):
+            if error is None:
+                instances[id] = result
+            elif isinstance(error, GanetiApiError):
+                instances[id] = []
+            else:
+                raise error
+        return instances
+
     def instance(self, instance):
         """Get a single Instance
         Calls the rapi client for a specific instance.
@@ -665,3 +1247,44 @@ class Cluster(CachedClusterObject):
         Cluster.objects.filter(pk=self.id) \
             .update(last_job=job, ignore_cache=True)
         return job
+
+
+class Heartbeat(models.Model):
+    """
+    Last sign of life of a long-running process, such as the refresher
+    daemon.  Web workers look at it to know whether the process is running.
+    """
+    name = models.CharField(max_length=50, unique=True)
+    hostname = models.CharField(max_length=255, blank=True)
+    pid = models.IntegerField(null=True)
+    beat = models.DateTimeField()
+
+    def __unicode__(self):
+        return self.name
+
+    @classmethod
+    def touch(cls, name, hostname='', pid=None):
+        """
+        Records that a process is alive now.
+        """
+        now = datetime.now()
+        updated = cls.objects.filter(name=name) \
+            .update(hostname=hostname, pid=pid, beat=now)
+        if not updated:
+            cls.objects.create(name=name, hostname=hostname, pid=pid,
+                               beat=now)
+
+    @classmethod
+    def alive(cls, name, timeout):
+        """
+        True if the process beat within the last ``timeout`` seconds.
+        """
+        since = datetime.now() - timedelta(seconds=timeout)
+        return cls.objects.filter(name=name, beat__gte=since).exists()
+
+    @classmethod
+    def stop(cls, name):
+        """
+        Records that a process stopped.
+        """
+        cls.objects.filter(name=name).delete()
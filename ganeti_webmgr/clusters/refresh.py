@@ -0,0 +1,180 @@
+# Copyright (c) 2012 Oregon State University Open Source Lab
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.    See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.
+
+
+"""
+Background refreshing of expired cached cluster objects.
+
+With settings.LAZY_CACHE_REFRESH_BACKGROUND, loading an object whose cache
+expired returns the cached data right away and queues the object here.
+Worker threads then refresh it, so listing many expired objects no longer
+waits on one RAPI call per object.
+"""
+
+from contextlib import contextmanager
+import logging
+import Queue
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection
+
+_local = threading.local()
+
+
+def refreshing():
+    """
+    True while the current thread is refreshing a queued object.  Expired
+    objects loaded meanwhile are refreshed right away instead of queued.
+    """
+    return getattr(_local, 'refreshing', False)
+
+
+@contextmanager
+def refresh_thread():
+    """
+    Marks the current thread as refreshing for the duration of the block, see
+    refreshing().
+    """
+    _local.refreshing = True
+    try:
+        yield
+    finally:
+        _local.refreshing = False
+
+
+# Name of the refresher daemon's heartbeat, and when this process last looked
+# at it.
+REFRESHER = 'refresher'
+_refresher = {'checked': None, 'alive': False}
+
+
+def refresher_alive():
+    """
+    True while the refresher daemon keeps caches fresh, i.e. its heartbeat is
+    recent.  Expired objects are then shown as they are instead of refreshed
+    by the page loading them.
+
+    The heartbeat is looked up at most every REFRESHER_HEARTBEAT seconds.
+    """
+    from ganeti_webmgr.clusters.models import Heartbeat
+
+    now = time.time()
+    checked = _refresher['checked']
+    if checked is None or now - checked >= settings.REFRESHER_HEARTBEAT:
+        _refresher['alive'] = Heartbeat.alive(
+            REFRESHER, settings.REFRESHER_HEARTBEAT * 3)
+        _refresher['checked'] = now
+    return _refresher['alive']
+
+
+class RefreshQueue(object):
+    """
+    A queue of objects to refresh, each queued at most once at a time.
+
+    Objects are identified by their model and primary key; they are loaded
+    again when their turn comes, and only refreshed if still expired.
+    """
+
+    def __init__(self, workers=2, logger=logging):
+        """
+        @param workers - number of worker threads.  With 0 workers, queued
+        objects are only refreshed by calling process().
+        """
+        self.workers = workers
+        self.logger = logger
+        self._tasks = Queue.Queue()
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def enqueue(self, model, pk):
+        """
+        Queues an object for refreshing.
+
+        @return True if queued, False if the object was already queued
+        """
+        key = (model, pk)
+        with self._lock:
+            if key in self._pending:
+                return False
+            self._pending.add(key)
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._work,
+                                          name="cache-refresh-%d" %
+                                          len(self._threads))
+                thread.daemon = True
+                thread.start()
+                self._threads.append(thread)
+
+        self._tasks.put(key)
+        return True
+
+    def _work(self):
+        """
+        Worker thread main loop.
+        """
+        while True:
+            key = self._tasks.get()
+            try:
+                self.refresh(*key)
+            finally:
+                # Each thread has its own connection; don't leave it open
+                # while waiting for the next object.
+                connection.close()
+
+    def refresh(self, model, pk):
+        """
+        Loads a queued object, which refreshes it if it is still expired.
+        """
+        try:
+            with refresh_thread():
+                model.objects.get(pk=pk)
+        except model.DoesNotExist:
+            pass
+        except Exception:
+            self.logger.exception("Could not refresh %s %s",
+                                  model.__name__, pk)
+        finally:
+            with self._lock:
+                self._pending.discard((model, pk))
+
+    def process(self):
+        """
+        Refreshes all queued objects in the calling thread.
+
+        @return number of objects processed
+        """
+        count = 0
+        while True:
+            try:
+                key = self._tasks.get(False)
+            except Queue.Empty:
+                return count
+            self.refresh(*key)
+            count += 1
+
+    def __len__(self):
+        return len(self._pending)
+
+    def __contains__(self, key):
+        return key in self._pending
+
+
+# Queue of expired objects loaded by this process.
+REFRESH_QUEUE = RefreshQueue(settings.LAZY_CACHE_REFRESH_WORKERS)
@@ -1,3 +1,5 @@
+from .daemon import *
 from .forms import *
 from .models import *
+from .refresh import *
 from .views import *
@@ -0,0 +1,245 @@
+# Copyright (c) 2012 Oregon State University Open Source Lab
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.    See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.
+
+from datetime import datetime, timedelta
+
+from django.test import TestCase
+
+from ganeti_webmgr.clusters import refresh
+from ganeti_webmgr.clusters.daemon import Refresher
+from ganeti_webmgr.clusters.models import Cluster, Heartbeat
+from ganeti_webmgr.clusters.refresh import REFRESHER, refresher_alive
+from ganeti_webmgr.jobs.models import Job
+from ganeti_webmgr.nodes.models import Node
+from ganeti_webmgr.utils.proxy import CallProxy
+from ganeti_webmgr.utils.proxy.constants import (INFO, JOB_RUNNING,
+                                                 JOB_ERROR)
+from ganeti_webmgr.virtualmachines.models import VirtualMachine
+
+__all__ = ['TestHeartbeat', 'TestRefresher']
+
+
+class NoThreadRefresher(Refresher):
+    """
+    Records started refreshes instead of running them.
+    """
+
+    def start(self, cluster_id, hostname):
+        self._running[cluster_id] = None
+
+
+def forget_heartbeat():
+    # Make the next refresher_alive() look at the heartbeat again.
+    refresh._refresher['checked'] = None
+
+
+class TestHeartbeat(TestCase):
+
+    def setUp(self):
+        self.cluster = Cluster.objects.create(hostname='ganeti.example.test')
+        self.cluster.refresh()
+        expired = datetime.now() - timedelta(days=1)
+        Cluster.objects.filter(pk=self.cluster.pk).update(cached=expired)
+        self.calls = len(self.cluster.rapi.GetInfo.calls)
+        forget_heartbeat()
+
+    def tearDown(self):
+        Heartbeat.objects.all().delete()
+        forget_heartbeat()
+        self.cluster.delete()
+
+    def test_alive(self):
+        self.assertFalse(Heartbeat.alive(REFRESHER, 45))
+        Heartbeat.touch(REFRESHER, 'gwm.example.test', 1234)
+        Heartbeat.touch(REFRESHER, 'gwm.example.test', 1234)
+        self.assertEqual(1, Heartbeat.objects.count())
+        self.assertTrue(Heartbeat.alive(REFRESHER, 45))
+
+        old = datetime.now() - timedelta(minutes=5)
+        Heartbeat.objects.update(beat=old)
+        self.assertFalse(Heartbeat.alive(REFRESHER, 45))
+
+        Heartbeat.stop(REFRESHER)
+        self.assertFalse(Heartbeat.objects.exists())
+
+    def test_refresher_alive_cached(self):
+        """
+        The heartbeat is not looked up on every call.
+        """
+        self.assertFalse(refresher_alive())
+        Heartbeat.touch(REFRESHER)
+        self.assertFalse(refresher_alive())
+        forget_heartbeat()
+        self.assertTrue(refresher_alive())
+
+    def test_skip_inline_refresh(self):
+        """
+        Verifies:
+            * expired objects are shown as cached while the refresher runs
+            * objects with running jobs are still refreshed right away
+            * the refresher itself refreshes expired objects
+        """
+        Heartbeat.touch(REFRESHER)
+        cluster = Cluster.objects.get(pk=self.cluster.pk)
+        self.assertEqual(INFO, cluster.info)
+        self.assertEqual(self.calls, len(cluster.rapi.GetInfo.calls))
+
+        with refresh.refresh_thread():
+            Cluster.objects.get(pk=self.cluster.pk)
+        self.assertEqual(self.calls + 1, len(cluster.rapi.GetInfo.calls))
+
+        Cluster.objects.filter(pk=self.cluster.pk).update(ignore_cache=True)
+        Cluster.objects.get(pk=self.cluster.pk)
+        self.assertEqual(self.calls + 2, len(cluster.rapi.GetInfo.calls))
+
+    def test_refresher_stopped(self):
+        Cluster.objects.get(pk=self.cluster.pk)
+        self.assertEqual(self.calls + 1,
+                         len(self.cluster.rapi.GetInfo.calls))
+
+
+class TestRefresher(TestCase):
+
+    def setUp(self):
+        self.cluster = Cluster.objects.create(hostname='ganeti.example.test',
+                                              slug='ganeti')
+        self.other = Cluster.objects.create(hostname='other.example.test',
+                                            slug='other')
+        self.refresher = NoThreadRefresher(workers=1, interval=300, jitter=30,
+                                           intervals={'other': 60})
+        forget_heartbeat()
+
+    def tearDown(self):
+        Heartbeat.objects.all().delete()
+        forget_heartbeat()
+        Job.objects.all().delete()
+        VirtualMachine.objects.all().delete()
+        Node.objects.all().delete()
+        Cluster.objects.all().delete()
+
+    def test_cluster_interval(self):
+        self.assertEqual(300, self.refresher.cluster_interval(
+            'ganeti', 'ganeti.example.test'))
+        self.assertEqual(60, self.refresher.cluster_interval(
+            'other', 'other.example.test'))
+
+        for i in range(20):
+            at = self.refresher.next_run('other', 'other.example.test', 1000)
+            self.assertTrue(1030 <= at <= 1090, at)
+
+    def test_update_schedule(self):
+        """
+        Verifies:
+            * first refreshes are spread over the jitter
+            * deleted clusters are forgotten
+        """
+        self.refresher.update_schedule(1000)
+        self.assertEqual(set([self.cluster.pk, self.other.pk]),
+                         set(self.refresher.schedule))
+        for at, slug, hostname in self.refresher.schedule.values():
+            self.assertTrue(1000 <= at <= 1030, at)
+
+        self.other.delete()
+        self.refresher.update_schedule(1000)
+        self.assertEqual([self.cluster.pk], self.refresher.schedule.keys())
+
+    def test_run_once(self):
+        """
+        Verifies:
+            * due clusters are refreshed, most overdue first
+            * no more than ``workers`` clusters are refreshed at once
+            * refreshed clusters are scheduled for their next refresh
+            * the heartbeat is recorded
+        """
+        self.refresher.update_schedule(1000)
+        self.refresher.schedule[self.cluster.pk] = (1000, 'ganeti',
+                                                    'ganeti.example.test')
+        self.refresher.schedule[self.other.pk] = (1001, 'other',
+                                                  'other.example.test')
+
+        self.assertEqual([], self.refresher.run_once(999))
+        self.assertTrue(refresher_alive())
+
+        self.assertEqual([self.cluster.pk], self.refresher.run_once(1002))
+        self.assertEqual(1, self.refresher.busy)
+        self.assertEqual([], self.refresher.run_once(1003))
+        at = self.refresher.schedule[self.cluster.pk][0]
+        self.assertTrue(1272 <= at <= 1332, at)
+
+        del self.refresher._running[self.cluster.pk]
+        self.assertEqual([self.other.pk], self.refresher.run_once(1004))
+
+    def test_refresh_cluster(self):
+        """
+        The cluster, its nodes, virtual machines and pending jobs are
+        refreshed with one request each.  Objects missing from the database
+        are left for an administrator to import.
+        """
+        vm = VirtualMachine.objects.create(cluster=self.cluster,
+                                           hostname='vm1.example.bak')
+        rapi = self.cluster.rapi
+        for method in ('IterNodes', 'IterInstances'):
+            getattr(rapi, method).reset()
+
+        self.assertTrue(self.refresher.refresh(self.cluster.pk,
+                                               self.cluster.hostname))
+        self.assertEqual(1, self.refresher.refreshed)
+        self.assertEqual(1, len(rapi.IterNodes.calls))
+        self.assertEqual(1, len(rapi.IterInstances.calls))
+        self.assertEqual(0, self.cluster.nodes.count())
+        self.assertEqual([vm.pk], list(self.cluster.virtual_machines
+                                       .values_list('pk', flat=True)))
+        self.assertTrue(VirtualMachine.objects.get(pk=vm.pk).cached)
+        cached = Cluster.objects.filter(pk=self.cluster.pk) \
+            .values_list('cached', flat=True)[0]
+        self.assertTrue(cached)
+
+    def test_refresh_failure(self):
+        self.cluster.rapi.GetInfo.error = Exception('unreachable')
+        try:
+            Cluster.objects.filter(pk=self.cluster.pk).update(cached=None)
+            self.assertFalse(self.refresher.refresh(self.cluster.pk,
+                                                    self.cluster.hostname))
+        finally:
+            self.cluster.rapi.GetInfo.error = None
+        self.assertEqual(1, self.refresher.failures)
+
+    def test_refresh_jobs(self):
+        """
+        Verifies:
+            * running jobs get their current status
+            * finished and archived jobs are finished
+        """
+        vm = VirtualMachine.objects.create(cluster=self.cluster,
+                                           hostname='vm.example.test')
+        running = Job.objects.create(job_id=1, cluster=self.cluster, obj=vm,
+                                     status='queued')
+        finished = Job.objects.create(job_id=2, cluster=self.cluster, obj=vm,
+                                      status='running')
+        archived = Job.objects.create(job_id=3, cluster=self.cluster, obj=vm,
+                                      status='running')
+        rapi = self.cluster.rapi
+        CallProxy.patch(rapi, 'GetJobsStatus', False,
+                        {1: JOB_RUNNING, 2: JOB_ERROR})
+
+        self.assertEqual(3, self.refresher.refresh_jobs(self.cluster))
+        self.assertEqual(1, len(rapi.GetJobsStatus.calls))
+        statuses = dict(Job.objects.values_list('pk', 'status'))
+        self.assertEqual({running.pk: 'running', finished.pk: 'error',
+                          archived.pk: 'unknown'}, statuses)
+
+        self.assertEqual(1, self.refresher.refresh_jobs(self.cluster))
@@ -16,21 +16,26 @@
 # USA.
 
 
-from datetime import datetime
+from datetime import datetime, timedelta
+import time
 
 from django.contrib.auth.models import User
 from django.test import TestCase
+from haystack import site
 
-from ganeti_webmgr.utils.proxy.constants import INFO, JOB_RUNNING, JOB
+from ganeti_webmgr.utils.client import CIRCUIT_HALF_OPEN, GanetiApiError
+from ganeti_webmgr.utils.proxy import CallProxy
+from ganeti_webmgr.utils.proxy.constants import (INFO, INSTANCE, INSTANCES,
+                                                 JOB_RUNNING, JOB, NODES)
 
 from ganeti_webmgr.virtualmachines.models import VirtualMachine
-from ganeti_webmgr.clusters.models import Cluster
+from ganeti_webmgr.clusters.models import Cluster, INFO_CACHE
 from ganeti_webmgr.jobs.models import Job
 from ganeti_webmgr.nodes.models import Node
 from ganeti_webmgr.utils.models import Quota
 
 
-__all__ = ['TestClusterModel']
+__all__ = ['TestClusterModel', 'TestLightQuerySet', 'TestInfoCache']
 
 
 class TestClusterModel(TestCase):
@@ -164,22 +169,27 @@ class TestClusterModel(TestCase):
 
         Verifies:
             * VMs no longer in ganeti are deleted
-            * VMs missing from the database are added
+            * VMs missing from the database are added, with their info
+            * a summary of the changes is returned
         """
         cluster = Cluster(hostname='ganeti.example.test')
         cluster.save()
-        vm_missing = 'gimager.example.bak'
+        vm_missing = 'vm1.example.bak'
         vm_current = VirtualMachine(cluster=cluster,
-                                    hostname='gimager2.example.bak')
+                                    hostname='vm2.example.bak')
         vm_removed = VirtualMachine(cluster=cluster,
                                     hostname='does.not.exist.org')
         vm_current.save()
         vm_removed.save()
-
-        cluster.sync_virtual_machines()
-        self.assertTrue(VirtualMachine.objects.get(cluster=cluster,
-                                                   hostname=vm_missing),
-                        'missing vm was not created')
+        calls = len(cluster.rapi.GetInstance.calls)
+
+        summary = cluster.sync_virtual_machines()
+        self.assertEqual((1, 0, 1, 0), summary[:4])
+        self.assertEqual(calls, len(cluster.rapi.GetInstance.calls))
+        vm = VirtualMachine.objects.get(cluster=cluster, hostname=vm_missing)
+        self.assertEqual(cluster.hash, vm.cluster_hash)
+        self.assertEqual(vm_missing, vm.info['name'])
+        self.assertNotEqual(-1, vm.ram)
         self.assertTrue(
             VirtualMachine.objects.get(
                 cluster=cluster,
@@ -191,7 +201,8 @@ class TestClusterModel(TestCase):
                 hostname=vm_removed.hostname),
             "vm not in ganeti was not removed from db")
 
-        cluster.sync_virtual_machines(True)
+        summary = cluster.sync_virtual_machines(True)
+        self.assertEqual((0, 1), summary[:2])
         self.assertFalse(
             VirtualMachine.objects.filter(
                 cluster=cluster,
@@ -247,6 +258,42 @@ class TestClusterModel(TestCase):
         node_removed.delete()
         cluster.delete()
 
+    def test_sync_nodes_indexed(self):
+        """
+        Nodes created in bulk are indexed for search, like saved nodes.
+        """
+        cluster = Cluster.objects.create(hostname='ganeti.example.test')
+        backend = site.get_index(Node).backend
+        CallProxy.patch(backend, 'update', False)
+        try:
+            cluster.sync_nodes()
+            index, nodes = backend.update.calls[0][0]
+            self.assertEqual(set(NODES),
+                             set(node.hostname for node in nodes))
+        finally:
+            del backend.update
+        Node.objects.all().delete()
+        cluster.delete()
+
+    def test_create_bulk_conflict(self):
+        """
+        Objects created meanwhile by another process are skipped, the others
+        are still created.
+        """
+        cluster = Cluster.objects.create(hostname='ganeti.example.test')
+        VirtualMachine.objects.create(cluster=cluster,
+                                      hostname='vm2.example.bak')
+        infos = [dict(INSTANCE, name=name)
+                 for name in ('vm1.example.bak', 'vm2.example.bak')]
+
+        created = VirtualMachine.create_bulk(cluster, infos, datetime.now())
+        self.assertEqual(1, created)
+        self.assertEqual(['vm1.example.bak', 'vm2.example.bak'],
+                         sorted(VirtualMachine.objects.filter(cluster=cluster)
+                                .values_list('hostname', flat=True)))
+        VirtualMachine.objects.all().delete()
+        cluster.delete()
+
     def test_missing_in_database(self):
         """
         Tests missing_in_ganeti property
@@ -285,6 +332,81 @@ class TestClusterModel(TestCase):
         vm_removed.delete()
         cluster.delete()
 
+    def test_instances_for(self):
+        """
+        Tests fetching the instances of several clusters at once
+
+        Verifies:
+            * instances are returned for each cluster
+            * unreachable clusters return an empty list
+        """
+        cluster = Cluster.objects.create(hostname='ganeti.example.test')
+        cluster2 = Cluster.objects.create(hostname='ganeti2.example.test',
+                                          slug='argh')
+        cluster2.rapi.error = GanetiApiError('Cluster is down', 503)
+
+        instances = Cluster.instances_for([cluster, cluster2])
+        self.assertEqual({cluster.id: INSTANCES, cluster2.id: []}, instances)
+
+        cluster2.rapi.error = None
+        cluster.delete()
+        cluster2.delete()
+
+    def test_load_info_unreachable(self):
+        """
+        Tests loading a cluster whose RAPI circuit is open
+
+        Verifies:
+            * the cluster is not contacted
+            * cached info is used and an error is shown
+        """
+        cluster = Cluster.objects.create(hostname='ganeti.example.test')
+        cluster.refresh()
+        circuit = cluster.rapi.circuit
+        for i in range(circuit.failure_threshold):
+            circuit.record_failure()
+        calls = len(cluster.rapi.GetInfo.calls)
+
+        cluster = Cluster.objects.get(pk=cluster.pk)
+        cluster.ignore_cache = True
+        cluster.load_info()
+        self.assertEqual(calls, len(cluster.rapi.GetInfo.calls))
+        self.assertEqual(INFO, cluster.info)
+        self.assertTrue(cluster.error.startswith('Cluster unreachable'))
+
+        circuit.record_success()
+        cluster.load_info()
+        self.assertEqual(calls + 1, len(cluster.rapi.GetInfo.calls))
+        self.assertEqual(None, cluster.error)
+        cluster.delete()
+
+    def test_load_info_probe(self):
+        """
+        Tests loading a cluster once its RAPI circuit's cool-down passed
+
+        Verifies:
+            * the cluster is refreshed, sending the half-open probe
+        """
+        cluster = Cluster.objects.create(hostname='ganeti.example.test')
+        cluster.refresh()
+        circuit = cluster.rapi.circuit
+        for i in range(circuit.failure_threshold):
+            circuit.record_failure()
+        calls = len(cluster.rapi.GetInfo.calls)
+
+        try:
+            circuit._opened = time.time() - circuit._cooldown
+            self.assertEqual(CIRCUIT_HALF_OPEN, circuit.state)
+            cluster = Cluster.objects.get(pk=cluster.pk)
+            self.assertFalse(cluster.cluster_unreachable)
+            cluster.ignore_cache = True
+            cluster.load_info()
+            self.assertEqual(calls + 1, len(cluster.rapi.GetInfo.calls))
+            self.assertEqual(None, cluster.error)
+        finally:
+            circuit.record_success()
+        cluster.delete()
+
     def test_available_ram(self):
         """
         Tests that the available_ram property returns the correct values
@@ -438,3 +560,101 @@ class TestClusterModel(TestCase):
         self.assertTrue(Job.objects.get(id=job_id).finished)
 
         cluster.delete()
+
+
+class TestLightQuerySet(TestCase):
+
+    def setUp(self):
+        self.cluster = Cluster.objects.create(hostname='ganeti.example.test',
+                                              slug='ganeti')
+        self.cluster.refresh()
+        self.vm = VirtualMachine.objects.create(cluster=self.cluster,
+                                                hostname='vm.example.test')
+        self.vm.info = INSTANCE
+        self.vm.save()
+
+        expired = datetime.now() - timedelta(days=1)
+        Cluster.objects.update(cached=expired)
+        VirtualMachine.objects.update(cached=expired)
+        self.rapi = self.cluster.rapi
+        self.rapi.GetInfo.reset()
+        self.rapi.GetInstance.reset()
+
+    def tearDown(self):
+        VirtualMachine.objects.all().delete()
+        self.cluster.delete()
+
+    def test_light(self):
+        """
+        Verifies:
+            * expired objects and their related objects aren't refreshed
+            * they are loaded with a single query
+            * info and ctime are decoded when first accessed
+        """
+        with self.assertNumQueries(1):
+            vm = VirtualMachine.objects.light('cluster').get()
+            self.assertEqual('ganeti', vm.cluster.slug)
+        self.assertTrue(vm.lightweight)
+        self.assertTrue(vm.cluster.lightweight)
+        self.assertEqual(self.vm, vm)
+        self.assertEqual(self.cluster, vm.cluster)
+        self.rapi.GetInfo.assertNotCalled(self)
+        self.rapi.GetInstance.assertNotCalled(self)
+
+        self.assertEqual(datetime.fromtimestamp(INSTANCE['ctime']), vm.ctime)
+        self.assertEqual(INSTANCE, vm.info)
+        self.rapi.GetInstance.assertNotCalled(self)
+
+    def test_related_manager(self):
+        vms = self.cluster.virtual_machines.light()
+        self.assertEqual([self.vm], list(vms))
+        self.rapi.GetInstance.assertNotCalled(self)
+
+
+class TestInfoCache(TestCase):
+
+    def setUp(self):
+        self.cluster = Cluster.objects.create(hostname='ganeti.example.test',
+                                              slug='ganeti')
+        self.cluster.refresh()
+        INFO_CACHE.clear()
+        INFO_CACHE.reset()
+
+    def tearDown(self):
+        self.cluster.delete()
+        INFO_CACHE.clear()
+        INFO_CACHE.reset()
+
+    def test_shared(self):
+        """
+        Verifies:
+            * objects loaded again share the decoded info
+            * refreshed objects don't use the info cached before
+        """
+        first = Cluster.objects.get(pk=self.cluster.pk)
+        second = Cluster.objects.get(pk=self.cluster.pk)
+        self.assertEqual(INFO, second.info)
+        self.assertTrue(first.info is second.info)
+        self.assertEqual(1, INFO_CACHE.stats()['misses'])
+        self.assertEqual(1, INFO_CACHE.stats()['hits'])
+
+        # light() objects use it too, without loading their info.
+        light = Cluster.objects.light().get(pk=self.cluster.pk)
+        with self.assertNumQueries(0):
+            self.assertTrue(light.info is first.info)
+
+        Cluster.objects.filter(pk=self.cluster.pk).update(
+            cached=datetime.now())
+        third = Cluster.objects.get(pk=self.cluster.pk)
+        self.assertFalse(third.info is first.info)
+        self.assertEqual(INFO, third.info)
+
+    def test_saved_info(self):
+        """
+        Info changed and saved without a refresh isn't read from the cache.
+        """
+        cluster = Cluster.objects.get(pk=self.cluster.pk)
+        info = dict(cluster.info, tags=['changed'])
+        cluster.info = info
+        cluster.save()
+        self.assertEqual(info, Cluster.objects.get(pk=self.cluster.pk).info)
@@ -0,0 +1,175 @@
+# Copyright (c) 2012 Oregon State University Open Source Lab
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.    See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.
+
+from datetime import datetime, timedelta
+
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from ganeti_webmgr.clusters.models import Cluster
+from ganeti_webmgr.clusters.refresh import REFRESH_QUEUE, RefreshQueue
+from ganeti_webmgr.utils.proxy.constants import INFO
+
+__all__ = ['TestRefreshQueue', 'TestBackgroundRefresh', 'TestRefreshLease']
+
+
+class TestRefreshQueue(TestCase):
+
+    def setUp(self):
+        self.queue = RefreshQueue(workers=0)
+        self.cluster = Cluster.objects.create(hostname='ganeti.example.test')
+
+    def tearDown(self):
+        self.cluster.delete()
+
+    def test_deduplicated(self):
+        """
+        An object is only queued once until it is refreshed.
+        """
+        self.assertTrue(self.queue.enqueue(Cluster, self.cluster.pk))
+        self.assertFalse(self.queue.enqueue(Cluster, self.cluster.pk))
+        self.assertEqual(1, len(self.queue))
+        self.assertTrue((Cluster, self.cluster.pk) in self.queue)
+
+        self.assertEqual(1, self.queue.process())
+        self.assertEqual(0, len(self.queue))
+        self.assertTrue(self.queue.enqueue(Cluster, self.cluster.pk))
+
+    def test_process(self):
+        """
+        Queued objects are refreshed if they are still expired.
+        """
+        calls = len(self.cluster.rapi.GetInfo.calls)
+        Cluster.objects.filter(pk=self.cluster.pk).update(cached=None)
+
+        self.queue.enqueue(Cluster, self.cluster.pk)
+        self.queue.enqueue(Cluster, 0)
+        self.assertEqual(2, self.queue.process())
+        self.assertEqual(calls + 1, len(self.cluster.rapi.GetInfo.calls))
+        self.assertTrue(Cluster.objects.filter(pk=self.cluster.pk)
+                        .values_list('cached', flat=True)[0])
+
+
+class TestBackgroundRefresh(TestCase):
+
+    def setUp(self):
+        self.cluster = Cluster.objects.create(hostname='ganeti.example.test')
+        self.cluster.refresh()
+        self.workers = REFRESH_QUEUE.workers
+        REFRESH_QUEUE.workers = 0
+
+        expired = datetime.now() - timedelta(days=1)
+        Cluster.objects.filter(pk=self.cluster.pk).update(cached=expired)
+        self.calls = len(self.cluster.rapi.GetInfo.calls)
+
+    def tearDown(self):
+        REFRESH_QUEUE.process()
+        REFRESH_QUEUE.workers = self.workers
+        self.cluster.delete()
+
+    @override_settings(LAZY_CACHE_REFRESH_BACKGROUND=True)
+    def test_expired(self):
+        """
+        Verifies:
+            * expired objects are shown without contacting the cluster
+            * they are queued and refreshed later
+        """
+        cluster = Cluster.objects.get(pk=self.cluster.pk)
+        self.assertEqual(INFO, cluster.info)
+        self.assertTrue(cluster.refresh_pending)
+        self.assertEqual(self.calls, len(cluster.rapi.GetInfo.calls))
+        self.assertTrue((Cluster, cluster.pk) in REFRESH_QUEUE)
+
+        REFRESH_QUEUE.process()
+        self.assertEqual(self.calls + 1, len(cluster.rapi.GetInfo.calls))
+        cluster = Cluster.objects.get(pk=self.cluster.pk)
+        self.assertFalse(cluster.refresh_pending)
+
+    @override_settings(LAZY_CACHE_REFRESH_BACKGROUND=True)
+    def test_ignore_cache(self):
+        """
+        Objects with running jobs are still refreshed right away.
+        """
+        Cluster.objects.filter(pk=self.cluster.pk).update(ignore_cache=True)
+        cluster = Cluster.objects.get(pk=self.cluster.pk)
+        self.assertFalse(cluster.refresh_pending)
+        self.assertEqual(self.calls + 1, len(cluster.rapi.GetInfo.calls))
+        self.assertEqual(0, len(REFRESH_QUEUE))
+
+    def test_disabled(self):
+        cluster = Cluster.objects.get(pk=self.cluster.pk)
+        self.assertFalse(cluster.refresh_pending)
+        self.assertEqual(self.calls + 1, len(cluster.rapi.GetInfo.calls))
+
+
+class TestRefreshLease(TestCase):
+
+    def setUp(self):
+        self.cluster = Cluster.objects.create(hostname='ganeti.example.test')
+        self.cluster.refresh()
+        expired = datetime.now() - timedelta(days=1)
+        Cluster.objects.filter(pk=self.cluster.pk).update(cached=expired)
+        self.calls = len(self.cluster.rapi.GetInfo.calls)
+
+    def tearDown(self):
+        self.cluster.delete()
+
+    def lease(self):
+        return Cluster.objects.filter(pk=self.cluster.pk) \
+            .values_list('refresh_lease', flat=True)[0]
+
+    def test_acquire(self):
+        """
+        Verifies:
+            * only one lease is given out at a time
+            * expired leases can be taken over
+            * a lease is only released by its holder
+        """
+        lease = self.cluster.acquire_refresh_lease()
+        self.assertTrue(lease)
+        self.assertEqual(lease, self.lease())
+        self.assertEqual(None, self.cluster.acquire_refresh_lease())
+
+        past = datetime.now() - timedelta(seconds=1)
+        Cluster.objects.filter(pk=self.cluster.pk).update(refresh_lease=past)
+        other = self.cluster.acquire_refresh_lease()
+        self.assertTrue(other)
+
+        self.cluster.release_refresh_lease(past)
+        self.assertEqual(other, self.lease())
+        self.cluster.release_refresh_lease(other)
+        self.assertEqual(None, self.lease())
+
+    def test_leased_elsewhere(self):
+        """
+        An expired object being refreshed by another process is shown from
+        the cache.
+        """
+        self.cluster.acquire_refresh_lease()
+        cluster = Cluster.objects.get(pk=self.cluster.pk)
+        self.assertEqual(INFO, cluster.info)
+        self.assertTrue(cluster.refresh_pending)
+        self.assertEqual(self.calls, len(cluster.rapi.GetInfo.calls))
+
+    def test_refresh_once(self):
+        """
+        Expired objects are refreshed under a lease, which is then released.
+        """
+        cluster = Cluster.objects.get(pk=self.cluster.pk)
+        self.assertFalse(cluster.refresh_pending)
+        self.assertEqual(self.calls + 1, len(cluster.rapi.GetInfo.calls))
+        self.assertEqual(None, self.lease())
@@ -24,7 +24,7 @@ from django.contrib.auth.models import User
 from django.contrib.contenttypes.models import ContentType
 from django.core.exceptions import PermissionDenied
 from django.core.urlresolvers import reverse
-from django.db.models import Q, Sum
+from django.db.models import Q
 from django.http import (HttpResponse, HttpResponseRedirect,
                          HttpResponseForbidden)
 from django.shortcuts import get_object_or_404, render_to_response, redirect
@@ -52,6 +52,7 @@ from .forms import EditClusterForm, QuotaForm
 from .models import Cluster
 from ganeti_webmgr.authentication.models import Profile, ClusterUser
 from ganeti_webmgr.utils.models import SSHKey
+from ganeti_webmgr.nodes.models import Node
 from ganeti_webmgr.virtualmachines.models import VirtualMachine
 from ganeti_webmgr.jobs.models import Job
 
@@ -141,7 +142,8 @@ class ClusterVMListView(BaseVMListView):
 
         if not self.admin and not vm_perms:
             raise PermissionDenied(NO_PRIVS)
-        self.queryset = vm_qs_for_users(self.request.user)
+        self.queryset = vm_qs_for_users(self.request.user) \
+            .light('cluster', 'primary_node')
         # Calling super automatically filters by cluster
         return super(ClusterVMListView, self).get_queryset()
 
@@ -176,7 +178,7 @@ class ClusterJobListView(LoginRequiredMixin, PaginationMixin, GWMBaseView,
         self.get_kwargs()
         self.cluster = get_object_or_404(Cluster, slug=self.cluster_slug)
         perms = self.can_create(self.cluster)
-        self.queryset = self.cluster.jobs.all()
+        self.queryset = self.cluster.jobs.light('cluster')
         if not perms:
             raise PermissionDenied(NO_PRIVS)
 
@@ -201,29 +203,13 @@ def nodes(request, cluster_slug):
     if not (user.is_superuser or user.has_perm('admin', cluster)):
         raise PermissionDenied(NO_PRIVS)
 
-    # query allocated CPUS for all nodes in this list.  Must be done here to
-    # avoid querying Node.allocated_cpus for each node in the list.  Repackage
-    # list so it is easier to retrieve the values in the template
-    values = VirtualMachine.objects \
-        .filter(cluster=cluster, status='running') \
-        .exclude(virtual_cpus=-1) \
-        .order_by() \
-        .values('primary_node') \
-        .annotate(cpus=Sum('virtual_cpus'))
-    cpus = {}
-    nodes = cluster.nodes.all()
-    for d in values:
-        cpus[d['primary_node']] = d['cpus']
-
-    # Include nodes that do not have any virtual machines on them.
-    for node in nodes:
-        if node.pk not in cpus:
-            cpus[node.pk] = 0
+    # query allocated resources for all nodes in this list at once, instead of
+    # once per node and resource.
+    nodes = Node.with_allocations(cluster)
 
     return render_to_response("ganeti/node/table.html",
                               {'cluster': cluster,
                                'nodes': nodes,
-                               'cpus': cpus,
                                },
                               context_instance=RequestContext(request),
                               )
@@ -292,11 +278,16 @@ def refresh(request, cluster_slug):
     try:
         cluster.refresh()
         cluster.sync_nodes(remove=True)
-        cluster.sync_virtual_machines(remove=True)
+        summary = cluster.sync_virtual_machines(remove=True)
     except GanetiApiError as e:
         msg = str(e)
         msg = "<p>%s</p>" % msg
         messages.error(request, msg)
+    else:
+        msg = _("Virtual machines added: %(added)d, removed: %(removed)d, "
+                "updated: %(updated)d, unchanged: %(unchanged)d "
+                "(%(elapsed).1f seconds)") % summary._asdict()
+        messages.info(request, msg)
     url = reverse('cluster-detail', args=[cluster.slug])
     return redirect(url)
 
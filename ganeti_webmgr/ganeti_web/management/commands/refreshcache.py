@@ -1,63 +1,233 @@
-from django.core.management.base import NoArgsCommand
+from datetime import datetime, timedelta
+from optparse import make_option
+import Queue
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import CommandError, NoArgsCommand
+from django.db import connection
+from django.db.models import Q
+
 from ganeti_webmgr.clusters.models import Cluster
 from ganeti_webmgr.nodes.models import Node
 from ganeti_webmgr.virtualmachines.models import VirtualMachine
 
 from ganeti_webmgr.utils.client import GanetiApiError
 
+# Kinds of objects which can be refreshed, in the order they are refreshed.
+# VMs come last since their info refers to the cluster's nodes.
+TYPES = ('cluster', 'nodes', 'vms')
+
 
 class Command(NoArgsCommand):
-    help = "Refreshes the Cache for Clusters, Nodes and Virtual Machines."
+    help = ("Refreshes the Cache for Clusters, Nodes and Virtual Machines. "
+            "Each cluster's nodes and virtual machines are fetched in bulk, "
+            "and several clusters are refreshed at once. New nodes are "
+            "imported, new virtual machines only with --import-vms.")
+
+    option_list = NoArgsCommand.option_list + (
+        make_option('--cluster', action='append', dest='clusters',
+                    default=[], metavar='SLUG',
+                    help='Only refresh this cluster (slug or hostname); '
+                         'may be repeated'),
+        make_option('--type', action='append', dest='types', default=[],
+                    type='choice', choices=TYPES,
+                    help='Only refresh objects of this type: cluster, nodes '
+                         'or vms; may be repeated'),
+        make_option('--stale-only', action='store_true', dest='stale_only',
+                    default=False,
+                    help='Skip object types of a cluster whose cache has '
+                         'not expired yet (see LAZY_CACHE_REFRESH)'),
+        make_option('--fields-only', action='store_true', dest='fields_only',
+                    default=False,
+                    help='Only refresh the searchable fields of existing '
+                         'nodes and VMs, with one query each; their cached '
+                         'info is left alone and new ones are not imported'),
+        make_option('--import-vms', action='store_true', dest='import_vms',
+                    default=False,
+                    help='Also import virtual machines missing from the '
+                         'database, instead of leaving them to the admin '
+                         'import pages'),
+        make_option('--workers', type='int', dest='workers', default=4,
+                    help='Number of clusters refreshed at the same time'),
+        make_option('--dry-run', action='store_true', dest='dry_run',
+                    default=False,
+                    help='Only list what would be refreshed'),
+    )
 
     def handle_noargs(self, **options):
-        self.refresh_objects(**options)
-
-    def refresh_objects(self, **options):
-        """
-        This was originally the code in the 0009
-        and then 0010 'force_object_refresh' migration
-
-        Force a refresh of all Cluster, Nodes, and VirtualMachines, and
-        import any new Nodes.
-        """
-        write = self.stdout.write
-        flush = self.stdout.flush
-
-        def wf(str, newline=False, verbosity=1):
-            if (verbosity > 0):
-                if newline:
-                    write('\n')
-                write(str)
-                flush()
-
-        verbosity = int(options.get('verbosity'))
-
-        wf('- Refreshing Cached Cluster Objects', verbosity=verbosity)
-
-        wf('> Synchronizing Cluster Nodes ', True, verbosity=verbosity)
-        flush()
-        Cluster.objects.all().update(mtime=None)
-        for cluster in Cluster.objects.all().iterator():
-            try:
-                cluster.sync_nodes()
-                wf('.', verbosity=verbosity)
-            except GanetiApiError:
-                wf('E', verbosity=verbosity)
-
-        Node.objects.all().update(mtime=None)
-        wf('> Refreshing Node Caches ', True, verbosity=verbosity)
-        for node in Node.objects.all().iterator():
-            try:
-                wf('.', verbosity=verbosity)
-            except GanetiApiError:
-                wf('E', verbosity=verbosity)
-
-        VirtualMachine.objects.all().update(mtime=None)
-        wf('> Refreshing Instance Caches ', True, verbosity=verbosity)
-        for instance in VirtualMachine.objects.all().iterator():
-            try:
-                wf('.', verbosity=verbosity)
-            except GanetiApiError:
-                    wf('E', verbosity=verbosity)
-
-        wf('\n', verbosity=verbosity)
+        self.verbosity = int(options.get('verbosity'))
+        self.fields_only = options['fields_only']
+        self.import_vms = options['import_vms']
+        types = [t for t in TYPES if t in options['types']] or list(TYPES)
+        workers = max(options['workers'], 1)
+
+        clusters = Cluster.objects.all()
+        if options['clusters']:
+            names = options['clusters']
+            clusters = clusters.filter(Q(slug__in=names) |
+                                       Q(hostname__in=names))
+        clusters = list(clusters.order_by('hostname')
+                        .values_list('id', 'hostname'))
+        if options['clusters'] and not clusters:
+            raise CommandError('No cluster matches %s'
+                               % ', '.join(options['clusters']))
+
+        # Pick the work to do up front, so that a dry run shows exactly what
+        # a real run would do.
+        tasks = []
+        for id, hostname in clusters:
+            if options['stale_only']:
+                todo = [t for t in types if self.stale(id, t)]
+            else:
+                todo = types
+            if todo:
+                tasks.append((id, hostname, todo))
+            else:
+                self.write('%s: up to date\n' % hostname, 2)
+
+        if options['dry_run']:
+            for id, hostname, todo in tasks:
+                self.write('%s: would refresh %s\n'
+                           % (hostname, ', '.join(todo)))
+            return
+
+        start = time.time()
+        results = self.run(tasks, workers)
+        elapsed = time.time() - start
+
+        objects = sum(r['objects'] for r in results)
+        failures = [r for r in results if r['error'] is not None]
+        rate = objects / elapsed if elapsed else 0
+        self.write('Refreshed %d objects of %d clusters in %.2fs '
+                   '(%.1f objects/s), %d failures\n'
+                   % (objects, len(results), elapsed, rate, len(failures)))
+        if failures:
+            raise CommandError('Could not refresh %s'
+                               % ', '.join(r['hostname'] for r in failures))
+
+    def write(self, msg, verbosity=1):
+        if self.verbosity >= verbosity:
+            self.stdout.write(msg)
+            self.stdout.flush()
+
+    def stale(self, cluster_id, type):
+        """
+        Returns True if any object of the given type in a cluster has an
+        expired cache, or if there are none yet.
+        """
+        epsilon = timedelta(0, 0, 0, settings.LAZY_CACHE_REFRESH)
+        expired = Q(cached__isnull=True) | \
+            Q(cached__lt=datetime.now() - epsilon)
+        if type == 'cluster':
+            qs = Cluster.objects.filter(pk=cluster_id)
+        elif type == 'nodes':
+            qs = Node.objects.filter(cluster=cluster_id)
+        else:
+            qs = VirtualMachine.objects.filter(cluster=cluster_id)
+        return not qs.exists() or qs.filter(expired).exists()
+
+    def run(self, tasks, workers):
+        """
+        Refreshes clusters on a pool of worker threads, and reports each
+        cluster as it finishes.
+
+        @return list of the result of each cluster, see refresh()
+        """
+        reported = []
+        if workers == 1 or len(tasks) <= 1:
+            # No need for threads, which also keeps all database access in
+            # this thread.
+            for task in tasks:
+                reported.append(self.report(self.refresh(*task)))
+            return reported
+
+        results = Queue.Queue()
+        pending = Queue.Queue()
+        for task in tasks:
+            pending.put(task)
+
+        def work():
+            while True:
+                try:
+                    task = pending.get(False)
+                except Queue.Empty:
+                    return
+                try:
+                    results.put(self.refresh(*task))
+                finally:
+                    # Each thread has its own connection; close it.
+                    connection.close()
+
+        for i in range(min(workers, len(tasks))):
+            thread = threading.Thread(target=work)
+            thread.daemon = True
+            thread.start()
+
+        for i in range(len(tasks)):
+            reported.append(self.report(results.get()))
+        return reported
+
+    def report(self, result):
+        """
+        Prints the result of a cluster's refresh, and returns it.
+        """
+        if result['error'] is not None:
+            self.write('%(hostname)s: failed after %(elapsed).2fs: '
+                       '%(error)s\n' % result)
+        else:
+            counts = ', '.join('%s %s' % (count, type)
+                               for type, count in result['counts'])
+            self.write('%s: %s in %.2fs\n'
+                       % (result['hostname'], counts, result['elapsed']))
+        return result
+
+    def refresh(self, cluster_id, hostname, types):
+        """
+        Refreshes the given types of objects of one cluster.  Nodes, and VMs
+        with --import-vms, are synchronized from one bulk request each, see
+        CachedClusterObject.sync(); otherwise existing VMs are refreshed in
+        bulk.  With --fields-only only their searchable fields are refreshed,
+        see CachedClusterObject.refresh_fields().
+
+        @return dict with the cluster's ``hostname``, the ``counts`` of
+        objects refreshed per type, the total number of ``objects``, the
+        ``elapsed`` seconds and the ``error`` if the refresh failed.
+        """
+        start = time.time()
+        loaded = datetime.now()
+        result = {'hostname': hostname, 'counts': [], 'objects': 0,
+                  'error': None}
+        try:
+            cluster = Cluster.objects.get(pk=cluster_id)
+            for type in types:
+                if type == 'cluster':
+                    # Loading an expired cluster already refreshed it.
+                    if cluster.cached is None or cluster.cached < loaded:
+                        cluster.refresh()
+                    if cluster.error:
+                        raise GanetiApiError(cluster.error)
+                    count = 1
+                elif self.fields_only:
+                    model = Node if type == 'nodes' else VirtualMachine
+                    updated, unchanged = model.refresh_fields(cluster)
+                    count = updated + unchanged
+                elif type == 'vms' and not self.import_vms:
+                    updated, unchanged = cluster.refresh_virtual_machines()
+                    count = updated + unchanged
+                else:
+                    if type == 'nodes':
+                        summary = cluster.sync_nodes()
+                    else:
+                        summary = cluster.sync_virtual_machines()
+                    count = summary.added + summary.updated + \
+                        summary.unchanged
+                result['counts'].append((type, count))
+                result['objects'] += count
+        except Exception as e:
+            # Report any failure with the cluster instead of losing the
+            # worker thread.
+            result['error'] = str(e) or e.__class__.__name__
+        result['elapsed'] = time.time() - start
+        return result
@@ -0,0 +1,53 @@
+from optparse import make_option
+import logging
+import signal
+
+from django.conf import settings
+from django.core.management.base import NoArgsCommand
+
+from ganeti_webmgr.clusters.daemon import Refresher
+
+
+class Command(NoArgsCommand):
+    help = ("Keeps the cache of every cluster, and of its nodes, virtual "
+            "machines and pending jobs, fresh.  Pages stop refreshing "
+            "expired objects while this is running.  Stops on SIGTERM or "
+            "SIGINT after finishing the refreshes in progress.")
+
+    option_list = NoArgsCommand.option_list + (
+        make_option('--workers', type='int',
+                    default=settings.REFRESHER_WORKERS,
+                    help='Number of clusters refreshed at the same time'),
+        make_option('--interval', type='int',
+                    default=settings.REFRESHER_INTERVAL,
+                    help='Seconds between two refreshes of a cluster, '
+                         'unless set in REFRESHER_INTERVALS'),
+        make_option('--jitter', type='int',
+                    default=settings.REFRESHER_JITTER,
+                    help='Seconds by which refreshes are randomly moved'),
+    )
+
+    def handle_noargs(self, **options):
+        verbosity = int(options.get('verbosity'))
+        logger = logging.getLogger('ganeti_webmgr.refresher')
+        if verbosity > 1:
+            handler = logging.StreamHandler(self.stdout)
+            handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+            logger.addHandler(handler)
+            logger.setLevel(logging.INFO)
+
+        refresher = Refresher(max(options['workers'], 1),
+                              options['interval'], options['jitter'],
+                              settings.REFRESHER_INTERVALS,
+                              settings.REFRESHER_HEARTBEAT, logger)
+
+        def stop(signum, frame):
+            refresher.stop()
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+        refresher.run()
+
+        if verbosity > 0:
+            self.stdout.write('Refreshed %d clusters, %d failures\n'
+                              % (refresher.refreshed, refresher.failures))
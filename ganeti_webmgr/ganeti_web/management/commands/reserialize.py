@@ -0,0 +1,115 @@
+from optparse import make_option
+import cPickle
+import time
+
+from django.core.management.base import NoArgsCommand
+from django.db import transaction
+
+from ganeti_webmgr.clusters.models import Cluster
+from ganeti_webmgr.jobs.models import Job
+from ganeti_webmgr.nodes.models import Node
+from ganeti_webmgr.virtualmachines.models import VirtualMachine
+
+from ganeti_webmgr.utils.serialization import (FORMATS, dumps_info,
+                                               info_format, loads_info)
+
+MODELS = (
+    ('cluster', Cluster),
+    ('node', Node),
+    ('vm', VirtualMachine),
+    ('job', Job),
+)
+
+
+class Command(NoArgsCommand):
+    help = ("Rewrites the cached info of clusters, nodes, virtual machines "
+            "and jobs in the current storage format (see "
+            "SERIALIZED_INFO_COMPRESS).  Rows are converted in batches, each "
+            "in its own transaction.")
+
+    option_list = NoArgsCommand.option_list + (
+        make_option('--model', action='append', dest='models', default=[],
+                    type='choice', choices=[name for name, model in MODELS],
+                    help='Only convert this kind of object: cluster, node, '
+                         'vm or job; may be repeated'),
+        make_option('--batch-size', type='int', dest='batch_size',
+                    default=500,
+                    help='Number of rows converted per transaction'),
+        make_option('--all', action='store_true', dest='all', default=False,
+                    help='Also rewrite rows already in a current format, '
+                         'e.g. after changing SERIALIZED_INFO_COMPRESS'),
+        make_option('--benchmark', action='store_true', dest='benchmark',
+                    default=False,
+                    help='Compare row size and decode time of each format '
+                         'on existing rows, without converting anything'),
+        make_option('--sample', type='int', dest='sample', default=1000,
+                    help='Number of rows per kind of object used by '
+                         '--benchmark'),
+    )
+
+    def handle_noargs(self, **options):
+        names = options['models']
+        for name, model in MODELS:
+            if names and name not in names:
+                continue
+            if options['benchmark']:
+                self.benchmark(name, model, options['sample'])
+            else:
+                count = self.convert(model, max(options['batch_size'], 1),
+                                     options['all'])
+                self.stdout.write('%s: converted %d rows\n' % (name, count))
+
+    def convert(self, model, batch_size, all=False):
+        """
+        Rewrites the info of all rows of a model, ``batch_size`` rows at a
+        time.  Objects are not loaded, which could refresh them.
+
+        @return number of rows rewritten
+        """
+        converted = 0
+        last = 0
+        while True:
+            rows = list(model.objects.filter(pk__gt=last).order_by('pk')
+                        .values_list('pk', 'serialized_info')[:batch_size])
+            if not rows:
+                return converted
+            last = rows[-1][0]
+
+            with transaction.commit_on_success():
+                for pk, text in rows:
+                    if not text or (not all and
+                                    info_format(text) != 'pickle'):
+                        continue
+                    # Rows refreshed meanwhile are already converted.
+                    converted += model.objects \
+                        .filter(pk=pk, serialized_info=text) \
+                        .update(serialized_info=dumps_info(loads_info(text)))
+
+    def benchmark(self, name, model, sample):
+        """
+        Prints the average size and decode time of the info of up to
+        ``sample`` rows of a model in each format.
+        """
+        texts = model.objects.exclude(serialized_info='') \
+            .values_list('serialized_info', flat=True)[:sample]
+        infos = [loads_info(text) for text in texts]
+        if not infos:
+            self.stdout.write('%s: no rows\n' % name)
+            return
+
+        encoders = {
+            'pickle': cPickle.dumps,
+            'json': lambda info: dumps_info(info, compress=False),
+            'zlib': lambda info: dumps_info(info, compress=True),
+        }
+        self.stdout.write('%s: %d rows\n' % (name, len(infos)))
+        for format in FORMATS:
+            encoded = [encoders[format](info) for info in infos]
+            start = time.time()
+            for text in encoded:
+                loads_info(text)
+            elapsed = time.time() - start
+            size = sum(len(text) for text in encoded)
+            self.stdout.write('  %-6s %8d bytes/row %8.1f us/row to decode\n'
+                              % (format, size / len(encoded),
+                                 elapsed * 1000000 / len(encoded)))
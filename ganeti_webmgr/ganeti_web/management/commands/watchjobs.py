@@ -0,0 +1,35 @@
+from optparse import make_option
+
+from django.conf import settings
+from django.core.management.base import NoArgsCommand
+
+from ganeti_webmgr.jobs.watcher import JobWatcher
+
+
+class Command(NoArgsCommand):
+    help = ("Watches running Ganeti jobs and updates their objects as soon "
+            "as they finish.  Set JOB_WATCHER while this is running.")
+
+    option_list = NoArgsCommand.option_list + (
+        make_option('--workers', type='int',
+                    default=settings.JOB_WATCHER_WORKERS,
+                    help='Jobs long-polled at once on each cluster'),
+        make_option('--interval', type='int',
+                    default=settings.JOB_WATCHER_INTERVAL,
+                    help='Seconds between checks for new jobs'),
+    )
+
+    def handle_noargs(self, **options):
+        verbosity = int(options.get('verbosity'))
+        watcher = JobWatcher(options['workers'], options['interval'])
+
+        try:
+            while True:
+                finished = watcher.finished
+                watcher.run_once()
+                if verbosity > 1 and watcher.finished > finished:
+                    self.stdout.write('%d jobs finished, watching %d\n'
+                                      % (watcher.finished - finished,
+                                         watcher.watching))
+        except KeyboardInterrupt:
+            pass
@@ -23,7 +23,7 @@ from django.contrib.auth.models import User, Group
 from django.contrib.sites import models as sites_app
 from django.contrib.sites.management import create_default_site
 from django.contrib.sites.models import Site
-from django.db.models.signals import post_save, post_syncdb
+from django.db.models.signals import post_delete, post_save, post_syncdb
 from django.db.utils import DatabaseError
 
 from ganeti_webmgr.utils.logs import register_log_actions
@@ -37,8 +37,9 @@ from ganeti_webmgr.muddle_users import signals as muddle_user_signals
 
 from ganeti_webmgr.authentication.models import Organization
 from ganeti_webmgr.clusters.models import Cluster
-from ganeti_webmgr.nodes.models import Node
+from ganeti_webmgr.nodes.models import Node, forget_node_resolver
 from ganeti_webmgr.virtualmachines.models import VirtualMachine
+from ganeti_webmgr.utils import RAPI_REGISTRY
 from ganeti_webmgr.utils.client import GanetiApiError
 
 import permissions
@@ -75,6 +76,36 @@ def update_cluster_hash(sender, instance, **kwargs):
     instance.nodes.all().update(cluster_hash=instance.hash)
 
 
+def update_rapi_client(sender, instance, **kwargs):
+    """
+    Drops the cached RAPI client of a Cluster whose credentials changed
+    """
+    RAPI_REGISTRY.invalidate(instance.id, instance.hash)
+
+
+def remove_rapi_client(sender, instance, **kwargs):
+    """
+    Drops the cached RAPI client of a deleted Cluster
+    """
+    RAPI_REGISTRY.invalidate(instance.id)
+
+
+def update_node_resolver(sender, instance, created, **kwargs):
+    """
+    Drops the shared NodeResolver of a cluster whose nodes were added
+    """
+    if created:
+        forget_node_resolver(instance.cluster_id)
+
+
+def remove_node_resolver(sender, instance, **kwargs):
+    """
+    Drops the shared NodeResolver of a cluster whose nodes were deleted, so
+    that virtual machines are not linked to them
+    """
+    forget_node_resolver(instance.cluster_id)
+
+
 def update_organization(sender, instance, **kwargs):
     """
     Creates a Organizations whenever a contrib.auth.models.Group is created
@@ -85,7 +116,11 @@ def update_organization(sender, instance, **kwargs):
 
 post_save.connect(create_profile, sender=User)
 post_save.connect(update_cluster_hash, sender=Cluster)
+post_save.connect(update_rapi_client, sender=Cluster)
+post_delete.connect(remove_rapi_client, sender=Cluster)
 post_save.connect(update_organization, sender=Group)
+post_save.connect(update_node_resolver, sender=Node)
+post_delete.connect(remove_node_resolver, sender=Node)
 
 
 def regenerate_cu_children(sender, **kwargs):
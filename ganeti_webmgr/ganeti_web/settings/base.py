@@ -193,9 +193,94 @@ LANGUAGES = (
 #    checked when the object is instantiated. It defaults to 600000ms, or ten
 #    minutes.
 LAZY_CACHE_REFRESH = 600000
+#    With LAZY_CACHE_REFRESH_BACKGROUND, objects whose cache expired are shown
+#    right away and refreshed by LAZY_CACHE_REFRESH_WORKERS background threads
+#    of each process, instead of making the page wait on the cluster.
+LAZY_CACHE_REFRESH_BACKGROUND = False
+LAZY_CACHE_REFRESH_WORKERS = 2
+#    When several requests load the same expired object, one of them refreshes
+#    it while the others show the cached data.  REFRESH_LEASE (seconds) is how
+#    long the others wait before taking over, should the first one die.
+REFRESH_LEASE = 60
+#    Cached info is stored as JSON, zlib compressed with
+#    SERIALIZED_INFO_COMPRESS.  Rows written by earlier versions are converted
+#    by the reserialize management command.
+SERIALIZED_INFO_COMPRESS = True
+#    Decoded info of up to INFO_CACHE_SIZE bytes is kept by each process, so
+#    that objects loaded again don't decode it again.  0 disables the cache.
+INFO_CACHE_SIZE = 32 * 1024 * 1024
+# Set JOB_WATCHER when the watchjobs command is running.  Pages then no longer
+# ask clusters for the status of running jobs; the watcher long-polls each job
+# on up to JOB_WATCHER_WORKERS connections per cluster, and looks for new jobs
+# every JOB_WATCHER_INTERVAL seconds.
+JOB_WATCHER = False
+JOB_WATCHER_WORKERS = 4
+JOB_WATCHER_INTERVAL = 5
+# The refresher management command refreshes every cluster every
+# REFRESHER_INTERVAL seconds, or as set per cluster slug or hostname in
+# REFRESHER_INTERVALS, moved by up to REFRESHER_JITTER seconds.  At most
+# REFRESHER_WORKERS clusters are refreshed at once.  It records a heartbeat
+# every REFRESHER_HEARTBEAT seconds; while it is recent, pages no longer
+# refresh expired objects.
+REFRESHER_INTERVAL = 300
+REFRESHER_INTERVALS = {}
+REFRESHER_JITTER = 30
+REFRESHER_WORKERS = 2
+REFRESHER_HEARTBEAT = 15
 # Other GWM Stuff
 VNC_PROXY = 'localhost:8888'
 RAPI_CONNECT_TIMEOUT = 3
+# RAPI clients are created once and shared by all threads of a process.  At
+# most RAPI_REGISTRY_SIZE of them are kept, least recently used first out.
+# With RAPI_PREWARM the clients of all clusters are created when the WSGI
+# application starts, instead of during the first requests.
+RAPI_REGISTRY_SIZE = 256
+RAPI_PREWARM = True
+# Each cluster's RAPI client keeps up to RAPI_POOL_SIZE keep-alive connections
+# open to the cluster master.  Pools unused for RAPI_POOL_IDLE_TIMEOUT seconds
+# are closed.
+RAPI_POOL_SIZE = 10
+RAPI_POOL_IDLE_TIMEOUT = 60
+# Pages talking to several clusters at once run their RAPI calls on a pool of
+# RAPI_FANOUT_WORKERS threads.  A single call is abandoned after
+# RAPI_FANOUT_TIMEOUT seconds; None waits for the client's own timeout.
+RAPI_FANOUT_WORKERS = 8
+RAPI_FANOUT_TIMEOUT = None
+# After RAPI_CIRCUIT_FAILURES consecutive connection failures or timeouts a
+# cluster is considered unreachable: requests to it fail immediately for
+# RAPI_CIRCUIT_RESET seconds, after which a single probe request is sent.  Each
+# failed probe doubles the wait, up to RAPI_CIRCUIT_MAX_RESET seconds.  Set
+# RAPI_CIRCUIT_FAILURES to 0 to always contact the cluster.
+RAPI_CIRCUIT_FAILURES = 3
+RAPI_CIRCUIT_RESET = 30
+RAPI_CIRCUIT_MAX_RESET = 600
+# Identical RAPI GET requests made at the same time are only sent once, the
+# other callers wait for that response.  RAPI_COALESCE is the scope requests
+# are shared in: "client" (one cluster connection), "process" (all
+# connections in this process) or None to disable.  A response is reused for
+# RAPI_COALESCE_WINDOW seconds after it arrived; 0 only shares requests which
+# are still in flight.
+RAPI_COALESCE = "client"
+RAPI_COALESCE_WINDOW = 0
+# Responses of read-only RAPI resources (operating systems, cluster info,
+# features, node and instance lists) are cached per cluster.  At most
+# RAPI_RESPONSE_CACHE_SIZE responses are kept, for the number of seconds given
+# per resource in RAPI_RESPONSE_CACHE_TTLS (see GANETI_RAPI_CACHE_TTLS in
+# utils/client.py for the defaults).  A size of 0 disables the cache.
+RAPI_RESPONSE_CACHE_SIZE = 64
+RAPI_RESPONSE_CACHE_TTLS = {}
+# At most RAPI_MAX_CONCURRENCY requests are sent to one cluster at the same
+# time; further requests wait in line for up to RAPI_CONCURRENCY_TIMEOUT
+# seconds.  0 removes the limit.  Long polls for job changes are exempt, see
+# JOB_WATCHER_WORKERS.  The limit applies per process unless
+# RAPI_CONCURRENCY_LOCK_DIR names a directory, writable by every process, in
+# which lock files share it between all web workers and commands.
+RAPI_MAX_CONCURRENCY = 8
+RAPI_CONCURRENCY_TIMEOUT = 30
+RAPI_CONCURRENCY_LOCK_DIR = None
+# Collect per-cluster call counts, latencies and response sizes of RAPI
+# requests.  Superusers can view them at /rapi-metrics/.
+RAPI_METRICS = True
 
 
 def create_secrets(folder='.secrets'):
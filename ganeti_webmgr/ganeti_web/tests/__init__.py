@@ -21,4 +21,6 @@ from ganeti_webmgr.ganeti_web.tests.caps import *
 from ganeti_webmgr.ganeti_web.tests.general import *
 from ganeti_webmgr.ganeti_web.tests.importing import *
 from ganeti_webmgr.ganeti_web.tests.importing_nodes import *
+from ganeti_webmgr.ganeti_web.tests.refreshcache import *
+from ganeti_webmgr.ganeti_web.tests.reserialize import *
 from ganeti_webmgr.ganeti_web.tests.tags import *
@@ -0,0 +1,157 @@
+# Copyright (c) 2012 Oregon State University Open Source Lab
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.    See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.
+
+from datetime import datetime
+from StringIO import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from ganeti_webmgr.clusters.models import Cluster
+from ganeti_webmgr.nodes.models import Node
+from ganeti_webmgr.utils.client import GanetiApiError
+from ganeti_webmgr.utils.proxy import CallProxy, query_response
+from ganeti_webmgr.utils.proxy.constants import INSTANCES_BULK, NODES_BULK
+from ganeti_webmgr.virtualmachines.models import VirtualMachine
+
+__all__ = ('TestRefreshCache',)
+
+
+class TestRefreshCache(TestCase):
+
+    def setUp(self):
+        self.cluster = Cluster.objects.create(hostname='ganeti.example.test',
+                                              slug='ganeti')
+        self.other = Cluster.objects.create(hostname='other.example.test',
+                                            slug='other')
+        # Clients are shared by all clusters with the same credentials.
+        self.rapi = self.cluster.rapi
+        self.rapi.IterNodes.reset()
+        self.rapi.IterInstances.reset()
+
+    def tearDown(self):
+        self.rapi.IterInstances.error = None
+        if isinstance(self.rapi.Query, CallProxy):
+            del self.rapi.Query
+
+    def refreshcache(self, **options):
+        stdout = StringIO()
+        options.setdefault('workers', 1)
+        call_command('refreshcache', stdout=stdout, stderr=stdout, **options)
+        return stdout.getvalue()
+
+    def test_refresh(self):
+        """
+        Verifies:
+            * nodes and VMs are refreshed from one bulk request each
+            * new nodes are imported, new VMs are not
+            * a line per cluster and a summary are printed
+        """
+        vm = VirtualMachine.objects.create(cluster=self.cluster,
+                                           hostname='vm1.example.bak')
+        output = self.refreshcache(clusters=['ganeti'])
+
+        self.assertEqual(1, len(self.rapi.IterNodes.calls))
+        self.assertEqual(1, len(self.rapi.IterInstances.calls))
+        self.assertEqual(len(NODES_BULK),
+                         Node.objects.filter(cluster=self.cluster).count())
+        self.assertEqual([vm.pk], list(VirtualMachine.objects
+                         .filter(cluster=self.cluster)
+                         .values_list('pk', flat=True)))
+
+        self.assertTrue('ganeti.example.test: 1 cluster, %d nodes, 1 vms'
+                        % len(NODES_BULK) in output)
+        self.assertTrue('of 1 clusters' in output)
+        self.assertTrue('0 failures' in output)
+
+    def test_import_vms(self):
+        """
+        VMs missing from the database are imported with --import-vms.
+        """
+        output = self.refreshcache(clusters=['ganeti'], types=['vms'],
+                                   import_vms=True)
+        self.assertEqual(len(INSTANCES_BULK), VirtualMachine.objects
+                         .filter(cluster=self.cluster).count())
+        self.assertTrue('ganeti.example.test: %d vms' % len(INSTANCES_BULK)
+                        in output)
+
+    def test_filters(self):
+        """
+        Only the given cluster and types are refreshed.
+        """
+        output = self.refreshcache(clusters=['ganeti'], types=['vms'],
+                                   import_vms=True)
+        self.assertTrue('ganeti.example.test: %d vms' % len(INSTANCES_BULK)
+                        in output)
+        self.assertFalse('other.example.test' in output)
+        self.rapi.IterNodes.assertNotCalled(self)
+
+        self.assertRaises(SystemExit, self.refreshcache,
+                          clusters=['missing'])
+
+    def test_fields_only(self):
+        """
+        Verifies:
+            * existing VMs have their searchable fields refreshed from one
+              query, without a bulk request
+            * new VMs are not imported
+        """
+        vm = VirtualMachine.objects.create(cluster=self.cluster,
+                                           hostname='vm1.example.bak')
+        info = dict(INSTANCES_BULK[0], beparams={'memory': 1024, 'vcpus': 4})
+        response = query_response(VirtualMachine.QUERY_FIELDS,
+                                  [info, INSTANCES_BULK[1]])
+        CallProxy.patch(self.rapi, 'Query', False, response)
+
+        output = self.refreshcache(clusters=['ganeti'], types=['vms'],
+                                   fields_only=True)
+        self.assertTrue('ganeti.example.test: 1 vms' in output)
+        self.rapi.IterInstances.assertNotCalled(self)
+        self.assertEqual(1, len(self.rapi.Query.calls))
+        self.assertEqual([(vm.pk, 1024)], list(VirtualMachine.objects
+                         .filter(cluster=self.cluster)
+                         .values_list('pk', 'ram')))
+
+    def test_dry_run(self):
+        output = self.refreshcache(dry_run=True, types=['nodes', 'vms'])
+        self.assertTrue('ganeti.example.test: would refresh nodes, vms'
+                        in output)
+        self.rapi.IterNodes.assertNotCalled(self)
+        self.rapi.IterInstances.assertNotCalled(self)
+
+    def test_stale_only(self):
+        """
+        Types whose objects are all fresh are skipped.
+        """
+        Cluster.objects.update(cached=datetime.now())
+        output = self.refreshcache(stale_only=True, dry_run=True)
+        self.assertTrue('ganeti.example.test: would refresh nodes, vms'
+                        in output)
+
+        VirtualMachine.objects.create(cluster=self.cluster, hostname='vm',
+                                      cached=datetime.now())
+        output = self.refreshcache(stale_only=True, dry_run=True)
+        self.assertTrue('ganeti.example.test: would refresh nodes\n'
+                        in output)
+
+    def test_failure(self):
+        """
+        Failed clusters are reported, and make the command fail.
+        """
+        self.rapi.IterInstances.error = GanetiApiError('unreachable')
+        self.assertRaises(SystemExit, self.refreshcache,
+                          clusters=['ganeti'], types=['vms'])
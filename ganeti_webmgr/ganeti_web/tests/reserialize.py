@@ -0,0 +1,82 @@
+# Copyright (c) 2012 Oregon State University Open Source Lab
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.    See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.
+
+import cPickle
+from StringIO import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from ganeti_webmgr.clusters.models import Cluster
+from ganeti_webmgr.utils.proxy.constants import INFO, INSTANCE
+from ganeti_webmgr.utils.serialization import info_format, loads_info
+from ganeti_webmgr.virtualmachines.models import VirtualMachine
+
+__all__ = ('TestReserialize',)
+
+
+class TestReserialize(TestCase):
+
+    def setUp(self):
+        self.cluster = Cluster.objects.create(hostname='ganeti.example.test',
+                                              slug='ganeti')
+        self.vms = [VirtualMachine.objects.create(cluster=self.cluster,
+                                                  hostname='vm%d.example.test'
+                                                  % i)
+                    for i in range(3)]
+        # Rows as written by earlier versions.
+        Cluster.objects.update(serialized_info=cPickle.dumps(INFO))
+        VirtualMachine.objects.update(serialized_info=cPickle.dumps(INSTANCE))
+
+    def tearDown(self):
+        VirtualMachine.objects.all().delete()
+        self.cluster.delete()
+
+    def reserialize(self, **options):
+        stdout = StringIO()
+        call_command('reserialize', stdout=stdout, **options)
+        return stdout.getvalue()
+
+    def texts(self, model):
+        return model.objects.values_list('serialized_info', flat=True)
+
+    def test_convert(self):
+        """
+        Verifies:
+            * legacy rows are rewritten in batches
+            * converted rows hold the same info
+            * rows already converted are left alone
+        """
+        output = self.reserialize(batch_size=2)
+        self.assertTrue('vm: converted 3 rows' in output, output)
+        self.assertTrue('cluster: converted 1 rows' in output, output)
+        for text in self.texts(VirtualMachine):
+            self.assertNotEqual('pickle', info_format(text))
+            self.assertEqual(INSTANCE, loads_info(text))
+        self.assertEqual(INFO, loads_info(self.texts(Cluster)[0]))
+
+        output = self.reserialize(models=['vm'])
+        self.assertEqual('vm: converted 0 rows\n', output)
+        output = self.reserialize(models=['vm'], all=True)
+        self.assertEqual('vm: converted 3 rows\n', output)
+
+    def test_benchmark(self):
+        output = self.reserialize(models=['vm'], benchmark=True)
+        for format in ('pickle', 'json', 'zlib'):
+            self.assertTrue('  %s ' % format in output, output)
+        for text in self.texts(VirtualMachine):
+            self.assertEqual('pickle', info_format(text))
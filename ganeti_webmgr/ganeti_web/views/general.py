@@ -177,14 +177,21 @@ def get_vm_counts(clusters):
         for i in annotated:
             result[format_key % i["cluster__pk"]] = {"orphaned": i["orphaned"]}
             orphaned += i["orphaned"]
+
+        # ask every cluster for its instances at once rather than waiting on
+        # each cluster in turn.
+        instances = Cluster.instances_for(clusters)
         for cluster in clusters:
             key = format_key % cluster.pk
 
             if key not in result:
                 result[key] = {"orphaned": 0}
 
-            result[key]["import_ready"] = len(cluster.missing_in_db)
-            result[key]["missing"] = len(cluster.missing_in_ganeti)
+            ganeti = instances[cluster.pk]
+            missing_in_db = cluster.get_missing_in_db(ganeti)
+            missing_in_ganeti = cluster.get_missing_in_ganeti(ganeti)
+            result[key]["import_ready"] = len(missing_in_db)
+            result[key]["missing"] = len(missing_in_ganeti)
 
             import_ready += result[key]["import_ready"]
             missing += result[key]["missing"]
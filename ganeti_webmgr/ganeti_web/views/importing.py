@@ -101,9 +101,12 @@ def missing_ganeti(request):
         if not clusters:
             raise PermissionDenied(NO_PRIVS)
 
+    # query all clusters concurrently, once for the whole view.
+    instances = Cluster.instances_for(clusters)
+
     vms = []
     for cluster in clusters:
-        for vm in cluster.missing_in_ganeti:
+        for vm in cluster.get_missing_in_ganeti(instances[cluster.pk]):
             vms.append((vm, vm))
 
     if request.method == 'POST':
@@ -129,7 +132,7 @@ def missing_ganeti(request):
 
     vms = {}
     for cluster in clusters:
-        for vm in cluster.missing_in_ganeti:
+        for vm in cluster.get_missing_in_ganeti(instances[cluster.pk]):
             vms[vm] = (cluster.hostname, vm)
 
     vmhostnames = vms.keys()
@@ -160,9 +163,12 @@ def missing_db(request):
         if not clusters:
             raise PermissionDenied(NO_PRIVS)
 
+    # query all clusters concurrently, once for the whole view.
+    instances = Cluster.instances_for(clusters)
+
     vms = []
     for cluster in clusters:
-        for hostname in cluster.missing_in_db:
+        for hostname in cluster.get_missing_in_db(instances[cluster.pk]):
             vms.append(('%s:%s' % (cluster.id, hostname), hostname))
 
     if request.method == 'POST':
@@ -196,7 +202,7 @@ def missing_db(request):
 
     vms = {}
     for cluster in clusters:
-        for hostname in cluster.missing_in_db:
+        for hostname in cluster.get_missing_in_db(instances[cluster.pk]):
             vms[hostname] = (u'%s:%s' % (cluster.id, hostname),
                              unicode(cluster.hostname), unicode(hostname))
     vmhostnames = vms.keys()
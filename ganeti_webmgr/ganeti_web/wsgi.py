@@ -6,6 +6,27 @@ os.environ.setdefault("DJANGO_SETTINGS_MODULE",
 from django.core.wsgi import get_wsgi_application
 application = get_wsgi_application()
 
+
+def prewarm():
+    """
+    Creates the RAPI clients of all clusters now rather than during the first
+    requests.
+    """
+    from django.conf import settings
+    from django.db import DatabaseError, transaction
+    from ganeti_webmgr.utils import prewarm_rapi_cache
+
+    if not settings.RAPI_PREWARM:
+        return
+    try:
+        prewarm_rapi_cache()
+    except DatabaseError:
+        # The database has not been set up yet.
+        transaction.rollback_unless_managed()
+
+
+prewarm()
+
 # Apply WSGI middleware here.
 # from helloworld.wsgi import HelloWorldApplication
 # application = HelloWorldApplication(application)
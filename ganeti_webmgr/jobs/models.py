@@ -1,15 +1,22 @@
 from datetime import datetime
 
-from django.db import models
+from django.conf import settings
+from django.db import models, transaction
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes.generic import GenericForeignKey
 
 from ganeti_webmgr.utils import get_rapi
 from ganeti_webmgr.utils.client import GanetiApiError
-from ganeti_webmgr.clusters.models import CachedClusterObject
+from ganeti_webmgr.utils.serialization import dumps_info
+from ganeti_webmgr.clusters.models import (CachedClusterObject,
+                                           CachedClusterObjectManager)
 
 
-class JobManager(models.Manager):
+# Job statuses after which a job no longer changes.
+FINISHED_STATUSES = ('success', 'error', 'canceled', 'unknown')
+
+
+class JobManager(CachedClusterObjectManager):
     """
     Custom manager for Ganeti Jobs model
     """
@@ -71,8 +78,12 @@ class Job(CachedClusterObject):
         """
         Load info for class.  This will load from ganeti if ignore_cache==True,
         otherwise this will always load from the cache.
+
+        When the job watcher is enabled it keeps the job up to date, and this
+        only loads from ganeti if nothing has been cached yet.
         """
-        if self.id and (self.ignore_cache or self.info is None):
+        ignore_cache = self.ignore_cache and not settings.JOB_WATCHER
+        if self.id and (ignore_cache or self.info is None):
             try:
                 self.refresh()
             except GanetiApiError as e:
@@ -95,6 +106,129 @@ class Job(CachedClusterObject):
         # else:
         #     Job.objects.get(job_id=self.info['id']).delete()
 
+    @classmethod
+    def finish(cls, pk, info=None):
+        """
+        Records the final state of a job and applies its side effects to the
+        object it ran on, without loading either.
+
+        @param info - the job's final info, or None if the job was archived
+        before its final status was seen.
+        @return True if the job was finished by this call, False if it had
+        already been finished.
+        """
+        data = cls._finished_data(info, datetime.now())
+
+        with transaction.commit_on_success():
+            # Only one caller gets to finish a job.
+            updated = cls.objects.filter(pk=pk) \
+                .exclude(status__in=FINISHED_STATUSES).update(**data)
+            if not updated:
+                return False
+
+            ct_id, object_id, op = cls.objects.filter(pk=pk) \
+                .values_list('content_type', 'object_id', 'op')[0]
+            model = ContentType.objects.get_for_id(ct_id).model_class()
+            model.finish_job(object_id, pk, op, data['status'])
+        return True
+
+    @classmethod
+    def refresh_status(cls, rapi, jobs):
+        """
+        Fetches the status of several jobs of one cluster with a single RAPI
+        query, and records it in one transaction.  Callers should leave out
+        jobs which already finished; their status no longer changes.
+
+        @param rapi - client of the jobs' cluster
+        @param jobs - list of (pk, job_id) tuples
+        @return dict of pk to the job's info, or None for jobs the cluster
+        no longer knows.  Jobs with invalid info are left out.
+        """
+        if not jobs:
+            return {}
+
+        infos = cls.fetch_status(rapi, [job_id for pk, job_id in jobs])
+        return cls.record_status(jobs, infos)
+
+    @classmethod
+    def record_status(cls, jobs, infos):
+        """
+        Records the status of several jobs in one transaction, see
+        refresh_status().
+
+        @param jobs - list of (pk, job_id) tuples
+        @param infos - dict of job_id to the job's info; jobs left out are
+        marked unknown
+        @return dict of pk to the job's info, or None for unknown jobs
+        """
+        now = datetime.now()
+        results = {}
+        running = {}
+
+        with transaction.commit_on_success():
+            for pk, job_id in jobs:
+                info = infos.get(job_id)
+                if info is not None and not cls.valid_job(info):
+                    continue
+                results[pk] = info
+
+                if info is not None and \
+                        info['status'] not in FINISHED_STATUSES:
+                    running.setdefault(info['status'], []).append(pk)
+                    continue
+
+                # Jobs may have been finished meanwhile, e.g. by the watcher.
+                cls.objects.filter(pk=pk) \
+                    .exclude(status__in=FINISHED_STATUSES) \
+                    .update(**cls._finished_data(info, now))
+
+            for status, pks in running.items():
+                cls.objects.filter(pk__in=pks) \
+                    .exclude(status__in=FINISHED_STATUSES) \
+                    .update(status=status)
+
+        return results
+
+    @classmethod
+    def fetch_status(cls, rapi, job_ids):
+        """
+        Fetches the status of several jobs of one cluster.
+
+        @return dict of job_id to the job's info.  Jobs the cluster no longer
+        knows are left out.
+        """
+        try:
+            return rapi.GetJobsStatus(job_ids)
+        except GanetiApiError as e:
+            if e.code not in (404, 501):
+                raise
+
+        # Clusters before Ganeti 2.6 have no job query resource.
+        infos = {}
+        for job_id in job_ids:
+            try:
+                infos[job_id] = rapi.GetJobStatus(job_id)
+            except GanetiApiError as e:
+                if e.code != 404:
+                    raise
+        return infos
+
+    @classmethod
+    def _finished_data(cls, info, now):
+        """
+        Values recorded for a finished job.
+
+        @param info - the job's final info, or None if the job was archived
+        before its final status was seen.
+        """
+        data = {'status': 'unknown'}
+        if info is not None and cls.valid_job(info):
+            data = cls.parse_persistent_info(info)
+            data['serialized_info'] = dumps_info(info)
+        data['ignore_cache'] = False
+        data['cached'] = now
+        return data
+
     @classmethod
     def valid_job(cls, info):
         status = info.get('status')
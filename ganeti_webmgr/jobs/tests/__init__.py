@@ -1,2 +1,3 @@
 from .models import *
 from .views import *
+from .watcher import *
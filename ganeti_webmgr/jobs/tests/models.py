@@ -17,6 +17,7 @@
 
 from django.test import TestCase
 
+from ganeti_webmgr.utils.client import GanetiApiError
 from ganeti_webmgr.utils.proxy import CallProxy
 from ganeti_webmgr.utils.proxy.constants import JOB, JOB_RUNNING, JOB_ERROR
 from ganeti_webmgr.virtualmachines.tests.views.base import (
@@ -171,3 +172,101 @@ class TestJobModel(TestJobMixin, TestCase):
         job.load_info()
         self.assertFalse(job.ignore_cache)
         job._refresh.assertNotCalled(self)
+
+
+class TestJobStatus(TestJobMixin, TestCase):
+
+    def setUp(self):
+        super(TestJobStatus, self).setUp()
+        self.rapi = self.cluster.rapi
+        self.running = Job.objects.create(job_id=1, cluster=self.cluster,
+                                          obj=self.vm, status='running')
+        self.finished = Job.objects.create(job_id=2, cluster=self.cluster,
+                                           obj=self.vm, status='running')
+        self.archived = Job.objects.create(job_id=3, cluster=self.cluster,
+                                           obj=self.vm, status='running')
+        CallProxy.patch(self.rapi, 'GetJobsStatus', False,
+                        {1: JOB_RUNNING, 2: JOB_ERROR})
+
+    def values(self, job):
+        # Loading the job would refresh it from the cluster.
+        return Job.objects.filter(pk=job.pk) \
+            .values('status', 'ignore_cache', 'finished')[0]
+
+    def test_refresh_status(self):
+        """
+        Verifies:
+            * the status of all jobs is fetched with a single call
+            * finished jobs are recorded as such
+            * jobs unknown to the cluster become unknown
+        """
+        jobs = [(j.pk, j.job_id)
+                for j in (self.running, self.finished, self.archived)]
+        infos = Job.refresh_status(self.rapi, jobs)
+
+        self.rapi.GetJobsStatus.assertCalled(self, [1, 2, 3])
+        self.assertEqual(1, len(self.rapi.GetJobsStatus.calls))
+        self.assertEqual({self.running.pk: JOB_RUNNING,
+                          self.finished.pk: JOB_ERROR,
+                          self.archived.pk: None}, infos)
+
+        running = self.values(self.running)
+        self.assertEqual('running', running['status'])
+        self.assertTrue(running['ignore_cache'])
+        finished = self.values(self.finished)
+        self.assertEqual('error', finished['status'])
+        self.assertFalse(finished['ignore_cache'])
+        self.assertTrue(finished['finished'])
+        archived = self.values(self.archived)
+        self.assertEqual('unknown', archived['status'])
+        self.assertFalse(archived['ignore_cache'])
+
+    def test_refresh_status_empty(self):
+        self.assertEqual({}, Job.refresh_status(self.rapi, []))
+        self.rapi.GetJobsStatus.assertNotCalled(self)
+
+    def test_fetch_status_fallback(self):
+        """
+        Clusters without the job query resource are asked job by job.
+        """
+        self.rapi.GetJobsStatus.error = GanetiApiError('Not Found', 404)
+        self.rapi.GetJobStatus.response = JOB_ERROR
+
+        self.assertEqual({1: JOB_ERROR, 2: JOB_ERROR},
+                         Job.fetch_status(self.rapi, [1, 2]))
+        self.assertEqual(2, len(self.rapi.GetJobStatus.calls))
+
+    def test_check_job_status(self):
+        """
+        Finished jobs other than the object's last job aren't fetched again.
+        """
+        Job.objects.filter(pk=self.finished.pk) \
+            .update(job_id=0, status='success')
+        Job.objects.filter(pk=self.archived.pk).delete()
+
+        self.vm.last_job = self.running
+        updates = self.vm.check_job_status()
+        self.rapi.GetJobsStatus.assertCalled(self, [1])
+        self.assertEqual({}, updates)
+
+        # the last job finishes
+        self.rapi.GetJobsStatus.response = {1: JOB}
+        updates = self.vm.check_job_status()
+        self.assertFalse(updates['ignore_cache'])
+        self.assertEqual(None, updates['last_job'])
+
+    def test_check_job_status_error(self):
+        """
+        Jobs whose status can't be fetched become unknown.
+        """
+        Job.objects.filter(pk__in=[self.finished.pk, self.archived.pk]) \
+            .delete()
+        self.rapi.GetJobsStatus.error = GanetiApiError('Not Allowed', 403)
+
+        self.vm.last_job = self.running
+        updates = self.vm.check_job_status()
+        self.assertFalse(updates['ignore_cache'])
+        self.assertEqual(None, updates['last_job'])
+        running = self.values(self.running)
+        self.assertEqual('unknown', running['status'])
+        self.assertFalse(running['ignore_cache'])
@@ -0,0 +1,186 @@
+# Copyright (c) 2012 Oregon State University Open Source Lab
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.    See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.
+
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from ganeti_webmgr.utils.client import GanetiApiError
+from ganeti_webmgr.utils.proxy.constants import JOB, JOB_RUNNING
+from ganeti_webmgr.virtualmachines.models import VirtualMachine
+
+from ..models import Job
+from ..watcher import JobWatcher, WatchedJob, wait_for_job
+from .models import TestJobMixin
+
+__all__ = ['TestWaitForJob', 'TestJobWatcher']
+
+
+class FakeRapi(object):
+    """
+    Answers WaitForJobChange and GetJobStatus with canned responses.
+    """
+
+    def __init__(self, change=None, status=None, error=None):
+        self.change = change
+        self.status = status
+        self.error = error
+        self.waits = []
+
+    def WaitForJobChange(self, job_id, fields, prev_job_info,
+                         prev_log_serial):
+        self.waits.append((job_id, prev_job_info, prev_log_serial))
+        if self.error is not None:
+            raise self.error
+        return self.change
+
+    def GetJobStatus(self, job_id):
+        return self.status
+
+
+class TestWaitForJob(TestCase):
+
+    def test_unchanged(self):
+        rapi = FakeRapi()
+        job = WatchedJob(1, 1, 1, rapi)
+        self.assertEqual((False, None), wait_for_job(job))
+
+    def test_running(self):
+        change = {'job_info': ['running'], 'log_entries': [[3, 0, '', '']]}
+        rapi = FakeRapi(change=change)
+        job = WatchedJob(1, 1, 1, rapi)
+        job.prev_job_info = ['queued']
+        job.prev_log_serial = 2
+        self.assertEqual((False, change), wait_for_job(job))
+        self.assertEqual([(1, ['queued'], 2)], rapi.waits)
+
+    def test_finished(self):
+        """
+        The complete info of a finished job is fetched.
+        """
+        rapi = FakeRapi(change={'job_info': ['success'], 'log_entries': []},
+                        status=JOB)
+        job = WatchedJob(1, 1, 1, rapi)
+        self.assertEqual((True, JOB), wait_for_job(job))
+
+    def test_archived(self):
+        rapi = FakeRapi(error=GanetiApiError('Not Found', 404))
+        job = WatchedJob(1, 1, 1, rapi)
+        self.assertEqual((True, None), wait_for_job(job))
+
+    def test_error(self):
+        rapi = FakeRapi(error=GanetiApiError('Server Error', 500))
+        job = WatchedJob(1, 1, 1, rapi)
+        self.assertRaises(GanetiApiError, wait_for_job, job)
+
+
+class TestJobWatcher(TestJobMixin, TestCase):
+
+    def setUp(self):
+        super(TestJobWatcher, self).setUp()
+        self.job = Job.objects.create(job_id=1, cluster=self.cluster,
+                                      obj=self.vm, op='OP_INSTANCE_SHUTDOWN',
+                                      status='running')
+        VirtualMachine.objects.filter(pk=self.vm.pk) \
+            .update(ignore_cache=True, last_job=self.job)
+        self.watcher = JobWatcher()
+        self.watched = WatchedJob(self.job.pk, 1, self.cluster.pk, None)
+        self.watcher._jobs[self.job.pk] = self.watched
+        self.submitted = []
+        self.watcher._submit = self.submitted.append
+
+    def status(self):
+        # Loading the job would refresh it from the cluster.
+        return Job.objects.filter(pk=self.job.pk) \
+            .values_list('status', flat=True)[0]
+
+    def test_watch_new_jobs(self):
+        """
+        Unfinished jobs which aren't watched yet are submitted.
+        """
+        del self.watcher._jobs[self.job.pk]
+        Job.objects.create(job_id=2, cluster=self.cluster, obj=self.vm,
+                           status='success')
+
+        self.watcher.watch_new_jobs()
+        self.assertEqual([self.job.pk], [j.pk for j in self.submitted])
+        self.assertEqual(1, self.watcher.watching)
+
+        # already watched jobs aren't submitted again
+        self.watcher.watch_new_jobs()
+        self.assertEqual(1, len(self.submitted))
+
+    def test_apply_running(self):
+        """
+        A job which is still running is updated and watched again.
+        """
+        change = {'job_info': ['waiting'],
+                  'log_entries': [[4, 0, '', ''], [5, 0, '', '']]}
+        self.watcher._apply(self.watched, (False, change), None)
+
+        self.assertEqual([self.watched], self.submitted)
+        self.assertEqual(['waiting'], self.watched.prev_job_info)
+        self.assertEqual(5, self.watched.prev_log_serial)
+        self.assertEqual('waiting', self.status())
+
+    def test_apply_finished(self):
+        """
+        A finished job is recorded and its object's cache flags are cleared.
+        """
+        self.watcher._apply(self.watched, (True, JOB), None)
+
+        self.assertEqual([], self.submitted)
+        self.assertEqual(0, self.watcher.watching)
+        self.assertEqual(1, self.watcher.finished)
+
+        job = Job.objects.get(pk=self.job.pk)
+        self.assertEqual('success', job.status)
+        self.assertFalse(job.ignore_cache)
+        vm = VirtualMachine.objects.filter(pk=self.vm.pk) \
+            .values('ignore_cache', 'last_job')[0]
+        self.assertEqual({'ignore_cache': False, 'last_job': None}, vm)
+
+    def test_apply_archived(self):
+        self.watcher._apply(self.watched, (True, None), None)
+        self.assertEqual('unknown', self.status())
+
+    def test_finish_once(self):
+        """
+        A job is only finished once.
+        """
+        self.assertTrue(Job.finish(self.job.pk, JOB))
+        self.assertFalse(Job.finish(self.job.pk, JOB_RUNNING))
+        self.assertEqual('success', self.status())
+
+    def test_apply_error(self):
+        """
+        Jobs which could not be watched are retried after the interval.
+        """
+        self.watcher.interval = 0
+        self.watcher.process = lambda timeout: None
+        self.watcher._apply(self.watched, None, GanetiApiError('down'))
+        self.assertEqual([], self.submitted)
+
+        self.watcher.run_once()
+        self.assertEqual([self.watched], self.submitted)
+
+    @override_settings(JOB_WATCHER=True)
+    def test_no_polling(self):
+        """
+        Objects don't poll their jobs while the watcher is running.
+        """
+        vm = VirtualMachine.objects.get(pk=self.vm.pk)
+        self.assertEqual({}, vm.check_job_status())
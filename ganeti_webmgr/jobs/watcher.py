@@ -0,0 +1,225 @@
+# Copyright (c) 2012 Oregon State University Open Source Lab
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.    See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.
+
+
+"""
+Background tracking of running Ganeti jobs.
+
+Without the watcher, every page showing an object with a running job asks
+the cluster for the job's status.  The watcher instead long-polls each running
+job with WaitForJobChange, which only answers once the job changes, and
+finishes the job (see Job.finish()) as soon as it completes.
+
+Worker threads only talk to the RAPI.  All database work happens in the
+thread running the watcher.
+"""
+
+import logging
+import Queue
+import threading
+import time
+
+from ganeti_webmgr.clusters.models import Cluster
+from ganeti_webmgr.utils import get_rapi
+from ganeti_webmgr.utils.client import GanetiApiError, JOB_STATUS_FINALIZED
+
+from .models import Job, FINISHED_STATUSES
+
+# Job fields whose changes wake up a long poll.
+WATCH_FIELDS = ["status"]
+
+
+class WatchedJob(object):
+    """
+    What the watcher knows about a job between two long polls.
+    """
+
+    def __init__(self, pk, job_id, cluster_id, rapi):
+        self.pk = pk
+        self.job_id = job_id
+        self.cluster_id = cluster_id
+        self.rapi = rapi
+        self.status = None
+        self.prev_job_info = None
+        self.prev_log_serial = None
+        self.retry_at = None
+
+
+def wait_for_job(job):
+    """
+    Waits for a job to change.  This runs in a worker thread and only talks to
+    the RAPI.
+
+    @return tuple of (finished, info).  For finished jobs ``info`` is their
+    complete final info, or None if the job was archived.  Otherwise it is
+    the answer of WaitForJobChange, None if the job did not change.
+    """
+    try:
+        change = job.rapi.WaitForJobChange(job.job_id, WATCH_FIELDS,
+                                           job.prev_job_info,
+                                           job.prev_log_serial)
+        if change is None or change['job_info'][0] not in \
+                JOB_STATUS_FINALIZED:
+            return False, change
+        return True, job.rapi.GetJobStatus(job.job_id)
+
+    except GanetiApiError as e:
+        # The job was archived, its outcome is unknown.
+        if e.code == 404:
+            return True, None
+        raise
+
+
+class ClusterWorkers(object):
+    """
+    Worker threads long-polling the jobs of one cluster.  A long poll keeps a
+    worker busy for up to ten seconds, so each cluster gets its own workers.
+    """
+
+    def __init__(self, workers, results):
+        self.tasks = Queue.Queue()
+        self.results = results
+        for i in range(workers):
+            thread = threading.Thread(target=self._work)
+            thread.daemon = True
+            thread.start()
+
+    def _work(self):
+        while True:
+            job = self.tasks.get()
+            try:
+                result = wait_for_job(job)
+            except Exception as e:
+                self.results.put((job, None, e))
+            else:
+                self.results.put((job, result, None))
+
+
+class JobWatcher(object):
+    """
+    Tracks all unfinished jobs, many per cluster at once.
+
+    Call run() to watch jobs until the process is stopped, or run_once() to
+    pick up new jobs and process the answers arriving within one interval.
+    """
+
+    def __init__(self, workers=4, interval=5, logger=logging):
+        """
+        @param workers - number of jobs long-polled at the same time on each
+        cluster
+        @param interval - seconds between checks for new jobs, and before
+        retrying a job whose cluster could not be reached
+        """
+        self.workers = workers
+        self.interval = interval
+        self.logger = logger
+        self.results = Queue.Queue()
+        self.finished = 0
+
+        self._clusters = {}
+        self._jobs = {}
+        self._retry = []
+
+    def watch_new_jobs(self):
+        """
+        Starts watching unfinished jobs which aren't watched yet.
+        """
+        rows = Job.objects.exclude(status__in=FINISHED_STATUSES) \
+            .values_list('id', 'job_id', 'cluster_id', 'cluster_hash')
+        for pk, job_id, cluster_id, cluster_hash in rows:
+            if pk in self._jobs:
+                continue
+            try:
+                rapi = get_rapi(cluster_hash, cluster_id)
+            except Cluster.DoesNotExist:
+                continue
+            job = WatchedJob(pk, job_id, cluster_id, rapi)
+            self._jobs[pk] = job
+            self._submit(job)
+
+    def _submit(self, job):
+        workers = self._clusters.get(job.cluster_id)
+        if workers is None:
+            workers = ClusterWorkers(self.workers, self.results)
+            self._clusters[job.cluster_id] = workers
+        workers.tasks.put(job)
+
+    def process(self, timeout):
+        """
+        Applies the answers arriving within ``timeout`` seconds.
+        """
+        deadline = time.time() + timeout
+        while True:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return
+            try:
+                job, result, error = self.results.get(True, remaining)
+            except Queue.Empty:
+                return
+            self._apply(job, result, error)
+
+    def _apply(self, job, result, error):
+        if error is not None:
+            self.logger.warning("Could not watch job %s: %s", job.job_id,
+                                error)
+            job.retry_at = time.time() + self.interval
+            self._retry.append(job)
+            return
+
+        finished, info = result
+        if finished:
+            del self._jobs[job.pk]
+            if Job.finish(job.pk, info):
+                self.finished += 1
+            return
+
+        if info is not None:
+            job.prev_job_info = info['job_info']
+            serials = [entry[0] for entry in info['log_entries'] or ()]
+            if serials:
+                job.prev_log_serial = max(serials)
+
+            status = info['job_info'][0]
+            if status != job.status:
+                job.status = status
+                Job.objects.filter(pk=job.pk) \
+                    .exclude(status__in=FINISHED_STATUSES) \
+                    .update(status=status)
+
+        self._submit(job)
+
+    def run_once(self):
+        now = time.time()
+        retry = [job for job in self._retry if job.retry_at <= now]
+        self._retry = [job for job in self._retry if job.retry_at > now]
+        for job in retry:
+            self._submit(job)
+
+        self.watch_new_jobs()
+        self.process(self.interval)
+
+    def run(self):
+        while True:
+            self.run_once()
+
+    @property
+    def watching(self):
+        """
+        Number of jobs being watched.
+        """
+        return len(self._jobs)
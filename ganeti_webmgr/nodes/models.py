@@ -1,3 +1,6 @@
+import threading
+import time
+
 from django.db import models
 from django.db.models import Sum, Q
 
@@ -42,6 +45,17 @@ class Node(CachedClusterObject):
     last_job = models.ForeignKey('jobs.Job', related_name="+", null=True,
                                  blank=True)
 
+    QUERY_RESOURCE = 'node'
+    QUERY_FIELDS = ('name', 'mtime', 'serial_no', 'mtotal', 'mfree', 'dtotal',
+                    'dfree', 'csockets', 'offline', 'role')
+    BULK_INFO_METHOD = 'IterNodes'
+    # Ganeti does not bump a node's mtime when its free memory or disk change.
+    BULK_MTIME_CHECK = False
+
+    # Resources allocated to this node's VMs, when computed for a whole
+    # cluster by with_allocations().
+    _allocations = None
+
     def __unicode__(self):
         return self.hostname
 
@@ -88,18 +102,71 @@ class Node(CachedClusterObject):
         data['role'] = info['role']
         return data
 
+    @classmethod
+    def allocations(cls, cluster):
+        """
+        Computes the resources allocated to the VMs of every node of a
+        cluster, with a few grouped queries instead of several per node.
+
+        @return dict of node id to a dict of the allocated ``ram``, ``disk``
+        and ``cpus``.  Nodes without VMs are left out.
+        """
+        vms = VirtualMachine.objects.filter(cluster=cluster).order_by()
+        running = vms.filter(status='running')
+        both = ('primary_node', 'secondary_node')
+        queries = (
+            ('ram', running.exclude(ram=-1), 'ram', both),
+            ('disk', vms.exclude(disk_size=-1), 'disk_size', both),
+            ('cpus', running.exclude(virtual_cpus=-1), 'virtual_cpus',
+             ('primary_node',)),
+        )
+
+        allocations = {}
+        for key, qs, field, node_fields in queries:
+            for node_field in node_fields:
+                rows = qs.values(node_field).annotate(total=Sum(field))
+                for row in rows:
+                    node_id = row[node_field]
+                    if node_id is None:
+                        continue
+                    allocated = allocations.setdefault(
+                        node_id, {'ram': 0, 'disk': 0, 'cpus': 0})
+                    allocated[key] += row['total'] or 0
+        return allocations
+
+    @classmethod
+    def with_allocations(cls, cluster, nodes=None):
+        """
+        Returns the nodes of a cluster with their allocated resources already
+        computed, so that ram, disk and allocated_cpus don't query them node
+        by node.
+
+        @param nodes - the nodes to return, all of the cluster's if None
+        """
+        if nodes is None:
+            nodes = cluster.nodes.all()
+        allocations = cls.allocations(cluster)
+        nodes = list(nodes)
+        for node in nodes:
+            node._allocations = allocations.get(
+                node.pk, {'ram': 0, 'disk': 0, 'cpus': 0})
+        return nodes
+
     @property
     def ram(self):
         """ returns dict of free and total ram """
-        values = (VirtualMachine.objects
-                  .filter(Q(primary_node=self) | Q(secondary_node=self))
-                  .filter(status='running')
-                  .exclude(ram=-1).order_by()
-                  .aggregate(used=Sum('ram')))
+        if self._allocations is not None:
+            allocated = self._allocations['ram']
+        else:
+            values = (VirtualMachine.objects
+                      .filter(Q(primary_node=self) | Q(secondary_node=self))
+                      .filter(status='running')
+                      .exclude(ram=-1).order_by()
+                      .aggregate(used=Sum('ram')))
+            allocated = values.get("used") or 0
 
         total = self.ram_total
         used = total - self.ram_free
-        allocated = values.get("used") or 0
         free = total - allocated if allocated >= 0 and total >= 0 else -1
 
         return {
@@ -112,14 +179,17 @@ class Node(CachedClusterObject):
     @property
     def disk(self):
         """ returns dict of free and total disk space """
-        values = VirtualMachine.objects \
-            .filter(Q(primary_node=self) | Q(secondary_node=self)) \
-            .exclude(disk_size=-1).order_by() \
-            .aggregate(used=Sum('disk_size'))
+        if self._allocations is not None:
+            allocated = self._allocations['disk']
+        else:
+            values = VirtualMachine.objects \
+                .filter(Q(primary_node=self) | Q(secondary_node=self)) \
+                .exclude(disk_size=-1).order_by() \
+                .aggregate(used=Sum('disk_size'))
+            allocated = values.get("used") or 0
 
         total = self.disk_total
         used = total - self.disk_free
-        allocated = values.get("used") or 0
         free = total - allocated if allocated >= 0 and total >= 0 else -1
 
         return {
@@ -131,6 +201,8 @@ class Node(CachedClusterObject):
 
     @property
     def allocated_cpus(self):
+        if self._allocations is not None:
+            return self._allocations['cpus']
         values = VirtualMachine.objects \
             .filter(primary_node=self, status='running') \
             .exclude(virtual_cpus=-1).order_by() \
@@ -184,3 +256,80 @@ class Node(CachedClusterObject):
 
     def natural_key(self):
         return self.hostname
+
+
+# Seconds a shared NodeResolver is used before its nodes are loaded again,
+# in case another process added or removed some meanwhile.  Nodes added or
+# deleted by this process drop the resolver right away, see
+# ganeti_web/models.py.
+NODE_RESOLVER_MAX_AGE = 60
+
+
+class NodeResolver(object):
+    """
+    Maps the hostnames of a cluster's nodes to their ids, so that virtual
+    machines are linked to their nodes without a query per node.  All of the
+    cluster's nodes are loaded with one query, by the first lookup.
+
+    Nodes may have been added since; a hostname which is not found has the
+    nodes loaded again, once per hostname.
+    """
+
+    def __init__(self, cluster_id):
+        self.cluster_id = cluster_id
+        self.loaded = None
+        self._ids = None
+        self._missed = set()
+
+    def load(self):
+        self._ids = dict(Node.objects.filter(cluster=self.cluster_id)
+                         .values_list('hostname', 'id'))
+        self.loaded = time.time()
+
+    def get(self, hostname):
+        """
+        Returns the id of the node with the given hostname, or None if the
+        node is not known.
+        """
+        if self._ids is None:
+            self.load()
+        elif hostname not in self._ids and hostname not in self._missed:
+            self._missed.add(hostname)
+            self.load()
+        return self._ids.get(hostname)
+
+    def expired(self, now=None):
+        if self.loaded is None:
+            return False
+        if now is None:
+            now = time.time()
+        return now - self.loaded >= NODE_RESOLVER_MAX_AGE
+
+
+# NodeResolvers shared by the refreshes of this process, by cluster id.
+_resolvers = {}
+_resolvers_lock = threading.Lock()
+
+
+def node_resolver(cluster_id):
+    """
+    Returns the NodeResolver of a cluster shared by this process, so that
+    refreshing many of its virtual machines loads its nodes once.
+    """
+    with _resolvers_lock:
+        resolver = _resolvers.get(cluster_id)
+        if resolver is None or resolver.expired():
+            resolver = _resolvers[cluster_id] = NodeResolver(cluster_id)
+        return resolver
+
+
+def forget_node_resolver(cluster_id=None):
+    """
+    Drops the shared NodeResolver of a cluster, or of all clusters, after
+    nodes were added or removed.
+    """
+    with _resolvers_lock:
+        if cluster_id is None:
+            _resolvers.clear()
+        else:
+            _resolvers.pop(cluster_id, None)
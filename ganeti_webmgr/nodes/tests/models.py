@@ -19,14 +19,16 @@ from datetime import datetime
 
 from django.test import TestCase
 
-from ganeti_webmgr.utils.proxy.constants import NODE
+from ganeti_webmgr.utils.proxy.constants import INSTANCE, NODE, NODES_BULK
 
 from ganeti_webmgr.virtualmachines.models import VirtualMachine
 from ganeti_webmgr.clusters.models import Cluster
-from ganeti_webmgr.nodes.models import Node
+from ganeti_webmgr.nodes.models import (NODE_RESOLVER_MAX_AGE, Node,
+                                        NodeResolver, forget_node_resolver,
+                                        node_resolver)
 
 
-__all__ = ['TestNodeModel']
+__all__ = ['TestNodeModel', 'TestNodeResolver']
 
 
 class NodeTestCaseMixin(object):
@@ -275,3 +277,212 @@ class TestNodeModel(TestCase, NodeTestCaseMixin):
         node.delete()
         node2.delete()
         c.delete()
+
+    def test_with_allocations(self):
+        """
+        Tests computing the allocated resources of all nodes at once
+
+        Verifies:
+            * the same figures as the per node properties are returned
+            * nodes without VMs have nothing allocated
+        """
+        node, c = self.create_node()
+        node2, c = self.create_node(cluster=c, hostname='two')
+        node3, c = self.create_node(cluster=c, hostname='three')
+        node.refresh()
+        node2.refresh()
+
+        vms = [
+            VirtualMachine.objects.create(cluster=c, primary_node=node,
+                                          secondary_node=node2,
+                                          hostname='foo', ram=123,
+                                          disk_size=10, virtual_cpus=2,
+                                          status='running'),
+            VirtualMachine.objects.create(cluster=c, primary_node=node2,
+                                          secondary_node=node,
+                                          hostname='bar', ram=456,
+                                          disk_size=20, virtual_cpus=4,
+                                          status='running'),
+            VirtualMachine.objects.create(cluster=c, primary_node=node,
+                                          hostname='xoo', ram=789,
+                                          disk_size=40, virtual_cpus=8,
+                                          status='admin_down'),
+            VirtualMachine.objects.create(cluster=c, primary_node=node,
+                                          hostname='boo', status='running'),
+        ]
+
+        nodes = Node.with_allocations(c)
+        expected = dict((n.pk, (n.ram, n.disk, n.allocated_cpus))
+                        for n in Node.objects.filter(cluster=c))
+        self.assertEqual(expected, dict((n.pk, (n.ram, n.disk,
+                                                n.allocated_cpus))
+                                        for n in nodes))
+
+        self.assertEqual({node.pk: {'ram': 579, 'disk': 70, 'cpus': 2},
+                          node2.pk: {'ram': 579, 'disk': 30, 'cpus': 4}},
+                         Node.allocations(c))
+
+        for vm in vms:
+            vm.delete()
+        c.delete()
+
+    def test_refresh_nodes(self):
+        """
+        Tests refreshing all nodes of a cluster in bulk
+
+        Verifies:
+            * a single bulk request is issued, no node is fetched on its own
+            * all nodes have their resources updated, even when their mtime
+              did not advance
+        """
+        node, c = self.create_node(hostname='gtest1.example.bak')
+        node3, c = self.create_node(cluster=c, hostname='gtest3.example.bak')
+        mtime = datetime.fromtimestamp(NODES_BULK[2]['mtime'])
+        Node.objects.filter(pk=node3.pk).update(mtime=mtime)
+        c.rapi.GetNode.reset()
+
+        self.assertEqual((2, 0), c.refresh_nodes())
+        self.assertEqual(1, len(c.rapi.IterNodes.calls))
+        c.rapi.GetNode.assertNotCalled(self)
+
+        values = Node.objects.filter(pk=node.pk) \
+            .values('ram_total', 'disk_total', 'role', 'cached')[0]
+        self.assertEqual(NODES_BULK[0]['mtotal'], values['ram_total'])
+        self.assertEqual(NODES_BULK[0]['dtotal'], values['disk_total'])
+        self.assertEqual('M', values['role'])
+        self.assertTrue(values['cached'])
+
+        # node3 is offline, ganeti reports no resources for it
+        fields = ('ram_total', 'ram_free', 'disk_total', 'disk_free')
+        values = Node.objects.filter(pk=node3.pk) \
+            .values('cached', *fields)[0]
+        self.assertEqual(dict.fromkeys(fields, 0),
+                         dict((f, values[f]) for f in fields))
+        self.assertTrue(values['cached'])
+
+        node.delete()
+        node3.delete()
+        c.delete()
+
+
+class TestNodeResolver(TestCase, NodeTestCaseMixin):
+
+    def setUp(self):
+        forget_node_resolver()
+        self.node, self.cluster = self.create_node(
+            hostname='gtest1.example.bak')
+        self.node2, c = self.create_node(cluster=self.cluster,
+                                         hostname='gtest2.example.bak')
+        self.other = Cluster.objects.create(hostname='other.example.bak',
+                                            slug='other')
+        self.node3, c = self.create_node(cluster=self.other,
+                                         hostname='node3.other.bak')
+
+    def tearDown(self):
+        forget_node_resolver()
+        Node.objects.all().delete()
+        Cluster.objects.all().delete()
+
+    def test_get(self):
+        """
+        Verifies:
+            * all nodes of the cluster are loaded with one query
+            * unknown nodes and nodes of other clusters are not resolved
+        """
+        resolver = NodeResolver(self.cluster.id)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.node.pk, resolver.get('gtest1.example.bak'))
+            self.assertEqual(self.node2.pk,
+                             resolver.get('gtest2.example.bak'))
+        self.assertEqual(None, resolver.get('node3.other.bak'))
+        self.assertEqual(None, resolver.get('missing.example.bak'))
+
+    def test_get_new_node(self):
+        """
+        Verifies:
+            * nodes created after the resolver was loaded are found
+            * unknown hostnames only reload the nodes once
+        """
+        resolver = NodeResolver(self.cluster.id)
+        self.assertEqual(None, resolver.get('gtest4.example.bak'))
+        node, c = self.create_node(cluster=self.cluster,
+                                   hostname='gtest4.example.bak')
+        self.assertEqual(node.pk, resolver.get('gtest4.example.bak'))
+
+        with self.assertNumQueries(1):
+            self.assertEqual(None, resolver.get('missing.example.bak'))
+            self.assertEqual(None, resolver.get('missing.example.bak'))
+
+    def test_shared(self):
+        """
+        Verifies:
+            * the resolver of a cluster is shared until nodes are added,
+              removed or synced, or it expired
+        """
+        resolver = node_resolver(self.cluster.id)
+        resolver.get('gtest1.example.bak')
+        self.assertTrue(resolver is node_resolver(self.cluster.id))
+        self.assertFalse(resolver is node_resolver(self.other.id))
+
+        self.node2.save()
+        self.assertTrue(resolver is node_resolver(self.cluster.id))
+        node, c = self.create_node(cluster=self.cluster,
+                                   hostname='gtest4.example.bak')
+        self.assertFalse(resolver is node_resolver(self.cluster.id))
+
+        resolver = node_resolver(self.cluster.id)
+        node.delete()
+        self.assertFalse(resolver is node_resolver(self.cluster.id))
+
+        resolver = node_resolver(self.cluster.id)
+        resolver.get('gtest1.example.bak')
+        resolver.loaded -= NODE_RESOLVER_MAX_AGE
+        self.assertFalse(resolver is node_resolver(self.cluster.id))
+
+        resolver = node_resolver(self.cluster.id)
+        self.cluster.sync_nodes()
+        self.assertFalse(resolver is node_resolver(self.cluster.id))
+
+    def test_deleted_node(self):
+        """
+        Nodes deleted in bulk, as when importing or syncing, are no longer
+        resolved.
+        """
+        resolver = node_resolver(self.cluster.id)
+        self.assertEqual(self.node2.pk, resolver.get('gtest2.example.bak'))
+
+        Node.objects.filter(hostname__in=['gtest2.example.bak']).delete()
+        resolver = node_resolver(self.cluster.id)
+        self.assertEqual(None, resolver.get('gtest2.example.bak'))
+        self.assertEqual(self.node.pk, resolver.get('gtest1.example.bak'))
+
+    def test_parse_persistent_info(self):
+        """
+        Virtual machines are linked to their nodes without a query per node
+        """
+        resolver = NodeResolver(self.cluster.id)
+        info = dict(INSTANCE, snodes=['gtest2.example.bak'])
+        data = VirtualMachine.parse_persistent_info(info, resolver)
+        self.assertEqual(self.node.pk, data['primary_node_id'])
+        self.assertEqual(self.node2.pk, data['secondary_node_id'])
+
+        info = dict(INSTANCE, pnode='gtest2.example.bak')
+        with self.assertNumQueries(0):
+            data = VirtualMachine.parse_persistent_info(info, resolver)
+        self.assertEqual(self.node2.pk, data['primary_node_id'])
+        self.assertEqual(None, data['secondary_node_id'])
+
+        data = VirtualMachine.parse_persistent_info(info)
+        self.assertEqual(self.node2.pk, data['primary_node_id'])
+
+    def test_parse_info(self):
+        """
+        A refreshed virtual machine is linked to its current node
+        """
+        vm = VirtualMachine(cluster=self.cluster, hostname='vm.example.bak',
+                            primary_node=self.node2)
+        vm.info = INSTANCE
+        vm.parse_info()
+        self.assertEqual(self.node.pk, vm.primary_node_id)
+        self.assertEqual(self.node, vm.primary_node)
+        self.assertEqual(None, vm.secondary_node)
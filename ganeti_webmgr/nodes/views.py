@@ -114,7 +114,7 @@ class NodePrimaryListView(BaseNodeVMListView):
 
     def get_queryset(self):
         node = self.get_node()
-        self.queryset = node.primary_vms.all()
+        self.queryset = node.primary_vms.light('cluster')
         return super(NodePrimaryListView, self).get_queryset()
 
     def get_context_data(self, **kwargs):
@@ -130,7 +130,7 @@ class NodeSecondaryListView(BaseNodeVMListView):
 
     def get_queryset(self):
         node = self.get_node()
-        self.queryset = node.secondary_vms.all()
+        self.queryset = node.secondary_vms.light('cluster')
         return super(NodeSecondaryListView, self).get_queryset()
 
     def get_context_data(self, **kwargs):
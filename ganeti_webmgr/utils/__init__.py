@@ -1,11 +1,15 @@
 import random
 import string
+import threading
 from collections import defaultdict
 
 from django.conf import settings
 
 from .client import GanetiRapiClient, GanetiApiError
+from .fanout import RapiExecutor
+from .metrics import RAPI_METRICS
 from .proxy import RapiProxy, XenRapiProxy
+from .registry import RapiRegistry
 
 from ganeti_webmgr.ganeti_web import constants
 from ganeti_webmgr.ganeti_web.caps import has_balloonmem
@@ -16,8 +20,14 @@ def generate_random_password(length=12):
     return "".join(random.sample(string.letters + string.digits, length))
 
 
-RAPI_CACHE = {}
-RAPI_CACHE_HASHES = {}
+def chunks(seq, size):
+    """
+    Split a sequence into lists of at most ``size`` items.  Useful for keeping
+    ``__in`` lookups below the database's limit on query parameters.
+    """
+    seq = list(seq)
+    for i in xrange(0, len(seq), size):
+        yield seq[i:i + size]
 
 
 def get_rapi_client():
@@ -38,6 +48,34 @@ def get_rapi_client():
     return rapi_client
 
 
+def create_rapi(host, port, user, password):
+    """
+    Creates a new Ganeti RAPI client configured from the settings.
+    """
+    rapi_client = get_rapi_client()
+
+    # Set connect timeout in settings.py so that you do not learn patience.
+    return rapi_client(
+        host, port, user, password,
+        timeout=settings.RAPI_CONNECT_TIMEOUT,
+        pool_size=settings.RAPI_POOL_SIZE,
+        pool_idle_timeout=settings.RAPI_POOL_IDLE_TIMEOUT,
+        circuit_failures=settings.RAPI_CIRCUIT_FAILURES,
+        circuit_reset_timeout=settings.RAPI_CIRCUIT_RESET,
+        circuit_max_reset_timeout=settings.RAPI_CIRCUIT_MAX_RESET,
+        coalesce=settings.RAPI_COALESCE,
+        coalesce_window=settings.RAPI_COALESCE_WINDOW,
+        cache_size=settings.RAPI_RESPONSE_CACHE_SIZE,
+        cache_ttls=settings.RAPI_RESPONSE_CACHE_TTLS,
+        max_concurrency=settings.RAPI_MAX_CONCURRENCY,
+        concurrency_timeout=settings.RAPI_CONCURRENCY_TIMEOUT,
+        concurrency_lock_dir=settings.RAPI_CONCURRENCY_LOCK_DIR,
+        hooks=[RAPI_METRICS] if settings.RAPI_METRICS else None)
+
+
+RAPI_REGISTRY = RapiRegistry(create_rapi, settings.RAPI_REGISTRY_SIZE)
+
+
 def get_rapi(hash, cluster):
     """
     Retrieves the cached Ganeti RAPI client for a given hash.  The Hash is
@@ -53,53 +91,54 @@ def get_rapi(hash, cluster):
 
     @return a Ganeti RAPI client.
     """
-    # preventing circular imports
-    from ganeti_webmgr.clusters.models import Cluster
+    return RAPI_REGISTRY.get(hash, cluster)
 
-    rapi_client = get_rapi_client()
 
-    if hash in RAPI_CACHE:
-        return RAPI_CACHE[hash]
-
-    # always look up the instance, even if we were given a Cluster instance
-    # it ensures we are retrieving the latest credentials.  This helps avoid
-    # stale credentials.  Retrieve only the values because we don't actually
-    # need another Cluster instance here.
-    if isinstance(cluster, (Cluster,)):
-        cluster = cluster.id
-    (credentials,) = Cluster.objects.filter(id=cluster) \
-        .values_list('hash', 'hostname', 'port', 'username', 'password')
-    hash, host, port, user, password = credentials
-    user = user or None
-    # decrypt password
-    # XXX django-fields only stores str, convert to None if needed
-    password = Cluster.decrypt_password(password) if password else None
-    password = None if password in ('None', '') else password
-
-    # now that we know hash is fresh, check cache again. The original hash
-    # could have been stale. This avoids constructing a new RAPI that already
-    # exists.
-    if hash in RAPI_CACHE:
-        return RAPI_CACHE[hash]
-
-    # delete any old version of the client that was cached.
-    if cluster in RAPI_CACHE_HASHES:
-        del RAPI_CACHE[RAPI_CACHE_HASHES[cluster]]
+def clear_rapi_cache():
+    """
+    clears the rapi cache
+    """
+    RAPI_REGISTRY.clear()
 
-    # Set connect timeout in settings.py so that you do not learn patience.
-    rapi = rapi_client(host, port, user, password,
-                       timeout=settings.RAPI_CONNECT_TIMEOUT)
-    RAPI_CACHE[hash] = rapi
-    RAPI_CACHE_HASHES[cluster] = hash
-    return rapi
 
+def prewarm_rapi_cache():
+    """
+    Creates the RAPI clients of all clusters ahead of the first request.
+    """
+    return RAPI_REGISTRY.prewarm()
 
-def clear_rapi_cache():
+
+RAPI_EXECUTOR = None
+RAPI_EXECUTOR_LOCK = threading.Lock()
+
+
+def get_rapi_executor():
     """
-    clears the rapi cache
+    Returns the process-wide executor used for concurrent RAPI calls.  The
+    executor is created on first use, sized by ``RAPI_FANOUT_WORKERS``.
+    """
+    global RAPI_EXECUTOR
+
+    with RAPI_EXECUTOR_LOCK:
+        if RAPI_EXECUTOR is None:
+            RAPI_EXECUTOR = RapiExecutor(settings.RAPI_FANOUT_WORKERS)
+    return RAPI_EXECUTOR
+
+
+def rapi_fan_out(calls, timeout=None):
+    """
+    Runs a batch of RAPI calls concurrently on the shared executor.
+
+    @param calls - dict of key -> (client, method, args) tuples.
+    @param timeout - seconds a single call may take, defaults to
+    ``RAPI_FANOUT_TIMEOUT``.
+
+    @return a generator of (key, result, error) tuples, in completion order.
+    See RapiExecutor.map() for details.
     """
-    RAPI_CACHE.clear()
-    RAPI_CACHE_HASHES.clear()
+    if timeout is None:
+        timeout = settings.RAPI_FANOUT_TIMEOUT
+    return get_rapi_executor().map(calls, timeout)
 
 
 def cluster_default_info(cluster, hypervisor=None):
@@ -123,7 +162,9 @@ def cluster_default_info(cluster, hypervisor=None):
     else:
         hv = info['default_hypervisor']
 
-    hvparams = info['hvparams'][hv]
+    # The info may be shared with other objects, see
+    # CachedClusterObject.info; change a copy of the parameters.
+    hvparams = dict(info['hvparams'][hv])
     if hv == 'kvm':
         c = constants.KVM_CHOICES
     elif hv == 'xen-hvm' or hv == 'xen-pvm':
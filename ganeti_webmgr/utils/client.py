@@ -24,16 +24,62 @@ Ganeti RAPI client.
 # No Ganeti-specific modules should be imported. The RAPI client is supposed
 # to be standalone.
 
+from collections import OrderedDict, deque
+import codecs
+from hashlib import sha1
 import logging
+import os
 import simplejson as json
 import socket
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:
+    # Lock files are not available on this platform; limits only apply
+    # within a process.
+    fcntl = None
 
 import requests
+from requests.adapters import HTTPAdapter
 
 
 GANETI_RAPI_PORT = 5080
 GANETI_RAPI_VERSION = 2
 
+# Number of keep-alive connections each client keeps open to its cluster, and
+# how many seconds an unused pool may sit idle before it is torn down.
+GANETI_RAPI_POOL_SIZE = 10
+GANETI_RAPI_POOL_IDLE_TIMEOUT = 60
+
+# Seconds to wait for an answer to WaitForJobChange. The RAPI daemon itself
+# answers after at most 10 seconds when the job does not change.
+GANETI_RAPI_WAIT_TIMEOUT = 30
+
+# How long a request waits for a free slot when the number of concurrent
+# requests to a cluster is limited.
+GANETI_RAPI_CONCURRENCY_TIMEOUT = 30
+
+# Read-only resources whose responses may be cached, and for how many seconds.
+CACHE_OS = "os"
+CACHE_INFO = "info"
+CACHE_FEATURES = "features"
+CACHE_NODES = "nodes"
+CACHE_INSTANCES = "instances"
+GANETI_RAPI_CACHE_TTLS = {
+    CACHE_OS: 300,
+    CACHE_INFO: 30,
+    CACHE_FEATURES: 300,
+    CACHE_NODES: 30,
+    CACHE_INSTANCES: 30,
+}
+# Maximum number of responses cached per client.
+GANETI_RAPI_CACHE_SIZE = 64
+
+# Bytes read from the network at a time when streaming a response.
+GANETI_RAPI_STREAM_CHUNK_SIZE = 64 * 1024
+
 REPLACE_DISK_PRI = "replace_on_primary"
 REPLACE_DISK_SECONDARY = "replace_on_secondary"
 REPLACE_DISK_CHG = "replace_new_secondary"
@@ -71,6 +117,14 @@ JOB_STATUS_ALL = frozenset([
 # Legacy name
 JOB_STATUS_WAITLOCK = JOB_STATUS_WAITING
 
+# Fields of the job query resource making up the same job info as
+# GetJobStatus() returns.
+JOB_QUERY_FIELDS = ["id", "status", "ops", "opstatus", "opresult", "oplog",
+                    "summary", "received_ts", "start_ts", "end_ts"]
+
+# Query result status of a field which has a value
+QUERY_RS_NORMAL = 0
+
 # Internal constants
 _REQ_DATA_VERSION_FIELD = "__version__"
 _INST_NIC_PARAMS = frozenset(["mac", "ip", "mode", "link"])
@@ -122,6 +176,478 @@ class GanetiApiError(ClientError):
         self.code = code
 
 
+class RequestTimeoutError(GanetiApiError):
+    """
+    Raised when the cluster master did not answer in time.
+    """
+
+
+class CircuitOpenError(GanetiApiError):
+    """
+    Raised instead of contacting a cluster which recently was unreachable.
+    """
+
+
+CIRCUIT_CLOSED = "closed"
+CIRCUIT_OPEN = "open"
+CIRCUIT_HALF_OPEN = "half-open"
+
+
+class CircuitBreaker(object):
+    """
+    Tracks whether a cluster master is reachable.
+
+    After ``failures`` consecutive connection failures or timeouts the circuit
+    opens and requests fail immediately for ``reset_timeout`` seconds. Once
+    that cool-down has passed a single probe request is let through (the
+    circuit is half-open). If the probe succeeds the circuit closes again, if
+    it fails the circuit reopens with twice the previous cool-down, up to
+    ``max_reset_timeout`` seconds.
+    """
+
+    def __init__(self, failures=3, reset_timeout=30, max_reset_timeout=600):
+        self.failure_threshold = failures
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened = None
+        self._cooldown = reset_timeout
+        self._probing = False
+
+    @property
+    def state(self):
+        """
+        One of L{CIRCUIT_CLOSED}, L{CIRCUIT_OPEN} or L{CIRCUIT_HALF_OPEN}.
+        """
+
+        with self._lock:
+            if self._opened is None:
+                return CIRCUIT_CLOSED
+            if self._probing or time.time() - self._opened >= self._cooldown:
+                return CIRCUIT_HALF_OPEN
+            return CIRCUIT_OPEN
+
+    @property
+    def retry_in(self):
+        """
+        Seconds until the next probe request is let through, 0 if requests
+        are currently allowed.
+        """
+
+        with self._lock:
+            if self._opened is None:
+                return 0
+            return max(self._opened + self._cooldown - time.time(), 0)
+
+    def allow(self):
+        """
+        Determines whether a request may be sent now. When the cool-down has
+        passed this returns True for exactly one caller, the probe.
+        """
+
+        with self._lock:
+            if self._opened is None:
+                return True
+            if self._probing or time.time() - self._opened < self._cooldown:
+                return False
+            self._probing = True
+            return True
+
+    def record_success(self):
+        """
+        Closes the circuit after a request reached the cluster master.
+        """
+
+        with self._lock:
+            self._failures = 0
+            self._opened = None
+            self._probing = False
+            self._cooldown = self.reset_timeout
+
+    def record_failure(self):
+        """
+        Counts a request which could not reach the cluster master.
+        """
+
+        with self._lock:
+            self._failures += 1
+            if self._probing:
+                # The probe failed, back off further.
+                self._probing = False
+                self._opened = time.time()
+                self._cooldown = min(self._cooldown * 2,
+                                     self.max_reset_timeout)
+            elif (self._opened is None
+                    and self._failures >= self.failure_threshold):
+                self._opened = time.time()
+
+
+class ConcurrencyLimitError(GanetiApiError):
+    """
+    Raised when no request slot for a cluster became free in time.
+    """
+
+
+class ConcurrencyLimiter(object):
+    """
+    Caps the number of requests running against one cluster at the same time.
+
+    Callers waiting for a slot are served in the order they arrived. With a
+    ``lock_dir`` the cap is also shared by every process using the same
+    directory: each slot is a lock file which is held with flock() while a
+    request runs. Processes polling for a lock file are not served in order.
+    """
+
+    # Seconds between attempts to take a lock file slot.
+    poll_interval = 0.05
+
+    def __init__(self, limit, timeout=GANETI_RAPI_CONCURRENCY_TIMEOUT,
+                 lock_dir=None, name="rapi"):
+        self.limit = limit
+        self.timeout = timeout
+
+        if lock_dir and fcntl is not None:
+            self._lock_paths = [
+                os.path.join(lock_dir, "%s.%d.lock" % (name, i))
+                for i in range(limit)]
+        else:
+            self._lock_paths = None
+
+        self._lock = threading.Lock()
+        self._active = 0
+        self._waiters = deque()
+        self._local = threading.local()
+
+    def acquire(self):
+        """
+        Takes a slot, waiting up to ``timeout`` seconds for one to free up.
+
+        :raises ConcurrencyLimitError: If no slot became free in time
+        """
+
+        deadline = time.time() + self.timeout
+        with self._lock:
+            if self._active < self.limit and not self._waiters:
+                self._active += 1
+                event = None
+            else:
+                event = threading.Event()
+                self._waiters.append(event)
+
+        if event is not None:
+            event.wait(self.timeout)
+            with self._lock:
+                # The slot may have been handed over right after the wait
+                # timed out.
+                if not event.is_set():
+                    self._waiters.remove(event)
+                    raise ConcurrencyLimitError(
+                        "Timed out after %ss waiting for a free request slot"
+                        % self.timeout)
+
+        if self._lock_paths is not None:
+            try:
+                self._local.lock_file = self._acquire_lock_file(deadline)
+            except Exception:
+                self._release_slot()
+                raise
+
+    def _acquire_lock_file(self, deadline):
+        """
+        Takes a lock file slot shared with other processes.
+        """
+
+        while True:
+            for path in self._lock_paths:
+                lock_file = open(path, "a")
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except IOError:
+                    lock_file.close()
+                else:
+                    return lock_file
+
+            if time.time() >= deadline:
+                raise ConcurrencyLimitError(
+                    "Timed out after %ss waiting for a free request slot"
+                    % self.timeout)
+            time.sleep(self.poll_interval)
+
+    def release(self):
+        """
+        Frees the slot taken by L{acquire} in this thread.
+        """
+
+        if self._lock_paths is not None:
+            lock_file = self._local.lock_file
+            self._local.lock_file = None
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+            lock_file.close()
+        self._release_slot()
+
+    def _release_slot(self):
+        with self._lock:
+            if self._waiters:
+                # Hand the slot straight to the longest waiting caller.
+                self._waiters.popleft().set()
+            else:
+                self._active -= 1
+
+
+class RequestHook(object):
+    """
+    Base class for objects observing the requests sent by a client.
+
+    Hooks are passed to L{GanetiRapiClient} or appended to its ``hooks``
+    list. Both methods are called in the thread sending the request.
+    """
+
+    def before_request(self, client, method, path):
+        """
+        Called before a request is sent.
+
+        :type client: L{GanetiRapiClient}
+        :param client: the client sending the request
+        :type method: str
+        :param method: HTTP method
+        :type path: str
+        :param path: HTTP URL path, without query arguments
+        """
+
+    def after_request(self, client, method, path, elapsed, size, error):
+        """
+        Called after a request completed or failed.
+
+        :type elapsed: float
+        :param elapsed: seconds until the response, or the error, arrived
+        :type size: int or None
+        :param size: response body size in bytes; None if the request failed
+                     or the body is streamed
+        :type error: L{GanetiApiError} or None
+        :param error: the error raised by the request, if any
+        """
+
+
+COALESCE_CLIENT = "client"
+COALESCE_PROCESS = "process"
+
+
+class _Flight(object):
+    """
+    A single request shared by every caller asking for the same resource.
+    """
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+        self.finished = None
+
+
+class SingleFlight(object):
+    """
+    Coalesces identical calls made at the same time.
+
+    The first caller for a key (the leader) runs the call, callers arriving
+    while it is running wait for its result instead of making their own call.
+    With a ``window`` the result is also handed to callers arriving up to that
+    many seconds after the leader finished. Errors are only shared with
+    callers which were already waiting.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+        self.shared = 0
+
+    def do(self, key, window, func, *args):
+        """
+        Runs ``func(*args)`` unless a call for ``key`` is in flight, or
+        finished less than ``window`` seconds ago, and returns its result.
+        """
+
+        with self._lock:
+            now = time.time()
+            if window:
+                for k, f in self._flights.items():
+                    if f.finished is not None and now - f.finished > window:
+                        del self._flights[k]
+
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+            else:
+                self.shared += 1
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = func(*args)
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                flight.finished = time.time()
+                if ((not window or flight.error is not None)
+                        and self._flights.get(key) is flight):
+                    del self._flights[key]
+            flight.event.set()
+
+        return flight.result
+
+
+# Shared by all clients coalescing with COALESCE_PROCESS.
+PROCESS_SINGLE_FLIGHT = SingleFlight()
+
+
+class ResponseCache(object):
+    """
+    A size bounded LRU cache of raw response bodies.
+
+    Every entry belongs to a resource, such as L{CACHE_OS}, which determines
+    how long the entry is valid for. Resources without a TTL are not cached.
+    """
+
+    def __init__(self, size=GANETI_RAPI_CACHE_SIZE, ttls=None):
+        self.size = size
+        self.ttls = dict(GANETI_RAPI_CACHE_TTLS)
+        if ttls:
+            self.ttls.update(ttls)
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, resource, key):
+        """
+        Returns the cached body for ``key``, or None if it is not cached or
+        has expired.
+        """
+
+        with self._lock:
+            entry = self._entries.pop((resource, key), None)
+            if entry is None or entry[0] < time.time():
+                self.misses += 1
+                return None
+
+            # Re-insert to mark the entry as most recently used.
+            self._entries[resource, key] = entry
+            self.hits += 1
+            return entry[1]
+
+    def set(self, resource, key, body):
+        """
+        Caches ``body`` for as long as the TTL of ``resource`` allows.
+        """
+
+        ttl = self.ttls.get(resource)
+        if not ttl or not self.size:
+            return
+
+        with self._lock:
+            self._entries.pop((resource, key), None)
+            self._entries[resource, key] = (time.time() + ttl, body)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, *resources):
+        """
+        Drops the cached responses of the given resources, or of all
+        resources if none are given.
+        """
+
+        with self._lock:
+            if not resources:
+                self._entries.clear()
+                return
+            for key in self._entries.keys():
+                if key[0] in resources:
+                    del self._entries[key]
+
+    def stats(self):
+        """
+        Returns a dict with the number of ``hits``, ``misses`` and cached
+        ``entries``.
+        """
+
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+            }
+
+
+def iter_json_array(chunks):
+    """
+    Incrementally decodes a JSON array, yielding one element at a time.
+
+    Only the undecoded remainder of the input is kept in memory, so large
+    arrays can be processed without holding the whole document, or the whole
+    decoded list, at once.
+
+    :type chunks: iterable of str
+    :param chunks: UTF-8 encoded pieces of the document
+    :raises ValueError: If the document is not a valid JSON array
+    """
+
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    chunks = iter(chunks)
+    buf = u""
+    pos = 0
+    started = False
+    exhausted = False
+
+    while True:
+        # Skip whitespace and the separators between elements.
+        skip = u" \t\r\n," if started else u" \t\r\n"
+        while pos < len(buf) and buf[pos] in skip:
+            pos += 1
+
+        if pos < len(buf):
+            if not started:
+                if buf[pos] != u"[":
+                    raise ValueError("Expected a JSON array")
+                started = True
+                pos += 1
+                continue
+            if buf[pos] == u"]":
+                return
+
+            # An element is only complete once something follows it, so that
+            # e.g. a number split over two chunks is not decoded early.
+            try:
+                obj, end = decoder.raw_decode(buf, pos)
+            except ValueError:
+                if exhausted:
+                    raise
+            else:
+                if end < len(buf) or exhausted:
+                    yield obj
+                    pos = end
+                    continue
+        elif exhausted:
+            raise ValueError("Unexpected end of JSON array")
+
+        try:
+            chunk = chunks.next()
+        except StopIteration:
+            exhausted = True
+            chunk = ""
+        buf = buf[pos:] + utf8.decode(chunk, exhausted)
+        pos = 0
+
+
 def prepare_query(query):
     """
     Prepare a query object for the RAPI.
@@ -159,7 +685,16 @@ class GanetiRapiClient(object):  # pylint: disable-msg=R0904
     _json_encoder = json.JSONEncoder(sort_keys=True)
 
     def __init__(self, host, port=GANETI_RAPI_PORT, username=None,
-                 password=None, timeout=60, logger=logging):
+                 password=None, timeout=60, logger=logging,
+                 pool_size=GANETI_RAPI_POOL_SIZE,
+                 pool_idle_timeout=GANETI_RAPI_POOL_IDLE_TIMEOUT,
+                 circuit_failures=3, circuit_reset_timeout=30,
+                 circuit_max_reset_timeout=600,
+                 coalesce=COALESCE_CLIENT, coalesce_window=0,
+                 cache_size=GANETI_RAPI_CACHE_SIZE, cache_ttls=None,
+                 max_concurrency=0,
+                 concurrency_timeout=GANETI_RAPI_CONCURRENCY_TIMEOUT,
+                 concurrency_lock_dir=None, hooks=None):
         """
         Initializes this class.
 
@@ -172,6 +707,50 @@ class GanetiRapiClient(object):  # pylint: disable-msg=R0904
         :type password: string
         :param password: the password to connect with
         :param logger: Logging object
+        :type pool_size: int
+        :param pool_size: maximum number of keep-alive connections to keep
+                          open to the cluster master
+        :type pool_idle_timeout: int
+        :param pool_idle_timeout: seconds an unused connection pool is kept
+                                  before it is closed; 0 or None keeps it
+                                  forever
+        :type circuit_failures: int
+        :param circuit_failures: consecutive connection failures after which
+                                 requests fail fast; 0 disables the circuit
+                                 breaker
+        :type circuit_reset_timeout: int
+        :param circuit_reset_timeout: seconds to fail fast before probing the
+                                      cluster master again
+        :type circuit_max_reset_timeout: int
+        :param circuit_max_reset_timeout: upper bound for the cool-down, which
+                                          doubles after each failed probe
+        :type coalesce: str or None
+        :param coalesce: scope in which identical GET requests running at the
+                         same time are sent only once; L{COALESCE_CLIENT} for
+                         this client, L{COALESCE_PROCESS} for all clients in
+                         this process, None to send every request
+        :type coalesce_window: float
+        :param coalesce_window: seconds the response of a coalesced request
+                                is reused after it arrived; 0 only shares
+                                requests still in flight
+        :type cache_size: int
+        :param cache_size: maximum number of read-only responses cached; 0
+                           disables the response cache
+        :type cache_ttls: dict
+        :param cache_ttls: seconds responses of each cached resource, such as
+                           L{CACHE_OS}, are kept; overrides
+                           L{GANETI_RAPI_CACHE_TTLS}
+        :type max_concurrency: int
+        :param max_concurrency: maximum number of requests sent to the cluster
+                                at the same time; 0 for no limit
+        :type concurrency_timeout: float
+        :param concurrency_timeout: seconds a request waits for a free slot
+        :type concurrency_lock_dir: str or None
+        :param concurrency_lock_dir: directory for lock files which share the
+                                     limit with other processes
+        :type hooks: list
+        :param hooks: objects notified of every request sent; see
+                      L{RequestHook}
         """
 
         if username is not None and password is None:
@@ -184,6 +763,32 @@ class GanetiRapiClient(object):  # pylint: disable-msg=R0904
         self.timeout = timeout
         self._logger = logger
 
+        # Optional features only change when Ganeti is upgraded, so they are
+        # remembered along with the software version they were read for.
+        self._features = None
+        self._features_version = None
+        self._software_version = None
+
+        if circuit_failures:
+            self.circuit = CircuitBreaker(circuit_failures,
+                                          circuit_reset_timeout,
+                                          circuit_max_reset_timeout)
+        else:
+            self.circuit = None
+
+        if coalesce == COALESCE_PROCESS:
+            self._single_flight = PROCESS_SINGLE_FLIGHT
+        elif coalesce:
+            self._single_flight = SingleFlight()
+        else:
+            self._single_flight = None
+        self.coalesce_window = coalesce_window
+
+        if cache_size:
+            self._response_cache = ResponseCache(cache_size, cache_ttls)
+        else:
+            self._response_cache = None
+
         try:
             socket.inet_pton(socket.AF_INET6, host)
             address = "[%s]:%s" % (host, port)
@@ -193,8 +798,120 @@ class GanetiRapiClient(object):  # pylint: disable-msg=R0904
             address = "%s:%s" % (host, port)
 
         self._base_url = "https://%s" % address
+        self.address = address
+        self.hooks = list(hooks or ())
 
-    def _SendRequest(self, method, path, query=None, content=None):
+        if max_concurrency:
+            self.limiter = ConcurrencyLimiter(
+                max_concurrency, concurrency_timeout, concurrency_lock_dir,
+                sha1(self._base_url).hexdigest())
+        else:
+            self.limiter = None
+
+        self.pool_size = pool_size
+        self.pool_idle_timeout = pool_idle_timeout
+        self._session = None
+        self._session_used = 0
+        self._session_active = 0
+        self._session_lock = threading.Lock()
+
+    def _CreateSession(self):
+        """
+        Creates a new HTTP session with its own keep-alive connection pool.
+
+        :rtype: requests.Session
+        """
+
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+        session.mount("https://", adapter)
+        return session
+
+    def _AcquireSession(self, limit=True):
+        """
+        Returns the pooled session for this client, creating it if needed.
+
+        A session which sat idle for longer than ``pool_idle_timeout`` is
+        closed and replaced, so that connections the master has long since
+        dropped are not reused. Sessions are never closed while a request is
+        still using them.
+
+        Every call must be paired with a call to L{_ReleaseSession}, passing
+        the same ``limit``. When the number of concurrent requests is limited,
+        this waits for a free slot.
+
+        :type limit: bool
+        :param limit: False for requests which don't count against
+                      ``max_concurrency``, such as long polls
+        :rtype: requests.Session
+        :raises ConcurrencyLimitError: If no slot became free in time
+        """
+
+        if limit and self.limiter is not None:
+            self.limiter.acquire()
+
+        with self._session_lock:
+            now = time.time()
+            if (self._session is not None and self.pool_idle_timeout
+                    and not self._session_active
+                    and now - self._session_used > self.pool_idle_timeout):
+                self._session.close()
+                self._session = None
+
+            if self._session is None:
+                self._session = self._CreateSession()
+
+            self._session_active += 1
+            self._session_used = now
+            return self._session
+
+    def _ReleaseSession(self, limit=True):
+        """
+        Marks a session acquired through L{_AcquireSession} as unused.
+        """
+
+        with self._session_lock:
+            self._session_active -= 1
+            self._session_used = time.time()
+
+        if limit and self.limiter is not None:
+            self.limiter.release()
+
+    def Close(self):
+        """
+        Closes all pooled connections to the cluster master.
+
+        The client remains usable; a new pool is opened on the next request.
+        """
+
+        with self._session_lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+
+    def InvalidateCache(self, *resources):
+        """
+        Forgets cached responses of the given resources, such as
+        L{CACHE_INSTANCES}, or of all resources if none are given.
+        """
+
+        if self._response_cache is not None:
+            self._response_cache.invalidate(*resources)
+
+    def GetCacheStats(self):
+        """
+        Returns hit and miss counters of the response cache.
+
+        :rtype: dict
+        :return: ``hits``, ``misses`` and number of cached ``entries``
+        """
+
+        if self._response_cache is None:
+            return {"hits": 0, "misses": 0, "entries": 0}
+        return self._response_cache.stats()
+
+    def _SendRequest(self, method, path, query=None, content=None,
+                     cache=None, timeout=None, limit=True):
         """
         Sends an HTTP request.
 
@@ -209,6 +926,16 @@ class GanetiRapiClient(object):  # pylint: disable-msg=R0904
         :param query: query arguments to pass to urllib.urlencode
         :type content: str or None
         :param content: HTTP body content
+        :type cache: str or None
+        :param cache: resource the response is cached as, such as
+                      L{CACHE_OS}; only for read-only GET requests
+        :type timeout: float or None
+        :param timeout: seconds to wait for the response instead of the
+                        client's timeout
+        :type limit: bool
+        :param limit: False to send the request without waiting for a slot
+                      of ``max_concurrency``; for long polls, which would
+                      hold their slot for most of ``timeout``
 
         :rtype: object
         :return: JSON-Decoded response
@@ -216,6 +943,47 @@ class GanetiRapiClient(object):  # pylint: disable-msg=R0904
         :raises GanetiApiError: If an invalid response is returned
         """
 
+        url, kwargs = self._PrepareRequest(path, query, content)
+        if timeout is not None:
+            kwargs["timeout"] = timeout
+        query_key = repr(sorted(query.items())) if query else None
+
+        response_cache = self._response_cache if cache else None
+        body = None
+        if response_cache is not None:
+            body = response_cache.get(cache, (path, query_key))
+
+        if body is None:
+            # GETs with a body, such as waiting for job changes, depend on
+            # more than the URL and are never shared.
+            if (method == "get" and content is None
+                    and self._single_flight is not None):
+                key = (self._base_url, self.username, self.password, path,
+                       query_key)
+                body = self._single_flight.do(key, self.coalesce_window,
+                                              self._Fetch, method, url,
+                                              kwargs, limit)
+            else:
+                body = self._Fetch(method, url, kwargs, limit)
+
+            if response_cache is not None:
+                response_cache.set(cache, (path, query_key), body)
+
+        # Every caller decodes the body itself, so callers sharing a
+        # coalesced response never share (and mutate) the same objects.
+        if body:
+            return json.loads(body)
+        else:
+            return None
+
+    def _PrepareRequest(self, path, query=None, content=None):
+        """
+        Builds the URL and the keyword arguments for a request.
+
+        :rtype: tuple
+        :return: URL and keyword arguments for L{requests.Session.request}
+        """
+
         if not path.startswith("/"):
             raise ClientError("Implementation error: Called with bad path %s"
                               % path)
@@ -236,26 +1004,131 @@ class GanetiRapiClient(object):  # pylint: disable-msg=R0904
             prepare_query(query)
             kwargs["params"] = query
 
-        url = self._base_url + path
+        return self._base_url + path, kwargs
+
+    def _Fetch(self, method, url, kwargs, limit=True):
+        """
+        Performs an HTTP request and returns the raw response body.
+
+        :raises GanetiApiError: If the request fails or does not return 200
+        """
+
+        session = self._AcquireSession(limit)
+        try:
+            return self._Open(session, method, url, kwargs).content
+        finally:
+            self._ReleaseSession(limit)
+
+    def _Open(self, session, method, url, kwargs):
+        """
+        Performs an HTTP request on ``session`` and returns the response.
+
+        :raises GanetiApiError: If the request fails or does not return 200
+        """
 
         self._logger.debug("Sending request to %s %s", url, kwargs)
         # print "Sending request to %s %s" % (url, kwargs)
 
+        path = url[len(self._base_url):]
+        self._CallHooks("before_request", method, path)
+        start = time.time()
+        size = None
+        error = None
+
         try:
-            r = requests.request(method, url, **kwargs)
-        except requests.ConnectionError:
-            raise GanetiApiError("Couldn't connect to %s" % self._base_url)
-        except requests.Timeout:
-            raise GanetiApiError("Timed out connecting to %s" %
-                                 self._base_url)
-
-        if r.status_code != requests.codes.ok:
-            raise GanetiApiError(str(r.status_code), code=r.status_code)
-
-        if r.content:
-            return json.loads(r.content)
-        else:
-            return None
+            circuit = self.circuit
+            if circuit is not None and not circuit.allow():
+                raise CircuitOpenError("%s is unreachable, retrying in %ds" %
+                                       (self._base_url, circuit.retry_in))
+
+            # Every outcome is recorded, or a failed half-open probe would
+            # keep the circuit from ever letting requests through again.
+            reached = False
+            try:
+                try:
+                    r = session.request(method, url, **kwargs)
+                # ConnectTimeout is also a ConnectionError; catch timeouts
+                # first so that they are reported as such.
+                except requests.Timeout:
+                    raise RequestTimeoutError("Timed out connecting to %s" %
+                                              self._base_url)
+                except requests.ConnectionError:
+                    raise GanetiApiError("Couldn't connect to %s" %
+                                         self._base_url)
+                reached = True
+            finally:
+                if circuit is not None:
+                    if reached:
+                        circuit.record_success()
+                    else:
+                        circuit.record_failure()
+
+            if r.status_code != requests.codes.ok:
+                r.close()
+                raise GanetiApiError(str(r.status_code), code=r.status_code)
+
+            # Streamed bodies have not been read yet.
+            if not kwargs.get("stream"):
+                size = len(r.content)
+            return r
+
+        except GanetiApiError as e:
+            error = e
+            raise
+
+        finally:
+            self._CallHooks("after_request", method, path,
+                            time.time() - start, size, error)
+
+    def _CallHooks(self, name, *args):
+        """
+        Calls method ``name`` of every hook with this client and ``args``.
+
+        Hooks are only observers; their errors are logged and otherwise
+        ignored.
+        """
+
+        for hook in self.hooks:
+            try:
+                getattr(hook, name)(self, *args)
+            except Exception:
+                self._logger.exception("RAPI hook %r failed", hook)
+
+    def _StreamRequest(self, path, query=None):
+        """
+        Sends a GET request for a JSON array, and yields the elements of the
+        array as they are received and decoded.
+
+        Responses are neither coalesced nor cached; the whole point is not to
+        keep them around.
+
+        :type path: string
+        :param path: HTTP URL path
+        :type query: dict
+        :param query: query arguments
+
+        :raises GanetiApiError: If an invalid response is returned
+        """
+
+        url, kwargs = self._PrepareRequest(path, query)
+        kwargs["stream"] = True
+
+        session = self._AcquireSession()
+        try:
+            r = self._Open(session, "get", url, kwargs)
+            try:
+                chunks = r.iter_content(GANETI_RAPI_STREAM_CHUNK_SIZE)
+                for obj in iter_json_array(chunks):
+                    yield obj
+            except requests.RequestException:
+                raise GanetiApiError("Lost connection to %s" % self._base_url)
+            except ValueError:
+                raise GanetiApiError("Invalid response from %s" %
+                                     self._base_url)
+            finally:
+                r.close()
+        finally:
+            self._ReleaseSession()
 
     def GetVersion(self):
         """
@@ -271,20 +1144,45 @@ class GanetiRapiClient(object):  # pylint: disable-msg=R0904
         """
         Gets the list of optional features supported by RAPI server.
 
+        The list is only retrieved once, and retrieved again after
+        L{SetSoftwareVersion} reports a different Ganeti version.
+
         :rtype: list
         :return: List of optional features
         """
 
-        try:
-            return self._SendRequest("get",
-                                     "/%s/features" % GANETI_RAPI_VERSION)
-        except GanetiApiError as err:
-            # Older RAPI servers don't support this resource. Just return an
-            # empty list.
-            if err.code == requests.codes.not_found:
-                return []
-            else:
-                raise
+        version = self._software_version
+        if self._features is None or self._features_version != version:
+            try:
+                features = self._SendRequest("get", "/%s/features" %
+                                             GANETI_RAPI_VERSION,
+                                             cache=CACHE_FEATURES)
+            except GanetiApiError as err:
+                # Older RAPI servers don't support this resource. Just return
+                # an empty list.
+                if err.code == requests.codes.not_found:
+                    features = []
+                else:
+                    raise
+            self._features = features
+            self._features_version = version
+
+        return list(self._features)
+
+    def SetSoftwareVersion(self, version):
+        """
+        Records the Ganeti version running on the cluster.
+
+        Remembered optional features are forgotten when the version changes.
+        L{GetInfo} calls this with the version it reads.
+
+        :type version: str
+        :param version: the cluster's ``software_version``
+        """
+
+        if version != self._software_version:
+            self._software_version = version
+            self._features = None
 
     def GetOperatingSystems(self):
         """
@@ -294,7 +1192,8 @@ class GanetiRapiClient(object):  # pylint: disable-msg=R0904
         :return: operating systems
         """
 
-        return self._SendRequest("get", "/%s/os" % GANETI_RAPI_VERSION)
+        return self._SendRequest("get", "/%s/os" % GANETI_RAPI_VERSION,
+                                 cache=CACHE_OS)
 
     def GetInfo(self):
         """
@@ -304,8 +1203,11 @@ class GanetiRapiClient(object):  # pylint: disable-msg=R0904
         :return: information about the cluster
         """
 
-        return self._SendRequest("get", "/%s/info" % GANETI_RAPI_VERSION,
-                                 None, None)
+        info = self._SendRequest("get", "/%s/info" % GANETI_RAPI_VERSION,
+                                 None, None, cache=CACHE_INFO)
+        if info:
+            self.SetSoftwareVersion(info.get("software_version"))
+        return info
 
     def RedistributeConfig(self):
         """
@@ -327,6 +1229,7 @@ class GanetiRapiClient(object):  # pylint: disable-msg=R0904
         :return: job id
         """
 
+        self.InvalidateCache(CACHE_INFO)
         return self._SendRequest("put", "/%s/modify" % GANETI_RAPI_VERSION,
                                  content=kwargs)
 
@@ -396,9 +1299,26 @@ class GanetiRapiClient(object):  # pylint: disable-msg=R0904
                                      GANETI_RAPI_VERSION, query={"bulk": 1})
         else:
             instances = self._SendRequest("get", "/%s/instances" %
-                                          GANETI_RAPI_VERSION)
+                                          GANETI_RAPI_VERSION,
+                                          cache=CACHE_INSTANCES)
             return [i["id"] for i in instances]
 
+    def IterInstances(self):
+        """
+        Gets information about all instances on the cluster, one instance at
+        a time.
+
+        This returns the same information as L{GetInstances} with bulk set,
+        but decodes the response while it is received instead of holding all
+        of it in memory.
+
+        :rtype: generator of dict
+        :return: info about each instance
+        """
+
+        return self._StreamRequest("/%s/instances" % GANETI_RAPI_VERSION,
+                                   query={"bulk": 1})
+
     def GetInstance(self, instance):
         """
         Gets information about an instance.
@@ -487,6 +1407,7 @@ class GanetiRapiClient(object):  # pylint: disable-msg=R0904
         kwargs.pop("dry_run", None)
         body.update(kwargs)
 
+        self.InvalidateCache(CACHE_INSTANCES)
         return self._SendRequest("post", "/%s/instances" %
                                  GANETI_RAPI_VERSION, query=query,
                                  content=body)
@@ -502,6 +1423,7 @@ class GanetiRapiClient(object):  # pylint: disable-msg=R0904
         :return: job id
         """
 
+        self.InvalidateCache(CACHE_INSTANCES)
         return self._SendRequest("delete", ("/%s/instances/%s" %
                                             (GANETI_RAPI_VERSION, instance)),
                                  query={"dry-run": dry_run})
@@ -955,6 +1877,7 @@ class GanetiRapiClient(object):  # pylint: disable-msg=R0904
         if name_check is not None:
             body["name_check"] = name_check
 
+        self.InvalidateCache(CACHE_INSTANCES)
         return self._SendRequest("put", ("/%s/instances/%s/rename" %
                                          (GANETI_RAPI_VERSION, instance)),
                                  content=body)
@@ -996,12 +1919,49 @@ class GanetiRapiClient(object):  # pylint: disable-msg=R0904
         return self._SendRequest("get", "/%s/jobs/%s" % (GANETI_RAPI_VERSION,
                                                          job_id))
 
-    def WaitForJobChange(self, job_id, fields, prev_job_info, prev_log_serial):
+    def GetJobsStatus(self, job_ids):
+        """
+        Gets the status of several jobs with a single query.
+
+        :type job_ids: list of int
+        :param job_ids: job ids whose status to query
+
+        :rtype: dict
+        :return: job status, as returned by L{GetJobStatus}, by job id; jobs
+                 no longer known to the cluster are left out
+        """
+
+        if not job_ids:
+            return {}
+
+        qfilter = ["|"] + [["=", "id", int(job_id)] for job_id in job_ids]
+        jobs = self.QueryObjects("job", JOB_QUERY_FIELDS, qfilter)
+
+        return dict((int(job["id"]), job) for job in jobs
+                    if job["id"] is not None and job["status"] is not None)
+
+    def WaitForJobChange(self, job_id, fields, prev_job_info, prev_log_serial,
+                         timeout=GANETI_RAPI_WAIT_TIMEOUT):
         """
         Waits for job changes.
 
+        The cluster answers as soon as the job's ``fields`` differ from
+        ``prev_job_info`` or log entries newer than ``prev_log_serial`` exist,
+        or after about ten seconds without changes.
+
+        The request does not count against ``max_concurrency``: it spends
+        most of its time waiting on the cluster rather than loading it, and
+        watched jobs would otherwise take the slots of page requests.
+
         :type job_id: int
         :param job_id: Job ID for which to wait
+        :type timeout: float
+        :param timeout: seconds to wait for the answer; must be longer than
+                        the cluster's own wait
+
+        :rtype: dict or None
+        :return: ``job_info`` (the values of ``fields``) and ``log_entries``,
+                 or None if the job did not change
         """
 
         body = {
@@ -1011,7 +1971,8 @@ class GanetiRapiClient(object):  # pylint: disable-msg=R0904
         }
 
         return self._SendRequest("get", "/%s/jobs/%s/wait" %
-                                 (GANETI_RAPI_VERSION, job_id), content=body)
+                                 (GANETI_RAPI_VERSION, job_id), content=body,
+                                 timeout=timeout, limit=False)
 
     def CancelJob(self, job_id, dry_run=False):
         """
@@ -1044,9 +2005,24 @@ class GanetiRapiClient(object):  # pylint: disable-msg=R0904
                                      query={"bulk": 1})
         else:
             nodes = self._SendRequest("get", "/%s/nodes" %
-                                      GANETI_RAPI_VERSION)
+                                      GANETI_RAPI_VERSION, cache=CACHE_NODES)
             return [n["id"] for n in nodes]
 
+    def IterNodes(self):
+        """
+        Gets information about all nodes in the cluster, one node at a time.
+
+        This returns the same information as L{GetNodes} with bulk set, but
+        decodes the response while it is received instead of holding all of
+        it in memory.
+
+        :rtype: generator of dict
+        :return: info about each node
+        """
+
+        return self._StreamRequest("/%s/nodes" % GANETI_RAPI_VERSION,
+                                   query={"bulk": 1})
+
     def GetNode(self, node):
         """
         Gets information about a node.
@@ -1645,6 +2621,32 @@ class GanetiRapiClient(object):  # pylint: disable-msg=R0904
                                          (GANETI_RAPI_VERSION, what)),
                                  content=body)
 
+    def QueryObjects(self, what, fields, qfilter=None):
+        """
+        Retrieves information about resources as a list of dicts.
+
+        This is L{Query} with each row of the result turned into a dict keyed
+        by field name. Fields for which Ganeti returned no data (unknown
+        field, offline node, ...) are set to None.
+
+        :type what: string
+        :param what: Resource name, one of L{constants.QR_VIA_RAPI}
+        :type fields: list of string
+        :param fields: Requested fields
+        :type qfilter: None or list
+        :param qfilter: Query filter
+
+        :rtype: list of dict
+        :return: one dict per resource
+        """
+
+        result = self.Query(what, fields, qfilter)
+        names = [field["name"] for field in result["fields"]]
+
+        return [dict((name, value if status == QUERY_RS_NORMAL else None)
+                     for name, (status, value) in zip(names, row))
+                for row in result["data"]]
+
     def QueryFields(self, what, fields=None):
         """
         Retrieves available fields for a resource.
@@ -0,0 +1,149 @@
+# Copyright (c) 2012 Oregon State University Open Source Lab
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.    See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.
+
+
+"""
+Concurrent execution of RAPI calls.
+
+RAPI calls block until the cluster master answers. Pages which talk to
+several clusters, or to one cluster about several objects, would otherwise
+pay the sum of every call's latency. The executor in this module runs a batch
+of calls on a bounded pool of worker threads and hands back results as they
+arrive.
+
+Like the RAPI client itself, this module does not depend on Django. Worker
+threads only talk to the RAPI; callers should keep all database work in their
+own thread.
+"""
+
+import Queue
+import threading
+import time
+
+from .client import GanetiApiError
+
+
+class RapiExecutor(object):
+    """
+    A bounded pool of worker threads for running RAPI calls.
+
+    Worker threads are started on first use and live for the rest of the
+    process. They are daemon threads, so they never keep the process alive.
+    """
+
+    def __init__(self, workers=8):
+        """
+        :type workers: int
+        :param workers: maximum number of calls run at the same time
+        """
+
+        self.workers = workers
+        self._tasks = Queue.Queue()
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def _start(self):
+        """
+        Starts the worker threads if they are not running yet.
+        """
+
+        with self._lock:
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._work,
+                                          name="rapi-executor-%d" %
+                                          len(self._threads))
+                thread.daemon = True
+                thread.start()
+                self._threads.append(thread)
+
+    def _work(self):
+        """
+        Worker thread main loop.
+        """
+
+        while True:
+            key, func, args, kwargs, started, results = self._tasks.get()
+            started[key] = time.time()
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                results.put((key, None, e))
+            else:
+                results.put((key, result, None))
+
+    def map(self, calls, timeout=None):
+        """
+        Runs a batch of RAPI calls concurrently.
+
+        ``calls`` maps a caller-chosen key to a ``(client, method, args)`` or
+        ``(client, method, args, kwargs)`` tuple, where ``method`` is the name
+        of a L{GanetiRapiClient} method. For instance::
+
+            calls = dict((c.id, (c.rapi, "GetInstances", ())) for c in qs)
+
+        This is a generator yielding ``(key, result, error)`` tuples in the
+        order the calls complete. ``error`` is None for successful calls,
+        otherwise it is the exception raised by the call and ``result`` is
+        None.
+
+        :type timeout: float or None
+        :param timeout: seconds a single call may run before it is given up
+                        on. Calls which time out are reported with a
+                        L{GanetiApiError}; their late results are discarded.
+        """
+
+        if not calls:
+            return
+
+        self._start()
+
+        results = Queue.Queue()
+        started = {}
+        outstanding = set()
+        for key, call in calls.items():
+            client, method, args = call[:3]
+            kwargs = call[3] if len(call) > 3 else {}
+            func = getattr(client, method)
+            outstanding.add(key)
+            self._tasks.put((key, func, args, kwargs, started, results))
+
+        while outstanding:
+            wait = None
+            if timeout is not None:
+                # Wake up in time for the first running call to expire, or
+                # poll until one of the queued calls has started.
+                deadlines = [started[key] + timeout for key in outstanding
+                             if key in started]
+                if deadlines:
+                    wait = max(min(deadlines) - time.time(), 0)
+                else:
+                    wait = timeout
+
+            try:
+                key, result, error = results.get(True, wait)
+            except Queue.Empty:
+                now = time.time()
+                for key in list(outstanding):
+                    if key in started and now - started[key] >= timeout:
+                        outstanding.discard(key)
+                        msg = "Timed out after %ss waiting for %s" % (
+                            timeout, calls[key][1])
+                        yield key, None, GanetiApiError(msg)
+            else:
+                if key in outstanding:
+                    outstanding.discard(key)
+                    yield key, result, error
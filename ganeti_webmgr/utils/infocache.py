@@ -0,0 +1,153 @@
+# Copyright (c) 2012 Oregon State University Open Source Lab
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.    See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.
+
+
+"""
+Process-local cache of decoded info.
+
+Hot objects, clusters above all, are loaded by nearly every request, and
+their serialized info decoded each time.  The cache keeps decoded info keyed
+by the object and the time it was cached, so a refresh makes the old entry
+unused rather than stale; unused entries age out.  Objects saving info they
+changed themselves drop its entry; other processes keep using theirs until
+the object is refreshed.
+
+Decoded info is shared by every object loading it, and must not be modified
+in place.  Like the RAPI client, this module does not depend on Django.
+"""
+
+from collections import OrderedDict
+import sys
+import threading
+
+
+def info_size(value):
+    """
+    Estimates the memory used by decoded info, in bytes.
+    """
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        for k, v in value.iteritems():
+            size += info_size(k) + info_size(v)
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            size += info_size(item)
+    return size
+
+
+class InfoCache(object):
+    """
+    A thread-safe LRU cache of decoded info, bounded by the estimated memory
+    used by its entries.
+    """
+
+    def __init__(self, size=0):
+        """
+        :type size: int
+        :param size: maximum bytes used by cached info; 0 disables the cache
+        """
+        self.size = size
+        self._lock = threading.Lock()
+        # key -> (info, bytes)
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self.reset()
+
+    def get(self, key):
+        """
+        Returns the info cached for a key, or None.
+        """
+        if not self.size:
+            return None
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                self.misses += 1
+                return None
+            # Re-insert to mark the entry as most recently used.
+            self._entries[key] = entry
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, info):
+        """
+        Caches the info for a key, dropping the least recently used entries
+        to make room.
+        """
+        if not self.size:
+            return
+        size = info_size(info)
+        if size > self.size:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = (info, size)
+            self._bytes += size
+            while self._bytes > self.size:
+                old_key, (old_info, old_size) = \
+                    self._entries.popitem(last=False)
+                self._bytes -= old_size
+                self.evictions += 1
+
+    def discard(self, key):
+        """
+        Drops the entry of a key, if any.
+        """
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._bytes -= entry[1]
+
+    def clear(self):
+        """
+        Drops all entries.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def reset(self):
+        """
+        Resets the hit, miss and eviction counters.
+        """
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def stats(self):
+        """
+        Returns the cache's size, memory use and counters.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'size': self.size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': float(self.hits) / lookups if lookups else 0.0,
+            }
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
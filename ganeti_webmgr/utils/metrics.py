@@ -0,0 +1,135 @@
+# Copyright (c) 2012 Oregon State University Open Source Lab
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.    See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.
+
+
+"""
+In-memory metrics of RAPI traffic.
+
+L{RapiMetrics} is a request hook for L{GanetiRapiClient} which aggregates
+every request sent by the clients of this process, per cluster and per RAPI
+resource. Like the RAPI client itself, this module does not depend on Django.
+"""
+
+import re
+import threading
+
+from .client import RequestHook, RequestTimeoutError
+
+# Upper bounds, in seconds, of the latency histogram buckets. The last bucket
+# counts everything slower.
+LATENCY_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# Collections whose members are addressed by name or id in RAPI paths.
+_COLLECTIONS = frozenset(["instances", "nodes", "groups", "jobs", "networks"])
+
+_VERSION = re.compile(r"^\d+$")
+
+
+def normalize_path(path):
+    """
+    Replaces object names in a RAPI path with a placeholder, so that requests
+    for different objects are counted together.
+
+        >>> normalize_path("/2/instances/vm1.example.org/tags")
+        '/2/instances/[name]/tags'
+    """
+
+    parts = path.split("/")
+    for i in range(1, len(parts)):
+        if parts[i - 1] in _COLLECTIONS and parts[i]:
+            parts[i] = "[name]"
+    return "/".join(parts)
+
+
+class RapiMetrics(RequestHook):
+    """
+    Aggregates call count, errors, timeouts, response bytes and a latency
+    histogram for each cluster and RAPI resource.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def after_request(self, client, method, path, elapsed, size, error):
+        key = (client.address, "%s %s" % (method.upper(),
+                                          normalize_path(path)))
+
+        bucket = len(LATENCY_BUCKETS)
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if elapsed <= bound:
+                bucket = i
+                break
+
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = {
+                    "calls": 0,
+                    "errors": 0,
+                    "timeouts": 0,
+                    "bytes": 0,
+                    "time": 0.0,
+                    "max_time": 0.0,
+                    "histogram": [0] * (len(LATENCY_BUCKETS) + 1),
+                }
+
+            stats["calls"] += 1
+            stats["time"] += elapsed
+            stats["max_time"] = max(stats["max_time"], elapsed)
+            stats["histogram"][bucket] += 1
+            if size:
+                stats["bytes"] += size
+            if error is not None:
+                stats["errors"] += 1
+                if isinstance(error, RequestTimeoutError):
+                    stats["timeouts"] += 1
+
+    def snapshot(self):
+        """
+        Returns the collected metrics as a list of dicts, one per cluster and
+        resource, sorted by the total time spent.
+
+        Each dict holds the ``cluster`` address, the ``request`` (HTTP method
+        and normalized path), the ``calls``, ``errors`` and ``timeouts``
+        counts, the response ``bytes``, the total and maximum ``time`` in
+        seconds, and the ``histogram`` of call counts per latency bucket.
+        """
+
+        with self._lock:
+            rows = []
+            for (cluster, request), stats in self._stats.items():
+                row = dict(stats, cluster=cluster, request=request)
+                row["histogram"] = list(stats["histogram"])
+                row["mean_time"] = stats["time"] / stats["calls"]
+                rows.append(row)
+
+        rows.sort(key=lambda row: row["time"], reverse=True)
+        return rows
+
+    def reset(self):
+        """
+        Forgets all collected metrics.
+        """
+
+        with self._lock:
+            self._stats.clear()
+
+
+# Collects the requests of every client created by get_rapi() when
+# settings.RAPI_METRICS is enabled.
+RAPI_METRICS = RapiMetrics()
@@ -16,7 +16,9 @@
 # USA.
 
 from .call_proxy import CallProxy
-from .rapi_proxy import RapiProxy, XenRapiProxy, XenHvmRapiProxy
+from .rapi_proxy import (RapiProxy, XenRapiProxy, XenHvmRapiProxy,
+                         query_response)
 from .response_map import ResponseMap
 
-__all__ = ['RapiProxy', 'XenRapiProxy', 'CallProxy', 'ResponseMap']
+__all__ = ['RapiProxy', 'XenRapiProxy', 'CallProxy', 'ResponseMap',
+           'query_response']
@@ -21,6 +21,18 @@ from . import CallProxy
 from .constants import *
 
 
+def query_response(fields, objects):
+    """
+    Builds a response for GanetiRapiClient.Query() holding the given fields
+    of each object (dict) in ``objects``.
+    """
+    return {
+        'fields': [{'name': field} for field in fields],
+        'data': [[[client.QUERY_RS_NORMAL, obj.get(field)] for field in fields]
+                 for obj in objects],
+    }
+
+
 class RapiProxy(client.GanetiRapiClient):
     """
     Proxy class for testing RAPI interface without a cluster present.
@@ -37,7 +49,9 @@ class RapiProxy(client.GanetiRapiClient):
         instance.__init__(*args, **kwargs)
         CallProxy.patch(instance, 'GetInstances', False, INSTANCES)
         CallProxy.patch(instance, 'GetInstance', False, INSTANCE)
+        CallProxy.patch(instance, 'IterInstances', False, INSTANCES_BULK)
         CallProxy.patch(instance, 'GetNodes', False, NODES_MAP)
+        CallProxy.patch(instance, 'IterNodes', False, NODES_BULK)
         CallProxy.patch(instance, 'GetNode', False, NODE)
         CallProxy.patch(instance, 'GetInfo', False, INFO)
         CallProxy.patch(instance, 'GetOperatingSystems', False,
@@ -62,6 +76,12 @@ class RapiProxy(client.GanetiRapiClient):
 
         return instance
 
+    def GetJobsStatus(self, job_ids):
+        """
+        Answers each job with the response of the patched GetJobStatus.
+        """
+        return dict((job_id, self.GetJobStatus(job_id)) for job_id in job_ids)
+
     def fail(self, *args, **kwargs):
         """
         Raise the error set on this object.
@@ -0,0 +1,200 @@
+# Copyright (c) 2012 Oregon State University Open Source Lab
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.    See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.
+
+
+"""
+Registry of RAPI clients, one per cluster.
+
+Creating a client requires reading the cluster's credentials from the
+database and decrypting its password, so clients are kept around and shared
+by every thread of the process. Clients are looked up by the cluster's hash,
+which changes whenever the credentials change.
+"""
+
+from collections import OrderedDict
+import threading
+
+
+class RapiRegistry(object):
+    """
+    A thread-safe, size bounded LRU cache of RAPI clients.
+
+    ``factory`` is called with the host, port, username and password of a
+    cluster and returns a new client for it.
+    """
+
+    def __init__(self, factory, size=0):
+        """
+        :type size: int
+        :param size: maximum number of clients kept; 0 for no limit
+        """
+
+        self.factory = factory
+        self.size = size
+        self._lock = threading.Lock()
+        # hash -> (cluster id, client)
+        self._clients = OrderedDict()
+        # cluster id -> hash
+        self._hashes = {}
+
+    def get(self, hash, cluster):
+        """
+        Returns the client for the cluster with the given hash, creating it
+        if needed.
+
+        If a hash does not correspond to any cluster then Cluster.DoesNotExist
+        will be raised.
+
+        @param cluster - either a cluster object, or ID of object.  This is
+        used for resolving the cluster if the client is not already found.
+        The id is used rather than the hash, because the hash is mutable.
+        """
+
+        with self._lock:
+            entry = self._clients.pop(hash, None)
+            if entry is not None:
+                # Re-insert to mark the client as most recently used.
+                self._clients[hash] = entry
+                return entry[1]
+
+        # always look up the credentials, even if we were given a Cluster
+        # instance.  It ensures we are retrieving the latest credentials.
+        cluster_id = getattr(cluster, 'id', cluster)
+        credentials = list(self._credentials(id=cluster_id))
+        if not credentials:
+            # preventing circular imports
+            from ganeti_webmgr.clusters.models import Cluster
+            raise Cluster.DoesNotExist()
+
+        return self._add(*credentials[0])
+
+    def _credentials(self, **filters):
+        """
+        Yields the id, hash and decrypted connection credentials of the
+        matching clusters.
+        """
+
+        # preventing circular imports
+        from ganeti_webmgr.clusters.models import Cluster
+
+        rows = Cluster.objects.filter(**filters).values_list(
+            'id', 'hash', 'hostname', 'port', 'username', 'password')
+        for id, hash, host, port, user, password in rows:
+            user = user or None
+            # XXX django-fields only stores str, convert to None if needed
+            password = Cluster.decrypt_password(password) if password else None
+            password = None if password in ('None', '') else password
+            yield id, hash, (host, port, user, password)
+
+    def _add(self, cluster_id, hash, credentials):
+        """
+        Creates and registers the client for a cluster, unless another thread
+        registered it first.
+        """
+
+        # The hash is fresh now, so the client may already exist.
+        with self._lock:
+            entry = self._clients.get(hash)
+            if entry is not None:
+                return entry[1]
+
+        client = self.factory(*credentials)
+
+        stale = []
+        with self._lock:
+            entry = self._clients.get(hash)
+            if entry is not None:
+                stale.append(client)
+                client = entry[1]
+            else:
+                # Replace any client for the cluster's old credentials.
+                old = self._hashes.get(cluster_id)
+                if old is not None and old in self._clients:
+                    stale.append(self._clients.pop(old)[1])
+
+                self._clients[hash] = (cluster_id, client)
+                self._hashes[cluster_id] = hash
+
+                while self.size and len(self._clients) > self.size:
+                    old, (old_id, old_client) = \
+                        self._clients.popitem(last=False)
+                    if self._hashes.get(old_id) == old:
+                        del self._hashes[old_id]
+                    stale.append(old_client)
+
+        # Closing connections may block; don't hold the lock meanwhile.
+        for old_client in stale:
+            old_client.Close()
+        return client
+
+    def invalidate(self, cluster_id, hash=None):
+        """
+        Drops and closes the client of a cluster.
+
+        @param hash - if given, the client is only dropped if the cluster's
+        credentials no longer match this hash.
+        """
+
+        with self._lock:
+            old = self._hashes.get(cluster_id)
+            if old is None or old == hash:
+                return
+            del self._hashes[cluster_id]
+            entry = self._clients.pop(old, None)
+
+        if entry is not None:
+            entry[1].Close()
+
+    def clear(self):
+        """
+        Drops and closes all clients.
+        """
+
+        with self._lock:
+            stale = [client for id, client in self._clients.values()]
+            self._clients.clear()
+            self._hashes.clear()
+
+        for client in stale:
+            client.Close()
+
+    def prewarm(self):
+        """
+        Creates the clients of all clusters, so that requests don't have to.
+
+        Clients are only created; no requests are sent to the clusters.
+        """
+
+        count = 0
+        for id, hash, credentials in self._credentials():
+            self._add(id, hash, credentials)
+            count += 1
+        return count
+
+    def clients(self):
+        """
+        Returns the clients currently kept, least recently used first.
+        """
+
+        with self._lock:
+            return [client for id, client in self._clients.values()]
+
+    def __len__(self):
+        return len(self._clients)
+
+    def __contains__(self, hash):
+        return hash in self._clients
@@ -0,0 +1,89 @@
+# Copyright (c) 2012 Oregon State University Open Source Lab
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.    See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.
+
+
+"""
+Storage format of the info cached in ``serialized_info``.
+
+Info is stored as compact JSON behind a format tag, zlib compressed when that
+makes it smaller.  Compressed data is base64 encoded, since the column is
+text.  Values without a tag are pickles, as written by earlier versions; they
+are still read, and rewritten by the reserialize management command.
+"""
+
+import base64
+import cPickle
+import zlib
+
+from django.conf import settings
+from django.utils import simplejson as json
+
+# Format tags.  Bump the version when the format of a tag changes.
+JSON = 'j1:'
+ZLIB = 'z1:'
+
+# Names of the formats, as reported by info_format().
+FORMATS = ('pickle', 'json', 'zlib')
+
+# JSON shorter than this is not worth compressing.
+COMPRESS_MIN = 256
+
+
+def dumps_info(info, compress=None):
+    """
+    Serializes info retrieved from a cluster.
+
+    @param compress - whether to compress, defaults to
+    settings.SERIALIZED_INFO_COMPRESS
+    """
+    if compress is None:
+        compress = settings.SERIALIZED_INFO_COMPRESS
+    try:
+        text = json.dumps(info, separators=(',', ':'))
+    except (TypeError, ValueError):
+        # RAPI info always is JSON, but keep anything else working.
+        return cPickle.dumps(info)
+
+    if compress and len(text) >= COMPRESS_MIN:
+        packed = ZLIB + base64.b64encode(zlib.compress(text))
+        if len(packed) < len(text) + len(JSON):
+            return packed
+    return JSON + text
+
+
+def loads_info(text):
+    """
+    Deserializes info stored by dumps_info(), or pickled by earlier versions.
+    """
+    tag = text[:len(JSON)]
+    if tag == JSON:
+        return json.loads(text[len(JSON):])
+    if tag == ZLIB:
+        return json.loads(zlib.decompress(base64.b64decode(text[len(ZLIB):])))
+    return cPickle.loads(str(text))
+
+
+def info_format(text):
+    """
+    Returns the name of the format of serialized info, one of FORMATS.
+    """
+    tag = text[:len(JSON)]
+    if tag == JSON:
+        return 'json'
+    if tag == ZLIB:
+        return 'zlib'
+    return 'pickle'
@@ -1,6 +1,12 @@
+from .client import *
+from .fanout import *
 from .fields import *
 from .ganeti_errors import *
+from .infocache import *
+from .metrics import *
 from .models import *
+from .registry import *
+from .serialization import *
 from .ssh_keys import *
 from .utilities import *
 from .views import *
@@ -0,0 +1,698 @@
+# Copyright (C) 2010 Oregon State University et al.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301,
+# USA.
+
+import shutil
+import simplejson as json
+import tempfile
+import threading
+import time
+
+import requests
+
+from django.test import SimpleTestCase
+
+from ..client import (GanetiRapiClient, CircuitBreaker, CircuitOpenError,
+                      ConcurrencyLimiter, ConcurrencyLimitError,
+                      GanetiApiError, ResponseCache, SingleFlight,
+                      CACHE_INSTANCES, CACHE_OS, CIRCUIT_CLOSED, CIRCUIT_OPEN,
+                      CIRCUIT_HALF_OPEN, COALESCE_PROCESS, iter_json_array)
+from ..proxy import CallProxy
+
+__all__ = (
+    "TestCircuitBreaker",
+    "TestConcurrencyLimiter",
+    "TestClientFeatures",
+    "TestClientQuery",
+    "TestClientSession",
+    "TestResponseCache",
+    "TestSingleFlight",
+    "TestStreaming",
+)
+
+
+class TestClientSession(SimpleTestCase):
+    """
+    Tests for the pooled HTTP session kept by each GanetiRapiClient.
+    """
+
+    def setUp(self):
+        self.client = GanetiRapiClient("ganeti.example.test",
+                                       pool_idle_timeout=60)
+
+    def tearDown(self):
+        self.client.Close()
+
+    def test_session_reused(self):
+        session = self.client._AcquireSession()
+        self.client._ReleaseSession()
+        self.assertTrue(session is self.client._AcquireSession())
+        self.client._ReleaseSession()
+
+    def test_pool_size(self):
+        client = GanetiRapiClient("ganeti.example.test", pool_size=3)
+        session = client._AcquireSession()
+        client._ReleaseSession()
+        adapter = session.get_adapter("https://ganeti.example.test:5080/")
+        self.assertEqual(3, adapter._pool_maxsize)
+
+    def test_idle_session_evicted(self):
+        session = self.client._AcquireSession()
+        self.client._ReleaseSession()
+        self.client._session_used -= 61
+        self.assertFalse(session is self.client._AcquireSession())
+        self.client._ReleaseSession()
+
+    def test_active_session_not_evicted(self):
+        """
+        A session in use by another thread is never closed, no matter how
+        long the request has been running.
+        """
+        session = self.client._AcquireSession()
+        self.client._session_used -= 61
+        self.assertTrue(session is self.client._AcquireSession())
+        self.client._ReleaseSession()
+        self.client._ReleaseSession()
+
+    def test_close(self):
+        session = self.client._AcquireSession()
+        self.client._ReleaseSession()
+        self.client.Close()
+        self.assertFalse(session is self.client._AcquireSession())
+        self.client._ReleaseSession()
+
+
+class TestClientQuery(SimpleTestCase):
+
+    def test_query_objects(self):
+        """
+        Query rows are turned into dicts, fields without data become None.
+        """
+        client = GanetiRapiClient("ganeti.example.test")
+        response = {
+            "fields": [{"name": "name"}, {"name": "mfree"}],
+            "data": [
+                [[0, "node1.example.test"], [0, 1024]],
+                [[0, "node2.example.test"], [4, None]],
+            ],
+        }
+        CallProxy.patch(client, "Query", False, response)
+
+        self.assertEqual([
+            {"name": "node1.example.test", "mfree": 1024},
+            {"name": "node2.example.test", "mfree": None},
+        ], client.QueryObjects("node", ["name", "mfree"]))
+        client.Query.assertCalled(self, "node", ["name", "mfree"], None)
+
+    def test_get_jobs_status(self):
+        """
+        Jobs are queried by id in one request and returned by id.  Archived
+        jobs are left out.
+        """
+        client = GanetiRapiClient("ganeti.example.test")
+        response = {
+            "fields": [{"name": "id"}, {"name": "status"}],
+            "data": [
+                [[0, 3], [0, "running"]],
+                [[0, 4], [0, "success"]],
+                [[0, 5], [2, None]],
+            ],
+        }
+        CallProxy.patch(client, "Query", False, response)
+
+        jobs = client.GetJobsStatus([3, "4", 5])
+        self.assertEqual([3, 4], sorted(jobs))
+        self.assertEqual("success", jobs[4]["status"])
+        qfilter = client.Query.calls[0][0][2]
+        self.assertEqual(["|", ["=", "id", 3], ["=", "id", 4],
+                          ["=", "id", 5]], qfilter)
+
+        client.Query.reset()
+        self.assertEqual({}, client.GetJobsStatus([]))
+        client.Query.assertNotCalled(self)
+
+
+class TestClientFeatures(SimpleTestCase):
+
+    def setUp(self):
+        self.client = GanetiRapiClient("ganeti.example.test")
+        CallProxy.patch(self.client, "_SendRequest", False,
+                        ["instance-create-reqv1"])
+
+    def test_features_memoized(self):
+        self.assertEqual(["instance-create-reqv1"],
+                         self.client.GetFeatures())
+        self.assertEqual(["instance-create-reqv1"],
+                         self.client.GetFeatures())
+        self.assertEqual(1, len(self.client._SendRequest.calls))
+
+    def test_version_change_invalidates(self):
+        self.client.SetSoftwareVersion("2.4.2")
+        self.client.GetFeatures()
+        self.client.SetSoftwareVersion("2.4.2")
+        self.client.GetFeatures()
+        self.assertEqual(1, len(self.client._SendRequest.calls))
+
+        self.client.SetSoftwareVersion("2.5.0")
+        self.client.GetFeatures()
+        self.assertEqual(2, len(self.client._SendRequest.calls))
+
+    def test_get_info_sets_version(self):
+        self.client._SendRequest.response = {"software_version": "2.6.0"}
+        self.client.GetInfo()
+        self.assertEqual("2.6.0", self.client._software_version)
+
+
+class UnreachableSession(object):
+    """
+    Stand-in for a requests session whose cluster master is down.
+    """
+
+    def __init__(self):
+        self.requests = 0
+
+    def request(self, *args, **kwargs):
+        self.requests += 1
+        raise requests.ConnectionError()
+
+
+class TestCircuitBreaker(SimpleTestCase):
+
+    def setUp(self):
+        self.circuit = CircuitBreaker(failures=2, reset_timeout=30,
+                                      max_reset_timeout=100)
+
+    def expire(self):
+        """
+        Pretends the current cool-down has passed.
+        """
+        self.circuit._opened = time.time() - self.circuit._cooldown
+
+    def test_opens_after_failures(self):
+        self.circuit.record_failure()
+        self.assertEqual(CIRCUIT_CLOSED, self.circuit.state)
+        self.assertTrue(self.circuit.allow())
+
+        self.circuit.record_failure()
+        self.assertEqual(CIRCUIT_OPEN, self.circuit.state)
+        self.assertFalse(self.circuit.allow())
+
+    def test_success_resets_count(self):
+        self.circuit.record_failure()
+        self.circuit.record_success()
+        self.circuit.record_failure()
+        self.assertEqual(CIRCUIT_CLOSED, self.circuit.state)
+
+    def test_single_probe(self):
+        self.circuit.record_failure()
+        self.circuit.record_failure()
+        self.expire()
+
+        self.assertEqual(CIRCUIT_HALF_OPEN, self.circuit.state)
+        self.assertTrue(self.circuit.allow())
+        self.assertFalse(self.circuit.allow())
+
+        self.circuit.record_success()
+        self.assertEqual(CIRCUIT_CLOSED, self.circuit.state)
+        self.assertTrue(self.circuit.allow())
+
+    def test_failed_probe_backs_off(self):
+        self.circuit.record_failure()
+        self.circuit.record_failure()
+
+        for cooldown in (60, 100, 100):
+            self.expire()
+            self.assertTrue(self.circuit.allow())
+            self.circuit.record_failure()
+            self.assertEqual(CIRCUIT_OPEN, self.circuit.state)
+            self.assertEqual(cooldown, self.circuit._cooldown)
+
+        self.expire()
+        self.assertTrue(self.circuit.allow())
+        self.circuit.record_success()
+        self.assertEqual(30, self.circuit._cooldown)
+
+    def test_client_fails_fast(self):
+        """
+        Once the circuit is open the cluster is not contacted at all.
+        """
+        client = GanetiRapiClient("ganeti.example.test", circuit_failures=2)
+        session = UnreachableSession()
+        client._AcquireSession = lambda limit=True: session
+
+        for i in range(2):
+            self.assertRaises(GanetiApiError, client.GetVersion)
+        self.assertEqual(2, session.requests)
+
+        self.assertRaises(CircuitOpenError, client.GetVersion)
+        self.assertEqual(2, session.requests)
+
+    def test_probe_unexpected_error(self):
+        """
+        A probe failing with any error reopens the circuit instead of
+        leaving it waiting on the probe forever.
+        """
+        client = GanetiRapiClient("ganeti.example.test", circuit_failures=2)
+        session = UnreachableSession()
+        client._AcquireSession = lambda limit=True: session
+        for i in range(2):
+            self.assertRaises(GanetiApiError, client.GetVersion)
+
+        circuit = client.circuit
+        circuit._opened = time.time() - circuit._cooldown
+        session.request = lambda *args, **kwargs: 1 / 0
+        self.assertRaises(ZeroDivisionError, client.GetVersion)
+        self.assertEqual(CIRCUIT_OPEN, circuit.state)
+
+        circuit._opened = time.time() - circuit._cooldown
+        self.assertTrue(circuit.allow())
+
+    def test_client_disabled(self):
+        client = GanetiRapiClient("ganeti.example.test", circuit_failures=0)
+        self.assertTrue(client.circuit is None)
+
+
+class SlowResponse(object):
+    status_code = requests.codes.ok
+    content = '{"name": "instance1.example.test"}'
+
+
+class SlowSession(object):
+    """
+    Stand-in for a requests session which answers once it is released.
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.release = threading.Event()
+
+    def request(self, *args, **kwargs):
+        self.requests += 1
+        self.release.wait()
+        return SlowResponse()
+
+
+class TestSingleFlight(SimpleTestCase):
+
+    def run_concurrently(self, flight, count, func, window=0):
+        """
+        Calls ``func`` through ``flight`` from ``count`` threads, and returns
+        the results once every thread but the leader is waiting.
+        """
+        results = []
+
+        def call():
+            results.append(flight.do("key", window, func))
+
+        threads = [threading.Thread(target=call) for i in range(count)]
+        for thread in threads:
+            thread.start()
+        while flight.shared < count - 1:
+            time.sleep(0.001)
+        return threads, results
+
+    def test_coalesce(self):
+        flight = SingleFlight()
+        release = threading.Event()
+        calls = []
+
+        def func():
+            calls.append(1)
+            release.wait()
+            return "result"
+
+        threads, results = self.run_concurrently(flight, 5, func)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(1, len(calls))
+        self.assertEqual(["result"] * 5, results)
+        self.assertEqual({}, flight._flights)
+
+    def test_error_shared(self):
+        flight = SingleFlight()
+        release = threading.Event()
+        errors = []
+
+        def func():
+            release.wait()
+            raise GanetiApiError("Cluster is down", 503)
+
+        def call():
+            try:
+                flight.do("key", 0, func)
+            except GanetiApiError as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=call) for i in range(3)]
+        for thread in threads:
+            thread.start()
+        while flight.shared < 2:
+            time.sleep(0.001)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(3, len(errors))
+        self.assertEqual({}, flight._flights)
+
+    def test_window(self):
+        flight = SingleFlight()
+        calls = []
+
+        def func():
+            calls.append(1)
+            return len(calls)
+
+        self.assertEqual(1, flight.do("key", 60, func))
+        self.assertEqual(1, flight.do("key", 60, func))
+        self.assertEqual(1, len(calls))
+
+        flight._flights["key"].finished -= 61
+        self.assertEqual(2, flight.do("key", 60, func))
+
+        # without a window, only calls in flight are shared
+        self.assertEqual(3, flight.do("other", 0, func))
+        self.assertEqual(4, flight.do("other", 0, func))
+
+    def test_client_get(self):
+        """
+        Concurrent identical GETs reach the cluster once, and each caller
+        gets its own decoded response.
+        """
+        client = GanetiRapiClient("ganeti.example.test")
+        session = SlowSession()
+        client._AcquireSession = lambda limit=True: session
+
+        flight = client._single_flight
+        results = []
+
+        def call():
+            results.append(client.GetInstance("instance1.example.test"))
+
+        threads = [threading.Thread(target=call) for i in range(3)]
+        for thread in threads:
+            thread.start()
+        while flight.shared < 2:
+            time.sleep(0.001)
+        session.release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(1, session.requests)
+        self.assertEqual([{"name": "instance1.example.test"}] * 3, results)
+        self.assertFalse(results[0] is results[1])
+
+    def test_client_scope(self):
+        client = GanetiRapiClient("ganeti.example.test")
+        client2 = GanetiRapiClient("ganeti.example.test")
+        self.assertFalse(client._single_flight is client2._single_flight)
+
+        client = GanetiRapiClient("ganeti.example.test",
+                                  coalesce=COALESCE_PROCESS)
+        client2 = GanetiRapiClient("ganeti.example.test",
+                                   coalesce=COALESCE_PROCESS)
+        self.assertTrue(client._single_flight is client2._single_flight)
+
+        client = GanetiRapiClient("ganeti.example.test", coalesce=None)
+        self.assertTrue(client._single_flight is None)
+
+
+class FakeResponse(object):
+    status_code = requests.codes.ok
+
+    def __init__(self, content):
+        self.content = content
+
+
+class CountingSession(object):
+    """
+    Stand-in for a requests session which records the requested URLs.
+    """
+
+    def __init__(self):
+        self.urls = []
+
+    def request(self, method, url, **kwargs):
+        self.urls.append(url)
+        if url.endswith("/instances"):
+            return FakeResponse('[{"id": "instance1.example.test"}]')
+        return FakeResponse('["image+default"]')
+
+
+class TestResponseCache(SimpleTestCase):
+
+    def test_hit_miss(self):
+        cache = ResponseCache(ttls={CACHE_OS: 60})
+        self.assertEqual(None, cache.get(CACHE_OS, "key"))
+        cache.set(CACHE_OS, "key", "body")
+        self.assertEqual("body", cache.get(CACHE_OS, "key"))
+        self.assertEqual({"hits": 1, "misses": 1, "entries": 1},
+                         cache.stats())
+
+    def test_expiry(self):
+        cache = ResponseCache(ttls={CACHE_OS: 60, CACHE_INSTANCES: 0})
+        cache.set(CACHE_OS, "key", "body")
+        cache.set(CACHE_INSTANCES, "key", "body")
+        self.assertEqual(1, cache.stats()["entries"])
+
+        expires, body = cache._entries[CACHE_OS, "key"]
+        cache._entries[CACHE_OS, "key"] = (time.time() - 1, body)
+        self.assertEqual(None, cache.get(CACHE_OS, "key"))
+        self.assertEqual(0, cache.stats()["entries"])
+
+    def test_lru(self):
+        cache = ResponseCache(size=2)
+        cache.set(CACHE_OS, 1, "one")
+        cache.set(CACHE_OS, 2, "two")
+        cache.get(CACHE_OS, 1)
+        cache.set(CACHE_OS, 3, "three")
+
+        self.assertEqual("one", cache.get(CACHE_OS, 1))
+        self.assertEqual(None, cache.get(CACHE_OS, 2))
+        self.assertEqual("three", cache.get(CACHE_OS, 3))
+
+    def test_invalidate(self):
+        cache = ResponseCache()
+        cache.set(CACHE_OS, "key", "body")
+        cache.set(CACHE_INSTANCES, "key", "body")
+
+        cache.invalidate(CACHE_INSTANCES)
+        self.assertEqual(None, cache.get(CACHE_INSTANCES, "key"))
+        self.assertEqual("body", cache.get(CACHE_OS, "key"))
+
+        cache.invalidate()
+        self.assertEqual(0, cache.stats()["entries"])
+
+    def test_client(self):
+        """
+        Read-only resources are fetched once, write calls invalidate them.
+        """
+        client = GanetiRapiClient("ganeti.example.test")
+        session = CountingSession()
+        client._AcquireSession = lambda limit=True: session
+
+        self.assertEqual(["image+default"], client.GetOperatingSystems())
+        self.assertEqual(["image+default"], client.GetOperatingSystems())
+        self.assertEqual(1, len(session.urls))
+
+        client.GetInstances()
+        client.GetInstances()
+        self.assertEqual(2, len(session.urls))
+
+        client.DeleteInstance("instance1.example.test")
+        self.assertEqual(["instance1.example.test"], client.GetInstances())
+        client.GetOperatingSystems()
+        self.assertEqual(4, len(session.urls))
+
+        # bulk listings are never cached
+        client.GetInstances(bulk=True)
+        client.GetInstances(bulk=True)
+        self.assertEqual(6, len(session.urls))
+
+        stats = client.GetCacheStats()
+        self.assertEqual(3, stats["hits"])
+        self.assertEqual(3, stats["misses"])
+
+    def test_client_disabled(self):
+        client = GanetiRapiClient("ganeti.example.test", cache_size=0)
+        session = CountingSession()
+        client._AcquireSession = lambda limit=True: session
+
+        client.GetOperatingSystems()
+        client.GetOperatingSystems()
+        self.assertEqual(2, len(session.urls))
+
+
+class StreamedResponse(object):
+    status_code = requests.codes.ok
+
+    def __init__(self, content):
+        self.content = content
+        self.closed = False
+
+    def iter_content(self, chunk_size):
+        for i in range(0, len(self.content), 7):
+            yield self.content[i:i + 7]
+
+    def close(self):
+        self.closed = True
+
+
+class StreamingSession(object):
+
+    def __init__(self, content):
+        self.response = StreamedResponse(content)
+        self.kwargs = None
+
+    def request(self, method, url, **kwargs):
+        self.kwargs = kwargs
+        return self.response
+
+
+class TestStreaming(SimpleTestCase):
+
+    def test_iter_json_array(self):
+        doc = json.dumps([{"name": u"instance\u00e9%d" % i, "disk": [i, 1.5]}
+                          for i in range(20)] + [12345, None],
+                         ensure_ascii=False).encode("utf-8")
+        expected = json.loads(doc)
+        for size in (1, 2, 5, 64, len(doc)):
+            chunks = [doc[i:i + size] for i in range(0, len(doc), size)]
+            self.assertEqual(expected, list(iter_json_array(chunks)))
+
+        self.assertEqual([], list(iter_json_array([" [ ", "] "])))
+
+    def test_iter_json_array_invalid(self):
+        for doc in ('{"name": 1}', '[1, 2', '[{"name"', ''):
+            self.assertRaises(ValueError, list, iter_json_array([doc]))
+
+    def test_iter_instances(self):
+        client = GanetiRapiClient("ganeti.example.test")
+        instances = [{"name": "instance%d.example.test" % i}
+                     for i in range(10)]
+        session = StreamingSession(json.dumps(instances))
+        client._AcquireSession = lambda limit=True: session
+
+        instances_iter = client.IterInstances()
+        self.assertEqual(instances[0], instances_iter.next())
+        self.assertEqual(instances[1:], list(instances_iter))
+        self.assertTrue(session.kwargs["stream"])
+        self.assertEqual({"bulk": 1}, session.kwargs["params"])
+        self.assertTrue(session.response.closed)
+
+    def test_iter_invalid(self):
+        client = GanetiRapiClient("ganeti.example.test")
+        session = StreamingSession('[{"name": "node1.example.test"}, {')
+        client._AcquireSession = lambda limit=True: session
+
+        self.assertRaises(GanetiApiError, list, client.IterNodes())
+        self.assertTrue(session.response.closed)
+
+
+class TestConcurrencyLimiter(SimpleTestCase):
+
+    def wait_for_waiters(self, limiter, count):
+        while len(limiter._waiters) < count:
+            time.sleep(0.001)
+
+    def test_limit(self):
+        limiter = ConcurrencyLimiter(2, timeout=0.01)
+        limiter.acquire()
+        limiter.acquire()
+        self.assertRaises(ConcurrencyLimitError, limiter.acquire)
+        self.assertEqual(0, len(limiter._waiters))
+
+        limiter.release()
+        limiter.acquire()
+        limiter.release()
+        limiter.release()
+        self.assertEqual(0, limiter._active)
+
+    def test_fifo(self):
+        """
+        Waiting callers get slots in the order they asked for them.
+        """
+        limiter = ConcurrencyLimiter(1, timeout=10)
+        limiter.acquire()
+        order = []
+
+        def call(i):
+            limiter.acquire()
+            order.append(i)
+            limiter.release()
+
+        threads = []
+        for i in range(5):
+            thread = threading.Thread(target=call, args=(i,))
+            thread.start()
+            threads.append(thread)
+            self.wait_for_waiters(limiter, i + 1)
+
+        limiter.release()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(range(5), order)
+        self.assertEqual(0, limiter._active)
+
+    def test_lock_files(self):
+        """
+        Limiters sharing a lock directory, like separate processes would,
+        share the limit.
+        """
+        lock_dir = tempfile.mkdtemp()
+        try:
+            limiter = ConcurrencyLimiter(1, 0.01, lock_dir, "cluster")
+            other = ConcurrencyLimiter(1, 0.01, lock_dir, "cluster")
+
+            limiter.acquire()
+            self.assertRaises(ConcurrencyLimitError, other.acquire)
+            self.assertEqual(0, other._active)
+
+            limiter.release()
+            other.acquire()
+            other.release()
+        finally:
+            shutil.rmtree(lock_dir)
+
+    def test_client(self):
+        client = GanetiRapiClient("ganeti.example.test", max_concurrency=1,
+                                  concurrency_timeout=0.01)
+        client._AcquireSession()
+        self.assertRaises(ConcurrencyLimitError, client.GetVersion)
+        client._ReleaseSession()
+
+        client = GanetiRapiClient("ganeti.example.test")
+        self.assertTrue(client.limiter is None)
+
+    def test_long_poll(self):
+        """
+        Waiting for job changes doesn't take a slot, nor wait for one.
+        """
+        client = GanetiRapiClient("ganeti.example.test", max_concurrency=1,
+                                  concurrency_timeout=0.01)
+        client._AcquireSession()
+        session = client._session = CountingSession()
+
+        client.WaitForJobChange(42, ["status"], None, None)
+        self.assertEqual(["https://ganeti.example.test:5080/2/jobs/42/wait"],
+                         session.urls)
+        self.assertEqual(1, client.limiter._active)
+        self.assertRaises(ConcurrencyLimitError, client.GetVersion)
+
+        client._ReleaseSession()
+        self.assertEqual(0, client.limiter._active)
@@ -0,0 +1,97 @@
+# Copyright (C) 2010 Oregon State University et al.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301,
+# USA.
+
+import threading
+
+from django.test import SimpleTestCase
+
+from ..client import GanetiApiError
+from ..fanout import RapiExecutor
+
+__all__ = (
+    "TestRapiExecutor",
+)
+
+
+class FakeClient(object):
+    """
+    Stand-in for a RAPI client with controllable responses.
+    """
+
+    def __init__(self):
+        self.release = threading.Event()
+
+    def GetInstances(self, bulk=False):
+        return ["%s.example.test" % ("bulk" if bulk else "vm")]
+
+    def GetInfo(self):
+        raise GanetiApiError("Couldn't connect", code=None)
+
+    def GetNodes(self):
+        self.release.wait(5)
+        return ["node.example.test"]
+
+
+class TestRapiExecutor(SimpleTestCase):
+
+    def setUp(self):
+        self.executor = RapiExecutor(workers=2)
+        self.client = FakeClient()
+
+    def tearDown(self):
+        self.client.release.set()
+
+    def test_empty(self):
+        self.assertEqual([], list(self.executor.map({})))
+
+    def test_results(self):
+        calls = {
+            1: (self.client, "GetInstances", ()),
+            2: (self.client, "GetInstances", (), {"bulk": True}),
+        }
+        results = dict((key, (result, error)) for key, result, error
+                       in self.executor.map(calls))
+        self.assertEqual({
+            1: (["vm.example.test"], None),
+            2: (["bulk.example.test"], None),
+        }, results)
+
+    def test_errors(self):
+        calls = {
+            1: (self.client, "GetInfo", ()),
+            2: (self.client, "GetInstances", ()),
+        }
+        results = dict((key, (result, error)) for key, result, error
+                       in self.executor.map(calls))
+        self.assertEqual(None, results[1][0])
+        self.assertTrue(isinstance(results[1][1], GanetiApiError))
+        self.assertEqual((["vm.example.test"], None), results[2])
+
+    def test_timeout(self):
+        """
+        A call running longer than the timeout is reported as an error
+        without holding back the other results.
+        """
+        calls = {
+            1: (self.client, "GetNodes", ()),
+            2: (self.client, "GetInstances", ()),
+        }
+        results = list(self.executor.map(calls, timeout=0.1))
+        self.assertEqual((2, ["vm.example.test"], None), results[0])
+        key, result, error = results[1]
+        self.assertEqual(1, key)
+        self.assertTrue(isinstance(error, GanetiApiError))
@@ -0,0 +1,89 @@
+# Copyright (c) 2012 Oregon State University Open Source Lab
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.    See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.
+
+from django.test import SimpleTestCase
+
+from ..infocache import InfoCache, info_size
+from ..proxy.constants import INFO, INSTANCE
+
+__all__ = (
+    "TestInfoCache",
+)
+
+
+class TestInfoCache(SimpleTestCase):
+
+    def test_get(self):
+        """
+        Verifies:
+            * cached info is returned as is
+            * hits and misses are counted
+        """
+        cache = InfoCache(1024 * 1024)
+        self.assertEqual(None, cache.get('vm'))
+        cache.put('vm', INSTANCE)
+        self.assertTrue(cache.get('vm') is INSTANCE)
+
+        stats = cache.stats()
+        self.assertEqual(1, stats['entries'])
+        self.assertEqual(info_size(INSTANCE), stats['bytes'])
+        self.assertEqual(1, stats['hits'])
+        self.assertEqual(1, stats['misses'])
+        self.assertEqual(0.5, stats['hit_rate'])
+
+        cache.reset()
+        self.assertEqual(0, cache.stats()['hits'])
+        self.assertEqual(1, len(cache))
+
+    def test_discard(self):
+        cache = InfoCache(1024 * 1024)
+        cache.put('vm', INSTANCE)
+        cache.discard('vm')
+        cache.discard('missing')
+        self.assertFalse('vm' in cache)
+        self.assertEqual(0, cache.stats()['bytes'])
+
+    def test_bounded(self):
+        """
+        The least recently used info is dropped to stay within the size.
+        """
+        cache = InfoCache(info_size(INSTANCE) + info_size(INFO))
+        cache.put('vm', INSTANCE)
+        cache.put('cluster', INFO)
+        cache.get('vm')
+        cache.put('other', INFO)
+
+        self.assertTrue('vm' in cache)
+        self.assertFalse('cluster' in cache)
+        self.assertTrue('other' in cache)
+        self.assertEqual(1, cache.stats()['evictions'])
+
+        # Replacing an entry doesn't count it twice.
+        cache.put('vm', INSTANCE)
+        self.assertEqual(info_size(INSTANCE) + info_size(INFO),
+                         cache.stats()['bytes'])
+
+    def test_too_large(self):
+        cache = InfoCache(10)
+        cache.put('vm', INSTANCE)
+        self.assertEqual(0, len(cache))
+
+    def test_disabled(self):
+        cache = InfoCache(0)
+        cache.put('vm', INSTANCE)
+        self.assertEqual(None, cache.get('vm'))
+        self.assertEqual(0, cache.stats()['misses'])
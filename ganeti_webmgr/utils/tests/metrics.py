@@ -0,0 +1,115 @@
+# Copyright (C) 2010 Oregon State University et al.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301,
+# USA.
+
+import requests
+
+from django.test import SimpleTestCase
+
+from ..client import GanetiRapiClient, RequestHook, RequestTimeoutError
+from ..metrics import LATENCY_BUCKETS, RapiMetrics, normalize_path
+
+__all__ = ("TestRapiMetrics",)
+
+
+class Response(object):
+    status_code = requests.codes.ok
+    content = '[{"id": "instance1.example.test"}]'
+
+
+class Session(object):
+
+    def __init__(self, error=None):
+        self.error = error
+
+    def request(self, *args, **kwargs):
+        if self.error:
+            raise self.error
+        return Response()
+
+
+class BrokenHook(RequestHook):
+
+    def before_request(self, client, method, path):
+        raise Exception("broken hook")
+
+
+class TestRapiMetrics(SimpleTestCase):
+
+    def setUp(self):
+        self.metrics = RapiMetrics()
+        self.client = GanetiRapiClient("ganeti.example.test",
+                                       hooks=[self.metrics])
+
+    def test_normalize_path(self):
+        self.assertEqual("/2/instances/[name]/tags",
+                         normalize_path("/2/instances/vm1.example.test/tags"))
+        self.assertEqual("/2/jobs/[name]", normalize_path("/2/jobs/42"))
+        self.assertEqual("/2/instances", normalize_path("/2/instances"))
+        self.assertEqual("/2/query/node", normalize_path("/2/query/node"))
+
+    def test_aggregate(self):
+        self.metrics.after_request(self.client, "get", "/2/instances/vm1",
+                                   0.02, 100, None)
+        self.metrics.after_request(self.client, "get", "/2/instances/vm2",
+                                   20, None,
+                                   RequestTimeoutError("Timed out"))
+
+        (row,) = self.metrics.snapshot()
+        self.assertEqual("ganeti.example.test:5080", row["cluster"])
+        self.assertEqual("GET /2/instances/[name]", row["request"])
+        self.assertEqual(2, row["calls"])
+        self.assertEqual(1, row["errors"])
+        self.assertEqual(1, row["timeouts"])
+        self.assertEqual(100, row["bytes"])
+        self.assertEqual(20, row["max_time"])
+        self.assertAlmostEqual(10.01, row["mean_time"])
+
+        histogram = [0] * (len(LATENCY_BUCKETS) + 1)
+        histogram[1] = histogram[-1] = 1
+        self.assertEqual(histogram, row["histogram"])
+
+        self.metrics.reset()
+        self.assertEqual([], self.metrics.snapshot())
+
+    def test_client_requests(self):
+        """
+        Requests sent by the client are recorded, including failed ones.
+        """
+        self.client._AcquireSession = lambda limit=True: Session()
+        self.client.GetInstances()
+
+        self.client._AcquireSession = \
+            lambda limit=True: Session(requests.Timeout())
+        self.assertRaises(RequestTimeoutError, self.client.GetInstance,
+                          "vm1.example.test")
+
+        self.client._AcquireSession = \
+            lambda limit=True: Session(requests.ConnectTimeout())
+        self.assertRaises(RequestTimeoutError, self.client.GetInstance,
+                          "vm1.example.test")
+
+        rows = dict((row["request"], row) for row in self.metrics.snapshot())
+        self.assertEqual(1, rows["GET /2/instances"]["calls"])
+        self.assertEqual(len(Response.content),
+                         rows["GET /2/instances"]["bytes"])
+        self.assertEqual(2, rows["GET /2/instances/[name]"]["timeouts"])
+
+    def test_broken_hook(self):
+        self.client.hooks.insert(0, BrokenHook())
+        self.client._AcquireSession = lambda limit=True: Session()
+        self.client.GetInstances()
+        self.assertEqual(1, self.metrics.snapshot()[0]["calls"])
@@ -0,0 +1,165 @@
+# Copyright (C) 2010 Oregon State University et al.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301,
+# USA.
+
+import threading
+
+from django.test import TestCase
+
+from ganeti_webmgr.clusters.models import Cluster
+
+from .. import RAPI_REGISTRY, get_rapi
+from ..registry import RapiRegistry
+
+__all__ = ('TestRapiRegistry',)
+
+
+class FakeClient(object):
+
+    def __init__(self, host, port, user, password):
+        self.credentials = (host, port, user, password)
+        self.closed = False
+
+    def Close(self):
+        self.closed = True
+
+
+class TestRapiRegistry(TestCase):
+
+    def setUp(self):
+        self.registry = RapiRegistry(FakeClient, size=2)
+        self.cluster = Cluster.objects.create(hostname='ganeti.example.test',
+                                              slug='one')
+
+    def tearDown(self):
+        Cluster.objects.all().delete()
+
+    def test_get(self):
+        client = self.registry.get(self.cluster.hash, self.cluster)
+        self.assertEqual(('ganeti.example.test', 5080, None, None),
+                         client.credentials)
+        self.assertTrue(client is self.registry.get(self.cluster.hash,
+                                                    self.cluster.id))
+
+    def test_does_not_exist(self):
+        self.assertRaises(Cluster.DoesNotExist, self.registry.get,
+                          'nohash', -1)
+
+    def test_credentials_changed(self):
+        """
+        Looking up a cluster's new hash replaces the client for its old
+        credentials.
+        """
+        old_hash = self.cluster.hash
+        old = self.registry.get(old_hash, self.cluster)
+
+        Cluster.objects.filter(pk=self.cluster.pk).update(
+            hostname='ganeti2.example.test', hash='newhash')
+        # invalidating with the current hash keeps the client
+        self.registry.invalidate(self.cluster.id, old_hash)
+        self.assertFalse(old.closed)
+
+        client = self.registry.get('newhash', self.cluster)
+        self.assertEqual('ganeti2.example.test', client.credentials[0])
+        self.assertTrue(old.closed)
+        self.assertFalse(old_hash in self.registry)
+        self.assertTrue('newhash' in self.registry)
+
+        self.registry.invalidate(self.cluster.id)
+        self.assertTrue(client.closed)
+        self.assertEqual(0, len(self.registry))
+
+    def test_lru(self):
+        clusters = [self.cluster] + [
+            Cluster.objects.create(hostname='ganeti%d.example.test' % i,
+                                   slug='c%d' % i)
+            for i in range(2)]
+        first = self.registry.get(clusters[0].hash, clusters[0])
+        self.registry.get(clusters[1].hash, clusters[1])
+        self.registry.get(clusters[0].hash, clusters[0])
+        second = self.registry.get(clusters[1].hash, clusters[1])
+        self.registry.get(clusters[2].hash, clusters[2])
+
+        self.assertEqual(2, len(self.registry))
+        self.assertTrue(clusters[1].hash in self.registry)
+        self.assertFalse(clusters[0].hash in self.registry)
+        self.assertTrue(first.closed)
+        self.assertFalse(second.closed)
+        self.assertEqual([second, self.registry.get(clusters[2].hash,
+                                                    clusters[2])],
+                         self.registry.clients())
+
+    def test_concurrent(self):
+        """
+        Threads creating the same client at once all end up with one client.
+        """
+        created = []
+        release = threading.Event()
+
+        def factory(*credentials):
+            client = FakeClient(*credentials)
+            created.append(client)
+            release.wait()
+            return client
+
+        registry = RapiRegistry(factory)
+        clients = []
+
+        def add():
+            clients.append(registry._add(1, 'hash', ('host', 5080, None,
+                                                     None)))
+
+        threads = [threading.Thread(target=add) for i in range(5)]
+        for thread in threads:
+            thread.start()
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(1, len(set(id(c) for c in clients)))
+        self.assertEqual(1, len(registry))
+        self.assertEqual(len(created) - 1, len([c for c in created
+                                                if c.closed]))
+
+    def test_clear(self):
+        client = self.registry.get(self.cluster.hash, self.cluster)
+        self.registry.clear()
+        self.assertEqual(0, len(self.registry))
+        self.assertTrue(client.closed)
+
+    def test_prewarm(self):
+        Cluster.objects.create(hostname='ganeti2.example.test', slug='two')
+        self.assertEqual(2, self.registry.prewarm())
+        self.assertEqual(2, len(self.registry))
+
+    def test_invalidated_on_save(self):
+        """
+        Changing a cluster's credentials drops its client.
+        """
+        client = get_rapi(self.cluster.hash, self.cluster)
+        self.cluster.save()
+        self.assertTrue(self.cluster.hash in RAPI_REGISTRY)
+
+        self.cluster.username = 'tester'
+        self.cluster.password = 'secret'
+        self.cluster.save()
+        new = get_rapi(self.cluster.hash, self.cluster)
+        self.assertFalse(client is new)
+        self.assertEqual(('tester', 'secret'), (new.username, new.password))
+
+        hash = self.cluster.hash
+        self.cluster.delete()
+        self.assertFalse(hash in RAPI_REGISTRY)
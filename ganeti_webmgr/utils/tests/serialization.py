@@ -0,0 +1,64 @@
+# Copyright (c) 2012 Oregon State University Open Source Lab
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.    See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.
+
+import cPickle
+from datetime import datetime
+
+from django.test import SimpleTestCase
+
+from ..proxy.constants import INSTANCE, INFO
+from ..serialization import dumps_info, info_format, loads_info
+
+__all__ = (
+    "TestSerialization",
+)
+
+
+class TestSerialization(SimpleTestCase):
+
+    def test_json(self):
+        text = dumps_info(INSTANCE, compress=False)
+        self.assertEqual('json', info_format(text))
+        self.assertEqual(INSTANCE, loads_info(text))
+
+    def test_compressed(self):
+        """
+        Large info is compressed, and smaller than its pickle.
+        """
+        text = dumps_info(INFO, compress=True)
+        self.assertEqual('zlib', info_format(text))
+        self.assertEqual(INFO, loads_info(text))
+        self.assertTrue(len(text) < len(cPickle.dumps(INFO)))
+
+    def test_small_not_compressed(self):
+        text = dumps_info({'name': 'vm1'}, compress=True)
+        self.assertEqual('json', info_format(text))
+
+    def test_legacy_pickle(self):
+        text = cPickle.dumps(INSTANCE)
+        self.assertEqual('pickle', info_format(text))
+        self.assertEqual(INSTANCE, loads_info(text))
+        self.assertEqual(None, loads_info(cPickle.dumps(None)))
+
+    def test_not_json(self):
+        """
+        Info which isn't JSON serializable is pickled.
+        """
+        info = {'ctime': datetime(2012, 1, 1)}
+        text = dumps_info(info)
+        self.assertEqual('pickle', info_format(text))
+        self.assertEqual(info, loads_info(text))
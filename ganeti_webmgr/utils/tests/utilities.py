@@ -15,14 +15,20 @@
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301,
 # USA.
 
-from django.test import SimpleTestCase
+from copy import deepcopy
+from datetime import datetime
 
-from ganeti_webmgr.utils import (compare, get_hypervisor, hv_prettify,
-                                 os_prettify)
-from ganeti_webmgr.utils.proxy.constants import (INSTANCE, XEN_PVM_INSTANCE,
+from django.test import SimpleTestCase, TestCase
+
+from ganeti_webmgr.clusters.models import Cluster
+from ganeti_webmgr.utils import (cluster_default_info, compare,
+                                 get_hypervisor, hv_prettify, os_prettify)
+from ganeti_webmgr.utils.proxy.constants import (INSTANCE, XEN_INFO,
+                                                 XEN_PVM_INSTANCE,
                                                  XEN_HVM_INSTANCE)
 
 __all__ = (
+    "TestClusterDefaultInfo",
     "TestCompare",
     "TestGetHypervisor",
     "TestHvPrettify",
@@ -156,3 +162,24 @@ class TestOSPrettify(SimpleTestCase):
         self.assertEqual(os_prettify(["deb-ver1", "noop"]),
                          [("Unknown", [("deb-ver1", "deb-ver1"),
                           ("noop", "noop"), ]), ])
+
+
+class TestClusterDefaultInfo(TestCase):
+
+    def test_info_unchanged(self):
+        """
+        The cluster's info, which loaded objects share, is left alone.
+        """
+        cluster = Cluster.objects.create(hostname='xen.example.test',
+                                         slug='xen')
+        info = deepcopy(XEN_INFO)
+        cluster.info = info
+        cluster.cached = datetime.now()
+        cluster.save()
+
+        cluster = Cluster.objects.get(pk=cluster.pk)
+        defaults = cluster_default_info(cluster, 'xen-pvm')
+        self.assertEqual('rtl8139', defaults['nic_type'])
+        self.assertEqual(XEN_INFO, cluster.info)
+        self.assertEqual(XEN_INFO, Cluster.objects.get(pk=cluster.pk).info)
+        cluster.delete()
@@ -0,0 +1,84 @@
+# Copyright (C) 2010 Oregon State University et al.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301,
+# USA.
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+# Per #6579, do not change this import without discussion.
+from django.utils import simplejson as json
+
+from ganeti_webmgr.clusters.models import Cluster
+from ganeti_webmgr.django_test_tools.users import UserTestMixin
+from ganeti_webmgr.django_test_tools.views import ViewTestMixin
+
+from .. import clear_rapi_cache
+from ..metrics import RAPI_METRICS
+
+__all__ = ('TestRapiMetricsView',)
+
+
+class TestRapiMetricsView(TestCase, ViewTestMixin, UserTestMixin):
+
+    url = '/rapi-metrics/'
+
+    def setUp(self):
+        self.superuser = self.create_user('superuser', is_superuser=True)
+
+    def tearDown(self):
+        User.objects.all().delete()
+        Cluster.objects.all().delete()
+        RAPI_METRICS.reset()
+        clear_rapi_cache()
+
+    def test_permissions(self):
+        self.assert_standard_fails(self.url, ())
+
+    def test_view(self):
+        self.assert_200(self.url, (), [self.superuser],
+                        template='ganeti/rapi_metrics.html')
+
+    def test_json(self):
+        def tests(user, response):
+            data = json.loads(response.content)
+            self.assertEqual([], data['metrics'])
+            self.assertTrue('hit_rate' in data['info_cache'])
+
+        self.assert_200(self.url, (), [self.superuser],
+                        data={'format': 'json'}, mime='application/json',
+                        tests=tests)
+
+    def test_response_caches(self):
+        cluster = Cluster.objects.create(hostname='ganeti.example.test',
+                                         slug='ganeti')
+        cluster.rapi._response_cache.hits = 3
+
+        def tests(user, response):
+            data = json.loads(response.content)
+            self.assertEqual([{'cluster': 'ganeti.example.test:5080',
+                               'hits': 3, 'misses': 0, 'entries': 0}],
+                             data['response_caches'])
+
+        self.assert_200(self.url, (), [self.superuser],
+                        data={'format': 'json'}, mime='application/json',
+                        tests=tests)
+
+    def test_reset(self):
+        RAPI_METRICS._stats['cluster', 'GET /2/info'] = {}
+        self.assertTrue(self.client.login(username='superuser',
+                                          password='secret'))
+        response = self.client.post(self.url)
+        self.assertEqual(302, response.status_code)
+        self.assertEqual([], RAPI_METRICS.snapshot())
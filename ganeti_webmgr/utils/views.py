@@ -1,12 +1,18 @@
 from django.conf import settings
+from django.contrib.auth.decorators import login_required
+from django.core.exceptions import PermissionDenied
 from django.http import HttpResponse, HttpResponseForbidden
+from django.shortcuts import redirect, render_to_response
+from django.template import RequestContext
 from django.utils.translation import ugettext as _
 from django.utils import simplejson as json
 from object_permissions import get_users_any
 from django.db.models import Q
 
+from .metrics import LATENCY_BUCKETS, RAPI_METRICS
 from .models import SSHKey
-from ganeti_webmgr.clusters.models import Cluster
+from ganeti_webmgr.utils import RAPI_REGISTRY
+from ganeti_webmgr.clusters.models import Cluster, INFO_CACHE
 from ganeti_webmgr.virtualmachines.models import VirtualMachine
 
 
@@ -33,3 +39,39 @@ def ssh_keys(request, api_key):
 
     keys_list = list(keys)
     return HttpResponse(json.dumps(keys_list), mimetype="application/json")
+
+
+@login_required
+def rapi_metrics(request):
+    """
+    Show the RAPI request metrics collected by this process, and the
+    statistics of its info cache and of the response cache of each client.
+
+    ``?format=json`` returns the raw metrics, POSTing resets them.
+    """
+    if not request.user.is_superuser:
+        raise PermissionDenied(_("Only superusers may view RAPI metrics."))
+
+    if request.method == 'POST':
+        RAPI_METRICS.reset()
+        INFO_CACHE.reset()
+        return redirect('rapi-metrics')
+
+    metrics = RAPI_METRICS.snapshot()
+    info_cache = INFO_CACHE.stats()
+    response_caches = sorted((dict(client.GetCacheStats(),
+                                   cluster=client.address)
+                              for client in RAPI_REGISTRY.clients()),
+                             key=lambda row: row['cluster'])
+    if request.GET.get('format') == 'json':
+        data = {'buckets': LATENCY_BUCKETS, 'metrics': metrics,
+                'info_cache': info_cache,
+                'response_caches': response_caches}
+        return HttpResponse(json.dumps(data), mimetype="application/json")
+
+    return render_to_response("ganeti/rapi_metrics.html", {
+        'buckets': LATENCY_BUCKETS,
+        'metrics': metrics,
+        'info_cache': info_cache,
+        'response_caches': response_caches,
+    }, context_instance=RequestContext(request))
@@ -6,8 +6,8 @@ from ganeti_webmgr.clusters.models import CachedClusterObject
 from ganeti_webmgr.jobs.models import Job
 
 from ganeti_webmgr.ganeti_web import constants
-from ganeti_webmgr.utils import generate_random_password, get_rapi
-from ganeti_webmgr.utils.client import REPLACE_DISK_AUTO
+from ganeti_webmgr.utils import chunks, generate_random_password, get_rapi
+from ganeti_webmgr.utils.client import GanetiApiError, REPLACE_DISK_AUTO
 from ganeti_webmgr.utils.fields import LowerCaseCharField
 from ganeti_webmgr.vm_templates.models import VirtualMachineTemplate
 
@@ -16,6 +16,26 @@ if settings.VNC_PROXY:
                                                          request_ssh)
 
 
+def owner_tag_changes(tags, owner_id):
+    """
+    Returns the owner tags to remove from and to add to a VM's tags so that
+    they name ``owner_id``, as a tuple of two lists.
+    """
+    found = False
+    remove = []
+    for tag in tags:
+        if tag.startswith(constants.OWNER_TAG):
+            id = int(tag[len(constants.OWNER_TAG):])
+            if id == owner_id:
+                found = True
+            else:
+                remove.append(tag)
+    add = []
+    if owner_id and not found:
+        add.append('%s%s' % (constants.OWNER_TAG, owner_id))
+    return remove, add
+
+
 class VirtualMachine(CachedClusterObject):
     """
     The VirtualMachine (VM) model represents VMs within a Ganeti cluster.
@@ -83,10 +103,19 @@ class VirtualMachine(CachedClusterObject):
                                  related_name="instances", null=True,
                                  blank=True)
 
+    QUERY_RESOURCE = 'instance'
+    QUERY_FIELDS = ('name', 'mtime', 'serial_no', 'beparams', 'disk.sizes',
+                    'os', 'status', 'pnode', 'snodes')
+    BULK_INFO_METHOD = 'IterInstances'
+
     class Meta:
         ordering = ["hostname"]
         unique_together = (("cluster", "hostname"),)
 
+    # Tags of the info when this VM was loaded or last saved, see
+    # owner_tag_outdated().
+    _loaded_tags = None
+
     def __unicode__(self):
         return self.hostname
 
@@ -97,33 +126,52 @@ class VirtualMachine(CachedClusterObject):
         if self.id is None:
             self.cluster_hash = self.cluster.hash
 
-        info_ = self.info
-        if info_:
-            found = False
-            remove = []
-            if self.cluster.username:
-                for tag in info_['tags']:
-                    # Update owner Tag. Make sure the tag is set to the owner
-                    #  that is set in webmgr.
-                    if tag.startswith(constants.OWNER_TAG):
-                        id = int(tag[len(constants.OWNER_TAG):])
-                        # Since there is no 'update tag' delete old tag and
-                        #  replace with tag containing correct owner id.
-                        if id == self.owner_id:
-                            found = True
-                        else:
-                            remove.append(tag)
-                if remove:
-                    self.rapi.DeleteInstanceTags(self.hostname, remove)
-                    for tag in remove:
-                        info_['tags'].remove(tag)
-                if self.owner_id and not found:
-                    tag = '%s%s' % (constants.OWNER_TAG, self.owner_id)
-                    self.rapi.AddInstanceTags(self.hostname, [tag])
-                    self.info['tags'].append(tag)
+        if self.info and self.owner_tag_outdated():
+            self.reconcile_owner_tag()
 
         super(VirtualMachine, self).save(*args, **kwargs)
 
+    def mark_clean(self):
+        super(VirtualMachine, self).mark_clean()
+        info_ = self.info
+        self._loaded_tags = info_.get('tags', []) if info_ else None
+
+    def owner_tag_outdated(self):
+        """
+        True unless neither the owner nor the tags changed since this VM was
+        loaded or last saved, in which case the owner tag was already
+        checked.
+        """
+        dirty = self.dirty_fields()
+        if dirty is None or 'owner_id' in dirty:
+            return True
+        return self.info.get('tags', []) != self._loaded_tags
+
+    def reconcile_owner_tag(self):
+        """
+        Makes the owner tag of this VM in ganeti name the owner set in webmgr,
+        unless the cluster has no credentials to change tags with.
+        """
+        info_ = self.info
+        if not info_ or not self.cluster.username:
+            return
+        loaded = info_.get('tags', [])
+        remove, add = owner_tag_changes(loaded, self.owner_id)
+        # The info may be shared with other objects, see
+        # CachedClusterObject.info; change a copy of the tags.
+        tags = list(loaded)
+        # Since there is no 'update tag' delete old tag and replace with tag
+        # containing correct owner id.
+        if remove:
+            self.rapi.DeleteInstanceTags(self.hostname, remove)
+            for tag in remove:
+                tags.remove(tag)
+        if add:
+            self.rapi.AddInstanceTags(self.hostname, add)
+            tags.extend(add)
+        if tags != loaded:
+            self.info = dict(info_, tags=tags)
+
     @models.permalink
     def get_absolute_url(self):
         """
@@ -141,11 +189,35 @@ class VirtualMachine(CachedClusterObject):
     def is_running(self):
         return self.status == 'running'
 
+    def parse_info(self):
+        """
+        Parse all of the attached metadata, and attach it to this object.
+
+        Nodes are resolved through the NodeResolver shared by this process.
+        """
+        from ganeti_webmgr.nodes.models import node_resolver
+
+        self.parse_transient_info()
+        data = self.parse_persistent_info(self.info,
+                                          node_resolver(self.cluster_id))
+        for k in data:
+            setattr(self, k, data[k])
+
+        # Drop nodes loaded before the VM moved.
+        for name in ('primary_node', 'secondary_node'):
+            cache = '_%s_cache' % name
+            node = getattr(self, cache, None)
+            if node is not None and node.pk != data['%s_id' % name]:
+                delattr(self, cache)
+
     @classmethod
-    def parse_persistent_info(cls, info):
+    def parse_persistent_info(cls, info, nodes=None):
         """
         Loads all values from cached info, included persistent properties that
         are stored in the database
+
+        @param nodes - NodeResolver of the VM's cluster.  Without one, each
+        node is looked up by hostname.
         """
         from ganeti_webmgr.nodes.models import Node
         data = super(VirtualMachine, cls).parse_persistent_info(info)
@@ -161,29 +233,73 @@ class VirtualMachine(CachedClusterObject):
         data['operating_system'] = info['os']
         data['status'] = info['status']
 
-        primary = info['pnode']
-        if primary:
-            try:
-                data['primary_node'] = Node.objects.get(hostname=primary)
-            except Node.DoesNotExist:
-                # node is not created yet.  fail silently
-                data['primary_node'] = None
-        else:
-            data['primary_node'] = None
-
+        def resolve(hostname):
+            # Nodes not created yet are left unset.
+            if not hostname:
+                return None
+            if nodes is not None:
+                return nodes.get(hostname)
+            ids = Node.objects.filter(hostname=hostname) \
+                .values_list('id', flat=True)[:1]
+            return ids[0] if ids else None
+
+        data['primary_node_id'] = resolve(info['pnode'])
         secondary = info['snodes']
-        if len(secondary):
-            secondary = secondary[0]
-            try:
-                data['secondary_node'] = Node.objects.get(hostname=secondary)
-            except Node.DoesNotExist:
-                # node is not created yet.  fail silently
-                data['secondary_node'] = None
-        else:
-            data['secondary_node'] = None
-
+        data['secondary_node_id'] = resolve(secondary[0] if secondary
+                                            else None)
         return data
 
+    @classmethod
+    def parse_bulk_info(cls, cluster, info):
+        from ganeti_webmgr.nodes.models import node_resolver
+        return cls.parse_persistent_info(info, node_resolver(cluster.id))
+
+    @classmethod
+    def apply_bulk_info(cls, cluster, infos, partial=False):
+        """
+        Updates the VMs of a cluster from info retrieved in bulk, see
+        CachedClusterObject.apply_bulk_info().
+
+        Rows are written without save(), so the owner tags of VMs whose tags
+        don't name their owner are reconciled afterwards, one VM at a time.
+        """
+        from ganeti_webmgr.utils.models import GanetiError
+
+        if partial or not cluster.username:
+            return super(VirtualMachine, cls).apply_bulk_info(cluster, infos,
+                                                              partial)
+
+        owners = dict(cls.bulk_refresh_queryset(cluster)
+                      .values_list('hostname', 'owner_id'))
+        outdated = []
+
+        def check(infos):
+            for info in infos:
+                if info['name'] in owners and any(owner_tag_changes(
+                        info.get('tags', []), owners[info['name']])):
+                    outdated.append(info['name'])
+                yield info
+
+        result = super(VirtualMachine, cls).apply_bulk_info(
+            cluster, check(infos), partial)
+
+        for hostnames in chunks(outdated, 500):
+            for vm in cls.objects.filter(cluster=cluster,
+                                         hostname__in=hostnames):
+                try:
+                    vm.reconcile_owner_tag()
+                except GanetiApiError as e:
+                    GanetiError.store_error(str(e), obj=vm, code=e.code)
+                else:
+                    vm.save(dirty_only=True)
+        return result
+
+    @classmethod
+    def bulk_refresh_queryset(cls, cluster):
+        # VMs being deleted or created are left alone, like in _refresh()
+        qs = super(VirtualMachine, cls).bulk_refresh_queryset(cluster)
+        return qs.filter(pending_delete=False, template__isnull=True)
+
     @classmethod
     def _complete_job(cls, cluster_id, hostname, op, status):
         """
@@ -20,7 +20,9 @@ from datetime import datetime
 
 from django.test import TestCase
 
-from ganeti_webmgr.utils.proxy.constants import (INSTANCE, JOB, JOB_RUNNING,
+from ganeti_webmgr.utils.proxy import CallProxy, query_response
+from ganeti_webmgr.utils.proxy.constants import (INSTANCE, INSTANCES_BULK,
+                                                 JOB, JOB_RUNNING,
                                                  JOB_DELETE_SUCCESS)
 
 from ganeti_webmgr.virtualmachines.models import VirtualMachine
@@ -154,6 +156,82 @@ class TestVirtualMachineModel(TestCase, VirtualMachineTestCaseMixin):
         vm.delete()
         cluster.delete()
 
+    def test_info_without_tags(self):
+        """
+        Verifies:
+            * VMs whose info has no tags can be saved
+            * the owner tag is added when an owner is set
+        """
+        vm, cluster = self.create_virtual_machine()
+        owner = ClusterUser.objects.create(id=74, name='owner0')
+        info = dict(INSTANCE)
+        del info['tags']
+
+        vm.info = info
+        vm.save()
+        self.assertFalse(vm.owner_tag_outdated())
+
+        vm.owner = owner
+        vm.save()
+        self.assertEqual(['%s%s' % (constants.OWNER_TAG, owner.id)],
+                         vm.info['tags'])
+
+        owner.delete()
+        vm.delete()
+        cluster.delete()
+
+    def test_dirty_fields(self):
+        """
+        Verifies:
+            * loaded and saved VMs have no changed fields
+            * changed fields are listed by attribute name
+        """
+        vm, cluster = self.create_virtual_machine()
+        self.assertEqual([], vm.dirty_fields())
+        vm = VirtualMachine.objects.get(pk=vm.pk)
+        self.assertEqual([], vm.dirty_fields())
+
+        vm.ram = 1024
+        vm.owner_id = 1
+        self.assertEqual(set(['ram', 'owner_id']), set(vm.dirty_fields()))
+        self.assertEqual(None, VirtualMachine().dirty_fields())
+
+        vm.delete()
+        cluster.delete()
+
+    def test_refresh_changed_fields(self):
+        """
+        Verifies:
+            * a refresh only writes the fields it changed
+            * the owner tag is not checked when neither the owner nor the
+              tags changed
+        """
+        vm, cluster = self.create_virtual_machine()
+        vm.refresh()
+        owner = ClusterUser.objects.create(name='owner')
+        VirtualMachine.objects.filter(pk=vm.pk) \
+            .update(note_text='edited elsewhere', owner=owner, mtime=None,
+                    ram=-1)
+        vm = VirtualMachine.objects.get(pk=vm.pk)
+        vm.rapi.AddInstanceTags.reset()
+
+        vm.refresh()
+        values = VirtualMachine.objects.filter(pk=vm.pk) \
+            .values('note_text', 'ram')[0]
+        self.assertEqual('edited elsewhere', values['note_text'])
+        self.assertEqual(INSTANCE['beparams']['memory'], values['ram'])
+        vm.rapi.AddInstanceTags.assertNotCalled(self)
+
+        vm.owner = None
+        vm.save()
+        vm.owner = owner
+        vm.save()
+        vm.rapi.AddInstanceTags.assertCalled(self)
+
+        owner.delete()
+        vm.delete()
+        cluster.delete()
+
     def test_start(self):
         """
         Test VirtualMachine.start()
@@ -305,3 +383,110 @@ class TestVirtualMachineModel(TestCase, VirtualMachineTestCaseMixin):
 
         job.delete()
         cluster.delete()
+
+    def test_refresh_fields(self):
+        """
+        Tests refreshing the searchable fields of all VMs with a query
+
+        Verifies:
+            * a single query is issued for the cluster
+            * fields of VMs with a newer mtime are updated
+            * cached info and mtime of updated VMs are left alone
+            * VMs that did not change only have their cache timestamp bumped
+        """
+        vm, cluster = self.create_virtual_machine()
+        vm2, cluster = self.create_virtual_machine(cluster, 'vm2.example.bak')
+        mtime = datetime.fromtimestamp(INSTANCE['mtime'])
+        VirtualMachine.objects.filter(pk=vm2.pk).update(mtime=mtime)
+
+        changed = dict(INSTANCE, name=vm.hostname,
+                       beparams={'memory': 1024, 'vcpus': 4})
+        unchanged = dict(INSTANCE, name=vm2.hostname)
+        response = query_response(VirtualMachine.QUERY_FIELDS,
+                                  [changed, unchanged])
+        CallProxy.patch(cluster.rapi, 'Query', False, response)
+
+        self.assertEqual((1, 1), VirtualMachine.refresh_fields(cluster))
+        cluster.rapi.Query.assertCalled(self, 'instance',
+                                        list(VirtualMachine.QUERY_FIELDS),
+                                        None)
+        self.assertEqual(1, len(cluster.rapi.Query.calls))
+
+        values = VirtualMachine.objects.filter(pk=vm.pk) \
+            .values('ram', 'virtual_cpus', 'mtime', 'cached')[0]
+        self.assertEqual({'ram': 1024, 'virtual_cpus': 4, 'mtime': None,
+                          'cached': None}, values)
+
+        values = VirtualMachine.objects.filter(pk=vm2.pk, mtime=mtime) \
+            .values('ram', 'cached')[0]
+        self.assertEqual(-1, values['ram'])
+        self.assertTrue(values['cached'])
+
+        vm.delete()
+        vm2.delete()
+        cluster.delete()
+
+    def test_refresh_virtual_machines_owner_tag(self):
+        """
+        Tests refreshing VMs in bulk whose tags don't name their owner
+
+        Verifies:
+            * the owner tag is added, as a per-VM save would
+            * VMs whose tags name their owner are left alone
+        """
+        vm, cluster = self.create_virtual_machine(hostname='vm1.example.bak')
+        vm2, cluster = self.create_virtual_machine(cluster, 'vm2.example.bak')
+        owner = ClusterUser.objects.create(name='owner')
+        VirtualMachine.objects.filter(pk=vm.pk).update(owner=owner)
+        rapi = cluster.rapi
+        rapi.AddInstanceTags.reset()
+        rapi.DeleteInstanceTags.reset()
+
+        self.assertEqual((2, 0), cluster.refresh_virtual_machines())
+        tag = '%s%s' % (constants.OWNER_TAG, owner.id)
+        rapi.AddInstanceTags.assertCalled(self, 'vm1.example.bak', [tag])
+        self.assertEqual(1, len(rapi.AddInstanceTags.calls))
+        rapi.DeleteInstanceTags.assertNotCalled(self)
+        self.assertEqual([tag],
+                         VirtualMachine.objects.get(pk=vm.pk).info['tags'])
+
+        owner.delete()
+        vm.delete()
+        vm2.delete()
+        cluster.delete()
+
+    def test_refresh_virtual_machines(self):
+        """
+        Tests refreshing all VMs of a cluster in bulk
+
+        Verifies:
+            * a single bulk request is issued, no VM is fetched on its own
+            * VMs with a newer mtime get their complete info cached
+            * VMs that did not change only have their cache timestamp bumped
+        """
+        vm, cluster = self.create_virtual_machine(hostname='vm1.example.bak')
+        vm2, cluster = self.create_virtual_machine(cluster, 'vm2.example.bak')
+        VirtualMachine.objects.filter(pk=vm2.pk) \
+            .update(mtime=datetime.fromtimestamp(INSTANCES_BULK[1]['mtime']))
+        cluster.rapi.GetInstance.reset()
+
+        self.assertEqual((1, 1), cluster.refresh_virtual_machines())
+        self.assertEqual(1, len(cluster.rapi.IterInstances.calls))
+        cluster.rapi.GetInstance.assertNotCalled(self)
+
+        values = VirtualMachine.objects.filter(pk=vm.pk) \
+            .values('ram', 'virtual_cpus', 'cached')[0]
+        self.assertEqual(INSTANCES_BULK[0]['beparams']['memory'],
+                         values['ram'])
+        self.assertTrue(values['cached'])
+        vm = VirtualMachine.objects.get(pk=vm.pk)
+        self.assertEqual(INSTANCES_BULK[0]['name'], vm.info['name'])
+
+        values = VirtualMachine.objects.filter(pk=vm2.pk) \
+            .values('ram', 'cached')[0]
+        self.assertEqual(-1, values['ram'])
+        self.assertTrue(values['cached'])
+
+        vm.delete()
+        vm2.delete()
+        cluster.delete()
@@ -114,7 +114,8 @@ class BaseVMListView(LoginRequiredMixin, PaginationMixin, GWMBaseView,
 class VMListView(BaseVMListView):
     def get_queryset(self):
         # queryset takes precedence over model
-        self.queryset = vm_qs_for_users(self.request.user)
+        self.queryset = vm_qs_for_users(self.request.user) \
+            .light('cluster', 'primary_node')
         qs = super(BaseVMListView, self).get_queryset()
         return qs
 